@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark diff preprocessing.
+Times Patcher._preprocess_diff_lines on growing diffs full of malformed
+hunk headers and joined lines; the time per line should stay flat.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from patcher import Patcher
+
+# One block of a generated diff: a hunk header with content joined onto it,
+# ordinary lines, joined context lines and a long line with many brackets
+BLOCK = [
+    "@@ -10,7 +10,7 @@clusters = get_clusters(platform)",
+    "             value = compute(a, b)",
+    "-            old_call(x)",
+    "+            new_call(x, y)",
+    "             )except Exception as e:",
+    "     def handler(self):\"\"\"Handle the event.\"\"\"",
+    "             return [item for item in items if item]",
+    " " + "f(x) " * 200,
+    "@@ -30,3 +30,3 @@ def handler(self):",
+    "             pass",
+]
+
+
+def make_diff(line_count: int) -> list:
+    """Build diff lines by repeating BLOCK up to line_count lines."""
+    lines = ["--- a/module.py", "+++ b/module.py"]
+    while len(lines) < line_count:
+        lines.extend(BLOCK)
+    return lines[:line_count]
+
+
+def run_benchmark(sizes=(12_500, 25_000, 50_000, 100_000), repeat: int = 3) -> None:
+    """Print the best time per diff size and the time per line."""
+    print(f"{'lines':>8} {'seconds':>9} {'us/line':>8}")
+    for size in sizes:
+        lines = make_diff(size)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            Patcher._preprocess_diff_lines(lines)
+            best = min(best, time.perf_counter() - start)
+        print(f"{size:>8} {best:>9.4f} {best / size * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
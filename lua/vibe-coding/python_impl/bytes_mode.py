@@ -0,0 +1,242 @@
+"""
+Bytes-level fast path - Python implementation
+Applies exactly matching hunks to raw file content without decoding it.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from patcher import (
+    ASCII_COMPATIBLE_ENCODINGS,
+    Budget,
+    BudgetExhausted,
+    Edit,
+    FileLines,
+    Hunk,
+    HunkLocation,
+    HunkResult,
+    LineIndex,
+    Patcher,
+    detect_encoding,
+    ends_file_with_newline,
+    splice_edits,
+)
+
+
+@dataclass
+class RawLines:
+    """
+    File content stored as byte lines without line endings.
+
+    Only used for ASCII-compatible encodings, where splitting the bytes gives
+    the same lines as splitting the decoded text.
+    """
+
+    lines: List[bytes]
+    newline: bytes = b"\n"
+    ends_with_newline: bool = True
+    bom: bytes = b""
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Optional["RawLines"]:
+        """
+        Split raw file content into lines without decoding it.
+
+        Args:
+            data: Raw file content
+
+        Returns:
+            RawLines, or None if the content is not in an ASCII-compatible
+            encoding
+        """
+        encoding, bom = detect_encoding(data)
+        if encoding not in ASCII_COMPATIBLE_ENCODINGS:
+            return None
+
+        body = data[len(bom) :]
+        if not body:
+            return cls([], bom=bom)
+        newline_count = body.count(b"\n")
+        newline = (
+            b"\r\n" if newline_count and body.count(b"\r\n") == newline_count else b"\n"
+        )
+        ends_with_newline = body.endswith(newline)
+        if ends_with_newline:
+            body = body[: -len(newline)]
+        return cls(body.split(newline), newline, ends_with_newline, bom)
+
+    def to_bytes(self) -> bytes:
+        """Join the lines back into the raw file content."""
+        if not self.lines:
+            return self.bom
+        data = self.bom + self.newline.join(self.lines)
+        return data + self.newline if self.ends_with_newline else data
+
+    def apply_edit(self, edit: Edit) -> None:
+        """Replace the lines of a single edit."""
+        start, end, replacement = edit
+        if ends_file_with_newline(len(self.lines), edit):
+            self.ends_with_newline = True
+        self.lines[start:end] = replacement
+
+    def apply_edits(self, edits: List[Edit]) -> None:
+        """Apply edits in hunk order whose changed lines do not overlap."""
+        self.lines, ends_with_newline = splice_edits(self.lines, edits)
+        if ends_with_newline:
+            self.ends_with_newline = True
+
+    def decode(self) -> FileLines:
+        """Decode the content for the text matching tiers."""
+        return FileLines.from_bytes(self.to_bytes())
+
+
+class BytesPatcher:
+    """
+    Exact hunk application on undecoded lines.
+
+    ASCII hunk lines encode to the same bytes in every ASCII-compatible
+    encoding, so such hunks can be matched against the raw lines directly.
+    Anything else is left to the text engine in Patcher.
+
+    The fallback is per diff, not per hunk: once one hunk needs a fuzzy
+    tier, the whole file is decoded and every hunk is located as text.
+    Those tiers search the whole file, so decoding only some lines would
+    not save the decode.
+    """
+
+    @staticmethod
+    def apply_hunk_in_place(
+        raw_lines: RawLines, hunk: Hunk, line_hint: Optional[int] = None
+    ) -> Optional[HunkResult]:
+        """
+        Apply a hunk whose context matches the raw lines exactly.
+
+        Args:
+            raw_lines: File content, modified in place on success
+            hunk: The hunk to apply
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+
+        Returns:
+            HunkResult, or None if the hunk needs the text engine
+        """
+        located = BytesPatcher.locate_edit(raw_lines.lines, hunk, line_hint)
+        if located is None:
+            return None
+        result, edit = located
+        raw_lines.apply_edit(edit)
+        return result
+
+    @staticmethod
+    def locate_edits(
+        raw_lines: RawLines, hunks: List[Hunk], budget: Optional[Budget] = None
+    ) -> Optional[List[Tuple[HunkResult, Edit]]]:
+        """
+        Locate every hunk exactly against the same unmodified raw lines.
+
+        Args:
+            raw_lines: Original file content
+            hunks: Hunks to locate
+            budget: Limits of the search; when they run out the text engine
+                takes over and reports it
+
+        Returns:
+            (HunkResult, edit) for each hunk, or None as soon as one hunk
+            needs the text engine
+        """
+        index = LineIndex(raw_lines.lines)
+        located = []
+        for hunk in hunks:
+            result = BytesPatcher.locate_edit(
+                raw_lines.lines, hunk, Patcher.original_line_hint(hunk), index, budget
+            )
+            if result is None:
+                return None
+            located.append(result)
+        return located
+
+    @staticmethod
+    def locate_edit(
+        lines: List[bytes],
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        index: Optional[LineIndex] = None,
+        budget: Optional[Budget] = None,
+    ) -> Optional[Tuple[HunkResult, Edit]]:
+        """
+        Work out the edit of a hunk whose context matches the lines exactly.
+
+        Gives the same result as Patcher.locate_edit whenever it applies:
+        hunks naming a scope in their header, hunks with non-ASCII lines and
+        hunks without an exact match are declined.
+
+        Args:
+            lines: Raw file lines without line endings
+            hunk: The hunk to locate
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            index: Line index of lines, built if not given
+            budget: Limits of the exact search
+
+        Returns:
+            Tuple of (HunkResult, edit), or None if the hunk needs the text
+            engine or the budget ran out
+        """
+        if not hunk.lines or Patcher.hunk_section_label(hunk.header):
+            return None
+        search_lines, replacement_lines, _ = Patcher._build_search_and_replacement(
+            hunk
+        )
+        if not all(line.isascii() for line in search_lines + replacement_lines):
+            return None
+
+        if line_hint is None:
+            header_numbers = Patcher.parse_hunk_header(hunk.header)
+            if header_numbers:
+                line_hint = max(header_numbers[2] - 1, 0)
+        search = [line.encode("ascii") for line in search_lines]
+        replacement = [line.encode("ascii") for line in replacement_lines]
+
+        if not search:
+            found_at = len(lines)
+            return (
+                HunkResult(
+                    True,
+                    None,
+                    "Applied pure addition hunk",
+                    found_at=found_at,
+                    strategy="pure_addition",
+                ),
+                (found_at, found_at, replacement),
+            )
+
+        try:
+            if budget is not None:
+                budget.start().check()
+            location = Patcher.trusted_location(lines, hunk, search, line_hint)
+            if location is None:
+                candidates = Patcher._find_exact_candidates(
+                    index if index is not None else LineIndex(lines), search, budget
+                )
+                if not candidates:
+                    return None
+                candidates, ambiguous = Patcher._rank_candidates(
+                    candidates, line_hint
+                )
+                location = HunkLocation(
+                    found_at=candidates[0],
+                    strategy="exact",
+                    candidates=candidates,
+                    ambiguous=ambiguous,
+                )
+        except BudgetExhausted:
+            return None
+        found_at = location.found_at
+
+        end = found_at + len(search)
+        if end == len(lines):
+            # Same end-of-file handling as Patcher.locate_edit
+            while replacement and replacement[-1] == b"":
+                replacement.pop()
+
+        return Patcher._success_result(location), (found_at, end, replacement)
@@ -0,0 +1,112 @@
+"""
+Canonical diffs - Python implementation
+Normal form and stable hash of parsed diffs, to recognize retried diffs.
+"""
+
+import hashlib
+import posixpath
+from typing import List
+
+from patcher import Hunk, ParsedDiff
+
+# Header of every hunk in the normal form; line numbers are dropped
+CANONICAL_HUNK_HEADER = "@@ @@"
+
+
+class DiffCanonicalizer:
+    """
+    Puts parsed diffs into a normal form.
+
+    Two diffs with the same normal form make the same edits wherever the
+    patcher finds their context: they may differ in hunk line numbers and
+    section headings, path prefixes and timestamps, trailing whitespace,
+    missing space prefixes on context lines and trailing blank context.
+    """
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        """Drop timestamps after a tab and redundant path segments."""
+        path = path.split("\t")[0].strip()
+        if not path or path == "/dev/null":
+            return path
+        return posixpath.normpath(path)
+
+    @staticmethod
+    def normalize_lines(lines: List[str]) -> List[str]:
+        """
+        Return the lines of a hunk in normal form.
+
+        Context lines get a space prefix, trailing whitespace is dropped and
+        blank context lines at the end of the hunk are removed.
+
+        Args:
+            lines: Hunk lines as parsed
+
+        Returns:
+            Normalized hunk lines
+        """
+        normalized = []
+        for line in lines:
+            prefix = line[:1]
+            if prefix in ("+", "-", "\\"):
+                normalized.append(prefix + line[1:].rstrip())
+            elif prefix in (" ", "~"):
+                normalized.append(" " + line[1:].rstrip())
+            else:
+                normalized.append(" " + line.rstrip())
+        while normalized and normalized[-1] == " ":
+            normalized.pop()
+        return normalized
+
+    @staticmethod
+    def normalize(parsed_diff: ParsedDiff) -> ParsedDiff:
+        """
+        Return the normal form of a diff.
+
+        Hunks keep their order; hunks left without lines are dropped.
+
+        Args:
+            parsed_diff: The diff to normalize
+
+        Returns:
+            A new ParsedDiff in normal form
+        """
+        hunks = []
+        for hunk in parsed_diff.hunks:
+            lines = DiffCanonicalizer.normalize_lines(hunk.lines)
+            if lines:
+                hunks.append(Hunk(header=CANONICAL_HUNK_HEADER, lines=lines))
+        return ParsedDiff(
+            old_path=DiffCanonicalizer.normalize_path(parsed_diff.old_path),
+            new_path=DiffCanonicalizer.normalize_path(parsed_diff.new_path),
+            hunks=hunks,
+        )
+
+    @staticmethod
+    def canonical_text(parsed_diff: ParsedDiff) -> str:
+        """Render the normal form of a diff as unified diff text."""
+        normalized = DiffCanonicalizer.normalize(parsed_diff)
+        lines = [f"--- {normalized.old_path}", f"+++ {normalized.new_path}"]
+        for hunk in normalized.hunks:
+            lines.append(hunk.header)
+            lines.extend(hunk.lines)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def digest(parsed_diff: ParsedDiff) -> str:
+        """
+        Return a stable hash of the normal form of a diff.
+
+        The hash only depends on the normal form, so it is the same across
+        processes and runs and can key persistent caches.
+
+        Args:
+            parsed_diff: The diff to hash
+
+        Returns:
+            Hex digest of 32 characters
+        """
+        text = DiffCanonicalizer.canonical_text(parsed_diff)
+        return hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).hexdigest()
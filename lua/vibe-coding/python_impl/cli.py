@@ -0,0 +1,523 @@
+"""
+Batch command-line entry point - Python implementation
+Applies many diffs in one process: python -m patcher apply [SOURCES...]
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from canonical import DiffCanonicalizer
+from path_utils import PathResolver
+from patcher import Budget, ParsedDiff, Patcher
+from rules import RULES
+from tiers import TierPolicy, TierStats
+from transcript import DiffBlock, TranscriptReader
+from validation import Validation
+
+# Files picked up when a directory is given as a source
+DIFF_EXTENSIONS = (".diff", ".patch")
+
+# Result record printed for every diff
+Record = Dict[str, Any]
+
+
+@dataclass
+class DiffJob:
+    """One diff to apply and where it was read from."""
+
+    index: int
+    id: str
+    content: Optional[str]
+    error: Optional[str] = None
+
+
+@dataclass
+class ApplyOptions:
+    """Options passed on to Patcher.apply_diff_with_details."""
+
+    split_hunks: bool = False
+    merge: bool = False
+    disabled_rules: Tuple[str, ...] = ()
+    timeout: Optional[float] = None  # Seconds of hunk search per diff
+    tier_stats: Optional[TierStats] = None
+    source: str = "default"  # Diff source the tier statistics are kept for
+
+    def budget(self) -> Optional[Budget]:
+        """Return a fresh search budget for one diff, if limited."""
+        if self.timeout is None:
+            return None
+        return Budget(max_seconds=self.timeout)
+
+    def tiers(self) -> Optional[TierPolicy]:
+        """Return the tier policy of the diff source, if statistics are kept."""
+        if self.tier_stats is None:
+            return None
+        return self.tier_stats.for_source(self.source)
+
+    def configure_rules(self) -> None:
+        """Switch off the disabled repair rules in this process."""
+        for name in self.disabled_rules:
+            RULES.set_enabled(name, False)
+
+
+class BatchApplier:
+    """
+    Applies a stream of diffs and reports one JSON record per diff.
+
+    Everything runs in a single long-lived process (or a pool of them with
+    jobs > 1), so imports, the project file index used to resolve paths, the
+    symbol index cache and the other module level caches are set up once and
+    reused by every diff. Diffs targeting the same file are always applied in
+    input order by the same worker.
+    """
+
+    @staticmethod
+    def iter_files(
+        patterns: List[str], extensions: Optional[Tuple[str, ...]] = DIFF_EXTENSIONS
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Expand directories and globs into diff file paths.
+
+        Args:
+            patterns: Directories (searched recursively for files with the
+                given extensions), file paths or glob patterns
+            extensions: File name endings picked up in directories; None
+                picks up every file
+
+        Yields:
+            (path, error message or None) in a stable order
+        """
+        for pattern in patterns:
+            if os.path.isdir(pattern):
+                for root, dirs, files in os.walk(pattern):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if extensions is None or name.endswith(extensions):
+                            yield os.path.join(root, name), None
+                continue
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                yield pattern, f"No diff files match {pattern}"
+            for path in matches:
+                if not os.path.isdir(path):
+                    yield path, None
+
+    @staticmethod
+    def read_files(patterns: List[str]) -> Iterator[DiffJob]:
+        """Read each diff file matched by the patterns."""
+        for index, (path, error) in enumerate(BatchApplier.iter_files(patterns)):
+            if error:
+                yield DiffJob(index, path, None, error)
+                continue
+            try:
+                with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                    yield DiffJob(index, path, f.read())
+            except OSError as e:
+                yield DiffJob(index, path, None, f"Failed to read {path}: {e}")
+
+    @staticmethod
+    def read_transcripts(patterns: List[str]) -> Iterator[DiffJob]:
+        """Stream the fenced diff blocks of each transcript the patterns match."""
+        index = 0
+        for path, error in BatchApplier.iter_files(patterns, extensions=None):
+            if error is None:
+                try:
+                    for job in BatchApplier._block_jobs(
+                        TranscriptReader.read_blocks(path), path, index
+                    ):
+                        index += 1
+                        yield job
+                    continue
+                except OSError as e:
+                    error = f"Failed to read {path}: {e}"
+            yield DiffJob(index, path, None, error)
+            index += 1
+
+    @staticmethod
+    def read_transcript_stream(
+        stream: BinaryIO, name: str = "stdin"
+    ) -> Iterator[DiffJob]:
+        """Stream the fenced diff blocks of a transcript read from a stream."""
+        return BatchApplier._block_jobs(TranscriptReader.iter_blocks(stream), name, 0)
+
+    @staticmethod
+    def _block_jobs(
+        blocks: Iterator[DiffBlock], name: str, index: int
+    ) -> Iterator[DiffJob]:
+        """Turn diff blocks into jobs identified by transcript and fence line."""
+        for block in blocks:
+            job_id = f"{name}:{block.start_line}"
+            if block.complete:
+                yield DiffJob(index, job_id, block.content)
+            else:
+                yield DiffJob(index, job_id, None, "Diff block has no closing fence")
+            index += 1
+
+    @staticmethod
+    def read_jsonl(stream: TextIO) -> Iterator[DiffJob]:
+        """
+        Read diffs from a JSONL stream.
+
+        Each line is an object with the diff text under "diff" and an optional
+        "id" that is echoed in the result; blank lines are skipped.
+        """
+        index = 0
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            default_id = f"stdin:{line_num}"
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield DiffJob(index, default_id, None, f"Invalid JSON: {e}")
+                index += 1
+                continue
+            if isinstance(record, dict) and isinstance(record.get("diff"), str):
+                job_id = str(record.get("id", default_id))
+                yield DiffJob(index, job_id, record["diff"])
+            else:
+                error = 'Expected an object with a "diff" string'
+                yield DiffJob(index, default_id, None, error)
+            index += 1
+
+    @staticmethod
+    def prepare(
+        job: DiffJob, resolver: Optional[PathResolver] = None
+    ) -> Tuple[Optional[ParsedDiff], Record]:
+        """
+        Validate and parse a diff the way the editor integration does.
+
+        Args:
+            job: The diff to prepare
+            resolver: Resolves the diff's paths against the project files
+
+        Returns:
+            Tuple of (parsed diff or None, result record so far)
+        """
+        record: Record = {"id": job.id}
+        if job.error:
+            record.update(success=False, message=job.error)
+            return None, record
+
+        fixed, issues = Validation.validate_and_fix_diff(job.content)
+        record["issues"] = sum(issue.count for issue in issues)
+        parsed_diff, error = Patcher.parse_diff(fixed)
+        if parsed_diff is None:
+            record.update(success=False, message=f"Failed to parse diff: {error}")
+            return None, record
+        if resolver is not None:
+            parsed_diff = resolver.resolve_diff(parsed_diff)
+        record["path"] = parsed_diff.new_path
+        return parsed_diff, record
+
+    @staticmethod
+    def apply(parsed_diff: ParsedDiff, record: Record, options: ApplyOptions) -> Record:
+        """Apply a parsed diff and complete its result record."""
+        result = Patcher.apply_diff_with_details(
+            parsed_diff,
+            split_hunks=options.split_hunks,
+            merge=options.merge,
+            budget=options.budget(),
+            tiers=options.tiers(),
+        )
+        hunks = []
+        for hunk in result.hunk_results:
+            hunk_record: Record = {
+                "success": hunk.success,
+                "message": hunk.message,
+                "line": hunk.found_at + 1 if hunk.found_at >= 0 else None,
+                "strategy": hunk.strategy,
+            }
+            if hunk.budget_exhausted is not None:
+                hunk_record["budget_exhausted"] = hunk.budget_exhausted
+            if hunk.conflicts:
+                hunk_record["conflicts"] = hunk.conflicts
+            hunks.append(hunk_record)
+        record.update(success=result.success, message=result.message, hunks=hunks)
+        if result.conflicts:
+            record["conflicts"] = result.conflicts
+        if result.leftover is not None:
+            record["leftover"] = Patcher.format_diff(result.leftover)
+        return record
+
+    @staticmethod
+    def _apply_group(
+        group: List[Tuple[int, ParsedDiff, Record]], options: ApplyOptions
+    ) -> Tuple[List[Tuple[int, Record]], Optional[TierStats]]:
+        """
+        Apply the diffs of one target file in order (runs in a worker).
+
+        Returns:
+            Tuple of ((index, record) per diff, tier counts recorded by the
+            worker for the parent to merge, or None without statistics)
+        """
+        options.configure_rules()
+        before = copy.deepcopy(options.tier_stats)
+        records = [
+            (index, BatchApplier.apply(parsed_diff, record, options))
+            for index, parsed_diff, record in group
+        ]
+        if options.tier_stats is None:
+            return records, None
+        return records, options.tier_stats.since(before)
+
+    @staticmethod
+    def run(
+        jobs: Iterator[DiffJob],
+        out: TextIO,
+        options: ApplyOptions,
+        workers: int = 1,
+        resolver: Optional[PathResolver] = None,
+        skip_duplicates: bool = False,
+    ) -> bool:
+        """
+        Apply every diff and write one JSON line per diff to `out`.
+
+        Results are written in input order. With a single worker each diff is
+        applied as soon as it is read; otherwise the diffs are grouped by
+        target file and the groups are spread across a process pool.
+
+        Args:
+            jobs: Diffs to apply
+            out: Stream receiving the JSON result lines
+            options: Apply options
+            workers: Number of processes
+            resolver: Resolves diff paths; shared by all diffs
+            skip_duplicates: Skip diffs with the same canonical form as an
+                earlier diff; they are reported with "duplicate_of" and the
+                outcome of that diff
+
+        Returns:
+            True if every diff applied successfully
+
+        Raises:
+            RuntimeError: If the job indexes do not run 0, 1, ... so some
+                results cannot be written in order
+        """
+        all_ok = True
+        options.configure_rules()
+        # Canonical digest -> index of the first diff with it
+        first_seen: Dict[str, int] = {}
+        # Index of a skipped diff -> index of the diff it duplicates
+        duplicates: Dict[int, int] = {}
+        # Index of the first diff with a digest -> its (id, success)
+        outcomes: Dict[int, Tuple[str, bool]] = {}
+
+        def is_duplicate(index: int, parsed_diff: ParsedDiff) -> bool:
+            if not skip_duplicates:
+                return False
+            digest = DiffCanonicalizer.digest(parsed_diff)
+            first = first_seen.setdefault(digest, index)
+            if first == index:
+                outcomes[index] = ("", False)
+                return False
+            duplicates[index] = first
+            return True
+
+        def emit(index: int, record: Record) -> None:
+            nonlocal all_ok
+            first = duplicates.pop(index, None)
+            if first is not None:
+                first_id, success = outcomes[first]
+                record.update(
+                    success=success,
+                    message=f"Skipped duplicate of {first_id}",
+                    duplicate_of=first_id,
+                )
+            elif index in outcomes:
+                outcomes[index] = (record["id"], record["success"])
+            all_ok = all_ok and record["success"]
+            out.write(json.dumps(record) + "\n")
+
+        if workers <= 1:
+            for job in jobs:
+                parsed_diff, record = BatchApplier.prepare(job, resolver)
+                if parsed_diff is not None and not is_duplicate(job.index, parsed_diff):
+                    record = BatchApplier.apply(parsed_diff, record, options)
+                emit(job.index, record)
+            return all_ok
+
+        done: Dict[int, Record] = {}
+        groups: Dict[str, List[Tuple[int, ParsedDiff, Record]]] = {}
+        total = 0
+        for job in jobs:
+            total += 1
+            parsed_diff, record = BatchApplier.prepare(job, resolver)
+            if parsed_diff is None or is_duplicate(job.index, parsed_diff):
+                done[job.index] = record
+            else:
+                key = os.path.realpath(parsed_diff.new_path)
+                groups.setdefault(key, []).append((job.index, parsed_diff, record))
+
+        next_index = 0
+        with ProcessPoolExecutor(max_workers=min(workers, max(len(groups), 1))) as pool:
+            pending = {
+                pool.submit(BatchApplier._apply_group, group, options)
+                for group in groups.values()
+            }
+            while True:
+                while next_index in done:
+                    emit(next_index, done.pop(next_index))
+                    next_index += 1
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    records, recorded = future.result()
+                    done.update(records)
+                    if recorded is not None:
+                        options.tier_stats.merge(recorded)
+        if next_index != total:
+            # Job indexes must run 0, 1, ... for results to come out in order
+            raise RuntimeError(
+                f"Wrote results for {next_index} of {total} diffs; "
+                f"diff {next_index} is missing"
+            )
+        return all_ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the command line interface.
+
+    Args:
+        argv: Arguments without the program name; defaults to sys.argv[1:]
+
+    Returns:
+        Exit status: 0 if every diff applied, 1 otherwise
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m patcher", description="Apply unified diffs in batch."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser(
+        "apply",
+        help="apply diffs and print one JSON result per diff",
+        description="Apply diffs from directories, files or globs, or from a "
+        'JSONL stream of {"id": ..., "diff": ...} objects on stdin. With '
+        "--transcripts the sources are chat transcripts or session logs and "
+        "every fenced diff block in them is applied.",
+    )
+    apply_parser.add_argument(
+        "sources",
+        nargs="*",
+        help="directories, diff files or glob patterns; '-' or none reads JSONL "
+        "from stdin",
+    )
+    apply_parser.add_argument(
+        "--transcripts",
+        action="store_true",
+        help="read fenced diff blocks from transcripts instead of diff files",
+    )
+    apply_parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="number of worker processes"
+    )
+    apply_parser.add_argument(
+        "--split-hunks",
+        action="store_true",
+        help="apply the hunks that fit and report the rest as a leftover diff",
+    )
+    apply_parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="three-way merge hunks whose context has drifted",
+    )
+    apply_parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="give up searching for the hunks of a diff after this long",
+    )
+    apply_parser.add_argument(
+        "--tier-stats",
+        metavar="PATH",
+        help="order the fuzzy matching tiers by the hit statistics kept in "
+        "this file, and update it",
+    )
+    apply_parser.add_argument(
+        "--source",
+        default="default",
+        help="name of the diff source the tier statistics are kept for",
+    )
+    apply_parser.add_argument(
+        "--skip-duplicates",
+        action="store_true",
+        help="skip diffs that only repeat an earlier diff up to line numbers, "
+        "headers and whitespace",
+    )
+    apply_parser.add_argument(
+        "--no-resolve",
+        action="store_true",
+        help="use diff paths as given instead of searching the project files",
+    )
+    apply_parser.add_argument(
+        "--disable-rule",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="switch off a repair rule (see --rule-stats for the names)",
+    )
+    apply_parser.add_argument(
+        "--rule-stats",
+        action="store_true",
+        help="print the calls, hits and time of every repair rule to stderr",
+    )
+    args = parser.parse_args(argv)
+
+    unknown_rules = [name for name in args.disable_rule if RULES.get(name) is None]
+    if unknown_rules:
+        parser.error(f"unknown rule: {', '.join(unknown_rules)}")
+    tier_stats = None
+    if args.tier_stats:
+        try:
+            tier_stats = TierStats.load(args.tier_stats)
+        except ValueError as e:
+            parser.error(str(e))
+    options = ApplyOptions(
+        split_hunks=args.split_hunks,
+        merge=args.merge,
+        disabled_rules=tuple(args.disable_rule),
+        timeout=args.timeout,
+        tier_stats=tier_stats,
+        source=args.source,
+    )
+    if "-" in args.sources and args.sources != ["-"]:
+        parser.error("'-' cannot be combined with other sources")
+    if args.transcripts:
+        if not args.sources or args.sources == ["-"]:
+            jobs = BatchApplier.read_transcript_stream(sys.stdin.buffer)
+        else:
+            jobs = BatchApplier.read_transcripts(args.sources)
+    elif not args.sources or args.sources == ["-"]:
+        jobs = BatchApplier.read_jsonl(sys.stdin)
+    else:
+        jobs = BatchApplier.read_files(args.sources)
+
+    resolver = None if args.no_resolve else PathResolver()
+    ok = BatchApplier.run(
+        jobs,
+        sys.stdout,
+        options,
+        workers=args.jobs,
+        resolver=resolver,
+        skip_duplicates=args.skip_duplicates,
+    )
+    sys.stdout.flush()
+    if args.rule_stats:
+        # Counters of this process; with --jobs, matching runs in the workers
+        json.dump(RULES.stats(), sys.stderr, indent=2)
+        sys.stderr.write("\n")
+    if tier_stats is not None:
+        tier_stats.save(args.tier_stats)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
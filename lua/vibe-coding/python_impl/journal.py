@@ -0,0 +1,300 @@
+"""
+Append-only undo journal for applied diffs - Python implementation
+Records content hashes and minimal line edits so applies can be reverted.
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+from patcher import FileLines, Patcher
+
+
+@dataclass
+class LineEdit:
+    """A single replacement of a line range, in pre-apply coordinates."""
+
+    start: int
+    old_lines: List[str]
+    new_lines: List[str]
+
+
+@dataclass
+class JournalEntry:
+    """Represents one recorded apply (or the undo of an earlier one)."""
+
+    entry_id: int
+    path: str
+    before_hash: str
+    after_hash: str
+    edits: List[LineEdit] = field(default_factory=list)
+    timestamp: float = 0.0
+    created: bool = False
+    reverts: Optional[int] = None
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the content hash of file bytes, as recorded in the journal."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def compute_line_edits(before: List[str], after: List[str]) -> List[LineEdit]:
+    """
+    Compute the minimal line edits turning `before` into `after`.
+
+    The common prefix and suffix are trimmed first so that localized changes to
+    huge files only pay for the changed region.
+
+    Args:
+        before: Lines before the change
+        after: Lines after the change
+
+    Returns:
+        Edits ordered by position in `before`
+    """
+    prefix = 0
+    limit = min(len(before), len(after))
+    while prefix < limit and before[prefix] == after[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while (
+        suffix < limit
+        and before[len(before) - 1 - suffix] == after[len(after) - 1 - suffix]
+    ):
+        suffix += 1
+
+    old_middle = before[prefix : len(before) - suffix]
+    new_middle = after[prefix : len(after) - suffix]
+    if not old_middle and not new_middle:
+        return []
+
+    edits = []
+    matcher = SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        edits.append(
+            LineEdit(
+                start=prefix + i1,
+                old_lines=old_middle[i1:i2],
+                new_lines=new_middle[j1:j2],
+            )
+        )
+    return edits
+
+
+def revert_line_edits(after: List[str], edits: List[LineEdit]) -> List[str]:
+    """
+    Undo `edits` on the post-apply lines.
+
+    Args:
+        after: Lines after the edits were applied
+        edits: Edits as returned by compute_line_edits
+
+    Returns:
+        The pre-apply lines
+    """
+    result = []
+    pos = 0  # Position in `after`
+    shift = 0  # Lines added minus lines removed by the edits seen so far
+    for edit in edits:
+        new_start = edit.start + shift
+        result.extend(after[pos:new_start])
+        result.extend(edit.old_lines)
+        pos = new_start + len(edit.new_lines)
+        shift += len(edit.new_lines) - len(edit.old_lines)
+    result.extend(after[pos:])
+    return result
+
+
+class Journal:
+    """Append-only journal of applied diffs stored as JSON lines."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[List[JournalEntry]] = None
+
+    def entries(self) -> List[JournalEntry]:
+        """Return all journal entries, oldest first."""
+        if self._entries is None:
+            self._entries = []
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            self._entries.append(self._decode(json.loads(line)))
+        return self._entries
+
+    def record(
+        self,
+        filepath: str,
+        before: FileLines,
+        after: FileLines,
+        created: bool = False,
+        reverts: Optional[int] = None,
+    ) -> JournalEntry:
+        """
+        Append an entry describing the change from `before` to `after`.
+
+        The hashes are taken over the content as written to disk, in its own
+        encoding, byte order mark and line endings, so they agree with the
+        ones large-file mode records.
+
+        Args:
+            filepath: File that was changed
+            before: File content before the change
+            after: File content after the change
+            created: Whether the change created the file
+            reverts: Entry id this change undoes, if any
+
+        Returns:
+            The recorded entry
+        """
+        return self.record_edits(
+            filepath,
+            hash_bytes(before.to_bytes()),
+            hash_bytes(after.to_bytes()),
+            compute_line_edits(before.to_lines(), after.to_lines()),
+            created=created,
+            reverts=reverts,
+        )
+
+    def record_edits(
+        self,
+        filepath: str,
+        before_hash: str,
+        after_hash: str,
+        edits: List[LineEdit],
+        created: bool = False,
+        reverts: Optional[int] = None,
+    ) -> JournalEntry:
+        """
+        Append an entry from precomputed hashes and edits.
+
+        Used when the full file content is not in memory, e.g. in large-file
+        mode. Hashes must be sha256 digests of the file bytes.
+
+        Args:
+            filepath: File that was changed
+            before_hash: Content hash before the change
+            after_hash: Content hash after the change
+            edits: Line edits in pre-change coordinates
+            created: Whether the change created the file
+            reverts: Entry id this change undoes, if any
+
+        Returns:
+            The recorded entry
+        """
+        entries = self.entries()
+        entry = JournalEntry(
+            entry_id=entries[-1].entry_id + 1 if entries else 1,
+            path=os.path.abspath(filepath),
+            before_hash=before_hash,
+            after_hash=after_hash,
+            edits=edits,
+            timestamp=time.time(),
+            created=created,
+            reverts=reverts,
+        )
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(entry), separators=(",", ":")) + "\n")
+        entries.append(entry)
+        return entry
+
+    def get(self, entry_id: int) -> Optional[JournalEntry]:
+        """Return the entry with the given id, or None."""
+        for entry in self.entries():
+            if entry.entry_id == entry_id:
+                return entry
+        return None
+
+    def undoable(self) -> List[JournalEntry]:
+        """Return apply entries that have not been undone, oldest first."""
+        reverted = {e.reverts for e in self.entries() if e.reverts is not None}
+        return [
+            e
+            for e in self.entries()
+            if e.reverts is None and e.entry_id not in reverted
+        ]
+
+    def undo(self, entry_id: int) -> Tuple[bool, str]:
+        """
+        Undo a single recorded apply.
+
+        The file must still have the content the apply produced; changes made
+        afterwards have to be undone first.
+
+        Args:
+            entry_id: Id of the entry to undo
+
+        Returns:
+            Tuple of (success, message)
+        """
+        entry = self.get(entry_id)
+        if entry is None:
+            return False, f"No journal entry {entry_id}"
+        if entry.reverts is not None:
+            return False, f"Journal entry {entry_id} is itself an undo"
+        if entry not in self.undoable():
+            return False, f"Journal entry {entry_id} was already undone"
+
+        current = Patcher.read_file(entry.path)
+        if current is None:
+            return False, f"Failed to read file {entry.path}"
+        if hash_bytes(current.to_bytes()) != entry.after_hash:
+            return (
+                False,
+                f"File {entry.path} changed since journal entry {entry_id}; "
+                "undo later changes first",
+            )
+
+        restored = FileLines.from_lines(
+            revert_line_edits(current.to_lines(), entry.edits)
+        )
+        restored.encoding, restored.bom = current.encoding, current.bom
+        if entry.created:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                return False, f"Failed to remove file {entry.path}"
+        elif not Patcher.write_file(entry.path, restored):
+            return False, f"Failed to write file {entry.path}"
+
+        self.record(entry.path, current, restored, reverts=entry_id)
+        return True, f"Undid journal entry {entry_id} on {entry.path}"
+
+    def undo_last(self, count: int = 1) -> Tuple[bool, str]:
+        """
+        Undo the most recent `count` applies, newest first.
+
+        Args:
+            count: Number of applies to undo
+
+        Returns:
+            Tuple of (success, message)
+        """
+        pending = self.undoable()
+        if count > len(pending):
+            return False, f"Only {len(pending)} journal entries can be undone"
+
+        for entry in reversed(pending[len(pending) - count :]):
+            success, message = self.undo(entry.entry_id)
+            if not success:
+                return False, message
+        return True, f"Undid {count} journal entries"
+
+    @staticmethod
+    def _decode(data: dict) -> JournalEntry:
+        """Build a JournalEntry from its JSON form."""
+        data["edits"] = [LineEdit(**edit) for edit in data.get("edits", [])]
+        return JournalEntry(**data)
@@ -0,0 +1,518 @@
+"""
+Memory-mapped large-file mode - Python implementation
+Applies diffs to very large files without loading them into memory.
+"""
+
+import bisect
+import codecs
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from array import array
+from typing import List, Optional, Tuple
+
+from journal import LineEdit
+from patcher import (
+    ASCII_COMPATIBLE_ENCODINGS,
+    ENCODING_SNIFF_SIZE,
+    Edit,
+    Hunk,
+    LineIndex,
+    ParsedDiff,
+    Patcher,
+    detect_encoding,
+    trim_edit,
+)
+
+NEWLINE_PATTERN = re.compile(b"\n")
+
+
+class MappedFile:
+    """
+    Read-only memory map of a file with a lazily built line-offset index.
+
+    Line start offsets are stored in an `array` and only scanned as far as a
+    lookup needs, so locating a hunk near the top of a huge file never touches
+    the rest of it. Lines are decoded one window at a time.
+    """
+
+    # Bytes scanned for line breaks per extension of the offset index
+    SCAN_BLOCK_SIZE = 1 << 20
+
+    def __init__(self, path: str, encoding: str = "utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        # Empty files cannot be mapped; an empty bytes object has the same API
+        self.mm = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else b""
+        )
+        self.offsets = array("Q", [0])
+        self._scanned = 0
+        self._complete = self.size == 0
+        self.newline = self._detect_newline()
+        self.ends_with_newline = self.size > 0 and self.mm[-1] == ord("\n")
+
+    def _detect_newline(self) -> bytes:
+        """
+        Pick the line ending convention like FileLines.from_text.
+
+        CRLF is only used when every line break is one; files mixing
+        conventions use LF and keep any "\r" as part of the line.
+        """
+        line_feeds = crlfs = 0
+        for pos in range(0, self.size, self.SCAN_BLOCK_SIZE):
+            # One byte of overlap so a CRLF across blocks is counted once
+            block = self.mm[pos : pos + self.SCAN_BLOCK_SIZE + 1]
+            line_feeds += block.count(b"\n", 0, self.SCAN_BLOCK_SIZE)
+            crlfs += block.count(b"\r\n")
+        return b"\r\n" if line_feeds and crlfs == line_feeds else b"\n"
+
+    def decodes_as(self, encoding: str) -> bool:
+        """Check, one block at a time, that the whole file is valid text."""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            for pos in range(0, self.size, self.SCAN_BLOCK_SIZE):
+                decoder.decode(self.mm[pos : pos + self.SCAN_BLOCK_SIZE])
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Release the mapping and the file handle."""
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "MappedFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _scan_block(self) -> None:
+        """Extend the offset index over the next block of the file."""
+        start = self._scanned
+        end = min(start + self.SCAN_BLOCK_SIZE, self.size)
+        self.offsets.extend(
+            start + match.end()
+            for match in NEWLINE_PATTERN.finditer(self.mm[start:end])
+        )
+        self._scanned = end
+        if end >= self.size:
+            self._complete = True
+            # A final line break does not start another line
+            if self.offsets[-1] >= self.size:
+                self.offsets.pop()
+
+    def line_start(self, line: int) -> int:
+        """Return the byte offset where `line` starts (file size past the end)."""
+        while len(self.offsets) <= line and not self._complete:
+            self._scan_block()
+        return self.offsets[line] if line < len(self.offsets) else self.size
+
+    def line_of(self, offset: int) -> int:
+        """Return the line containing byte `offset`."""
+        while self._scanned <= offset and not self._complete:
+            self._scan_block()
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def line_count(self) -> int:
+        """Return the number of lines, scanning the whole file if needed."""
+        while not self._complete:
+            self._scan_block()
+        return len(self.offsets) if self.size else 0
+
+    def raw_line(self, line: int) -> bytes:
+        """Return the bytes of `line` including its line ending."""
+        return self.mm[self.line_start(line) : self.line_start(line + 1)]
+
+    def line(self, line: int) -> str:
+        """Return the decoded text of `line` without its line ending."""
+        start = self.line_start(line)
+        end = self.line_start(line + 1)
+        if end > start and self.mm[end - 1] == ord("\n"):
+            end -= 1
+            if (
+                self.newline == b"\r\n"
+                and end > start
+                and self.mm[end - 1] == ord("\r")
+            ):
+                end -= 1
+        return self.mm[start:end].decode(self.encoding, "replace")
+
+    def __getitem__(self, line: int) -> str:
+        """Return the decoded text of `line`, so the file reads like a list."""
+        return self.line(line)
+
+    def lines(self, start: int, count: int) -> List[str]:
+        """Decode up to `count` lines starting at `start`."""
+        result = []
+        for line in range(start, start + count):
+            if self.line_start(line) >= self.size:
+                break
+            result.append(self.line(line))
+        return result
+
+
+class LargeFilePatcher:
+    """Applies diffs to memory-mapped files, streaming the result to disk."""
+
+    # Bytes copied per write when streaming unchanged regions
+    COPY_CHUNK_SIZE = 1 << 20
+
+    @staticmethod
+    def find_exact(mapped: MappedFile, search_lines: List[str]) -> List[int]:
+        """
+        List every line where the search block occurs verbatim.
+
+        The encoded block is searched directly in the mapping; only matches
+        that start and end on line boundaries are kept.
+
+        Args:
+            mapped: The mapped file
+            search_lines: Lines to search for
+
+        Returns:
+            Sorted start lines of the matches
+        """
+        block = mapped.newline.join(
+            line.encode(mapped.encoding) for line in search_lines
+        )
+        if not block.strip():
+            return []
+
+        mm = mapped.mm
+        newline = mapped.newline
+        positions = []
+        pos = mm.find(block)
+        while pos != -1:
+            end = pos + len(block)
+            at_line_start = pos == 0 or mm[pos - 1] == ord("\n")
+            at_line_end = end == mapped.size or mm[end : end + len(newline)] == newline
+            if at_line_start and at_line_end:
+                positions.append(mapped.line_of(pos))
+            pos = mm.find(block, pos + 1)
+        return positions
+
+    @staticmethod
+    def find_whitespace_insensitive(
+        mapped: MappedFile, search_lines: List[str]
+    ) -> Tuple[int, List[str]]:
+        """
+        Find the search block ignoring surrounding whitespace on each line.
+
+        The longest search line is used as the anchor; only the windows
+        around its occurrences are decoded and compared.
+
+        Args:
+            mapped: The mapped file
+            search_lines: Lines to search for
+
+        Returns:
+            Tuple of (start line or -1, decoded window lines)
+        """
+        stripped_search_lines = [line.strip() for line in search_lines]
+        anchor_offset = max(
+            range(len(stripped_search_lines)),
+            key=lambda j: len(stripped_search_lines[j]),
+        )
+        anchor = stripped_search_lines[anchor_offset].encode(mapped.encoding)
+        if not anchor:
+            return -1, []
+
+        pos = mapped.mm.find(anchor)
+        while pos != -1:
+            line = mapped.line_of(pos)
+            start = line - anchor_offset
+            if start >= 0 and mapped.line(line).strip() == stripped_search_lines[
+                anchor_offset
+            ]:
+                window = mapped.lines(start, len(search_lines))
+                if [w.strip() for w in window] == stripped_search_lines:
+                    return start, window
+            pos = mapped.mm.find(anchor, mapped.line_start(line + 1))
+        return -1, []
+
+    @staticmethod
+    def locate_hunk(mapped: MappedFile, hunk: Hunk) -> Tuple[Optional[Edit], str]:
+        """
+        Locate a hunk in the original file and build its edit.
+
+        Args:
+            mapped: The mapped original file
+            hunk: The hunk to locate
+
+        Returns:
+            Tuple of (edit or None, message)
+        """
+        if not hunk.lines:
+            return None, "Empty hunk"
+
+        search_lines, replacement_lines, replacement_sources = (
+            Patcher._build_search_and_replacement(hunk)
+        )
+        if not search_lines:
+            end = mapped.line_count()
+            return (end, end, replacement_lines), "Applied pure addition hunk"
+
+        header_numbers = Patcher.parse_hunk_header(hunk.header)
+        line_hint = max(header_numbers[0] - 1, 0) if header_numbers else None
+
+        candidates, _ = Patcher._rank_candidates(
+            LargeFilePatcher.find_exact(mapped, search_lines), line_hint
+        )
+        if candidates:
+            found_at = candidates[0]
+            return (
+                (found_at, found_at + len(search_lines), replacement_lines),
+                f"Applied hunk at line {found_at + 1}",
+            )
+
+        found_at, window = LargeFilePatcher.find_whitespace_insensitive(
+            mapped, search_lines
+        )
+        if found_at != -1:
+            # Same preference as in memory: a uniform indent shift first
+            shifted_at, delta = Patcher._try_indent_shift_matching(
+                LineIndex(window), search_lines
+            )
+            if shifted_at == 0:
+                adjusted_lines = Patcher._reindent_replacement(
+                    window, 0, replacement_lines, replacement_sources, delta
+                )
+            else:
+                adjusted_lines = Patcher._adjust_replacement_indentation(
+                    window, 0, search_lines, replacement_lines
+                )
+            return (
+                (found_at, found_at + len(search_lines), adjusted_lines),
+                f"Applied hunk at line {found_at + 1}",
+            )
+
+        return None, "Could not find this context in the file"
+
+    @staticmethod
+    def apply_diff(
+        parsed_diff: ParsedDiff, journal=None, jobs: Optional[int] = None
+    ) -> Tuple[bool, str]:
+        """
+        Apply a parsed diff to a large file without reading it into memory.
+
+        All hunks are located against the original file and must not
+        conflict (see Patcher.find_conflicts). The result is streamed into a
+        temporary file that then replaces the target.
+
+        Hunks are only matched exactly or ignoring surrounding whitespace
+        (with the in-memory indent handling). When a hunk is not found that
+        way, the diff is applied by the in-memory mode instead, with all its
+        matching tiers. Files with a byte order mark or in encodings that are
+        not ASCII-compatible, such as UTF-16, also use the in-memory mode.
+        As in memory, content that is not valid UTF-8 is read as Latin-1.
+
+        Args:
+            parsed_diff: The parsed diff to apply
+            journal: Optional journal.Journal that records the applied change
+            jobs: Worker processes of the in-memory mode when the diff falls
+                back to it; see Patcher.apply_diff_with_details
+
+        Returns:
+            Tuple of (success, message)
+        """
+        if parsed_diff.new_path == "/dev/null":
+            return True, f"Skipped file deletion for {parsed_diff.old_path}"
+        if parsed_diff.old_path == "/dev/null":
+            return Patcher.apply_diff(
+                parsed_diff, journal, jobs=jobs, large_file=False
+            )
+
+        try:
+            mapped = MappedFile(parsed_diff.old_path)
+        except (OSError, ValueError):
+            return False, f"Failed to read file {parsed_diff.old_path}"
+
+        encoding, bom = detect_encoding(mapped.mm[:ENCODING_SNIFF_SIZE])
+        if encoding not in ASCII_COMPATIBLE_ENCODINGS or bom:
+            # Line offsets are found by scanning for b"\n", which needs an
+            # ASCII-compatible encoding, and line 0 must not start with a mark
+            mapped.close()
+            return Patcher.apply_diff(
+                parsed_diff, journal, jobs=jobs, large_file=False
+            )
+        if not mapped.decodes_as(encoding):
+            # Same fallback as FileLines.from_bytes
+            mapped.encoding = "latin-1"
+
+        with mapped:
+            edits = []
+            for hunk in parsed_diff.hunks:
+                edit, _ = LargeFilePatcher.locate_hunk(mapped, hunk)
+                if edit is None:
+                    # The fuzzier tiers, and hunks that only match once an
+                    # earlier one is applied, need the in-memory mode
+                    mapped.close()
+                    return Patcher.apply_diff(
+                parsed_diff, journal, jobs=jobs, large_file=False
+            )
+                edits.append(edit)
+
+            conflicts = Patcher.find_conflicts(mapped, edits)
+            if not conflicts:
+                # Write only the changed lines so hunks sharing context fit
+                # together; edits reaching the end of the file stay whole to
+                # keep their end-of-file handling
+                edits = [
+                    edit
+                    if mapped.line_start(edit[1]) >= mapped.size
+                    else trim_edit(mapped, edit)
+                    for edit in edits
+                ]
+                order = sorted(range(len(edits)), key=lambda k: edits[k][:2])
+                conflicts = sorted(
+                    (min(first, second), max(first, second))
+                    for first, second in zip(order, order[1:])
+                    if edits[second][0] < edits[first][1]
+                )
+            if conflicts:
+                return False, Patcher.describe_conflicts(conflicts)
+            edits = [edits[k] for k in order]
+
+            written = LargeFilePatcher._write_streamed(
+                mapped, edits, parsed_diff.new_path
+            )
+            if written is None:
+                return False, f"Failed to write file {parsed_diff.new_path}"
+            temp_path, before_hash, after_hash = written
+
+            journal_edits = None
+            if journal is not None:
+                journal_edits = LargeFilePatcher._journal_edits(mapped, edits)
+
+        try:
+            os.replace(temp_path, parsed_diff.new_path)
+        except OSError:
+            os.unlink(temp_path)
+            return False, f"Failed to write file {parsed_diff.new_path}"
+
+        if journal is not None:
+            journal.record_edits(
+                parsed_diff.new_path, before_hash, after_hash, journal_edits
+            )
+
+        return (
+            True,
+            f"Successfully applied {len(edits)} hunks to {parsed_diff.new_path}",
+        )
+
+    @staticmethod
+    def _appends_to_unterminated_file(mapped: MappedFile, edit: Edit) -> bool:
+        """Check whether an edit appends after a last line with no line ending."""
+        start, end, replacement_lines = edit
+        return (
+            start == end
+            and bool(replacement_lines)
+            and mapped.size > 0
+            and not mapped.ends_with_newline
+            and mapped.line_start(start) >= mapped.size
+        )
+
+    @staticmethod
+    def _encode_replacement(mapped: MappedFile, edit: Edit) -> List[bytes]:
+        """Encode an edit's replacement lines with the file's line endings."""
+        start, end, replacement_lines = edit
+        newline = mapped.newline
+        encoded = [line.encode(mapped.encoding) + newline for line in replacement_lines]
+
+        if start < end and mapped.line_start(end) >= mapped.size:
+            # Same end-of-file handling as the in-memory apply_hunk
+            while encoded and encoded[-1] == newline:
+                encoded.pop()
+            if encoded and not mapped.ends_with_newline:
+                encoded[-1] = encoded[-1][: -len(newline)]
+        elif LargeFilePatcher._appends_to_unterminated_file(mapped, edit):
+            encoded.insert(0, newline)
+        return encoded
+
+    @staticmethod
+    def _write_streamed(
+        mapped: MappedFile, edits: List[Edit], target: str
+    ) -> Optional[Tuple[str, str, str]]:
+        """
+        Stream the original with `edits` applied into a temporary file.
+
+        Args:
+            mapped: The mapped original file
+            edits: Non-overlapping edits sorted by start line
+            target: Path the temporary file will replace
+
+        Returns:
+            Tuple of (temporary path, hash before, hash after) or None on error
+        """
+        directory = os.path.dirname(os.path.abspath(target))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".vibe-tmp")
+        except OSError:
+            return None
+
+        before = hashlib.sha256()
+        after = hashlib.sha256()
+        chunk = LargeFilePatcher.COPY_CHUNK_SIZE
+        try:
+            with os.fdopen(fd, "wb") as out, memoryview(mapped.mm) as view:
+
+                def copy(start: int, end: int) -> None:
+                    for pos in range(start, end, chunk):
+                        data = view[pos : min(pos + chunk, end)]
+                        out.write(data)
+                        after.update(data)
+
+                pos = 0
+                for edit in edits:
+                    start = mapped.line_start(edit[0])
+                    copy(pos, start)
+                    for data in LargeFilePatcher._encode_replacement(mapped, edit):
+                        out.write(data)
+                        after.update(data)
+                    pos = mapped.line_start(edit[1])
+                copy(pos, mapped.size)
+
+                for pos in range(0, mapped.size, chunk):
+                    before.update(view[pos : min(pos + chunk, mapped.size)])
+
+            if os.path.exists(mapped.path):
+                os.chmod(temp_path, os.stat(mapped.path).st_mode & 0o7777)
+        except (OSError, UnicodeEncodeError):
+            os.unlink(temp_path)
+            return None
+
+        return temp_path, before.hexdigest(), after.hexdigest()
+
+    @staticmethod
+    def _journal_edits(mapped: MappedFile, edits: List[Edit]) -> List[LineEdit]:
+        """Describe the edits as journal line edits with line endings."""
+        journal_edits = []
+        for edit in edits:
+            start, end, _ = edit
+            old_lines = [
+                mapped.raw_line(line).decode(mapped.encoding, "replace")
+                for line in range(start, end)
+            ]
+            new_lines = [
+                data.decode(mapped.encoding)
+                for data in LargeFilePatcher._encode_replacement(mapped, edit)
+            ]
+            if LargeFilePatcher._appends_to_unterminated_file(mapped, edit):
+                # The old last line gains the line ending written before it
+                start -= 1
+                old_lines = [mapped.raw_line(start).decode(mapped.encoding, "replace")]
+                new_lines = [old_lines[0] + new_lines[0]] + new_lines[1:]
+            if old_lines or new_lines:
+                journal_edits.append(LineEdit(start, old_lines, new_lines))
+        return journal_edits
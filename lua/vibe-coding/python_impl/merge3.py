@@ -0,0 +1,318 @@
+"""
+Three-way merge fallback for drifted context - Python implementation
+Merges a hunk into a file that changed since the diff was made.
+"""
+
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from patcher import Edit, Hunk, HunkResult, LineIndex, Patcher
+
+# A region where base, current and result agree: (base start, base end,
+# current start, result start)
+SyncRegion = Tuple[int, int, int, int]
+
+# Conflict markers; the base section follows diff3 conventions
+CONFLICT_START = "<<<<<<< current"
+CONFLICT_BASE = "||||||| base"
+CONFLICT_SEPARATOR = "======="
+CONFLICT_END = ">>>>>>> patch"
+
+
+class Merge3:
+    """
+    diff3-style merge of a hunk into the current file.
+
+    The hunk's context and removed lines are taken as the base the diff was
+    made against, and its context and added lines as the result. The part of
+    the file matching the base best is merged with both, so changes made to
+    the file since then are kept and only changes that really collide are
+    marked as conflicts.
+    """
+
+    # Base lines occurring more often than this are not used to place it
+    MAX_ANCHOR_OCCURRENCES = 64
+
+    # Share of base lines that must be found in the file to attempt a merge
+    MIN_MATCHED_FRACTION = 0.5
+
+    @staticmethod
+    def _intern(lines: List[str], ids: Dict[str, int]) -> List[int]:
+        """Replace lines by small integers so sequence matching compares ints."""
+        return [ids.setdefault(line, len(ids)) for line in lines]
+
+    @staticmethod
+    def sync_regions(
+        base: List[int],
+        current: List[int],
+        result: List[int],
+        result_blocks: Optional[List[Tuple[int, int, int]]] = None,
+    ) -> List[SyncRegion]:
+        """
+        Find the regions where all three versions agree.
+
+        Args:
+            base: Base lines as ids
+            current: Current lines as ids
+            result: Result lines as ids
+            result_blocks: Matching blocks (base start, result start, length)
+                of base and result, computed if not given
+
+        Returns:
+            Sync regions in order, ending with an empty region at the end of
+            all three versions
+        """
+        current_blocks = SequenceMatcher(
+            None, base, current, autojunk=False
+        ).get_matching_blocks()
+        if result_blocks is None:
+            result_blocks = SequenceMatcher(
+                None, base, result, autojunk=False
+            ).get_matching_blocks()
+
+        regions = []
+        i = j = 0
+        while i < len(current_blocks) and j < len(result_blocks):
+            c_base, c_start, c_len = current_blocks[i]
+            r_base, r_start, r_len = result_blocks[j]
+            start = max(c_base, r_base)
+            end = min(c_base + c_len, r_base + r_len)
+            if start < end:
+                regions.append(
+                    (start, end, c_start + start - c_base, r_start + start - r_base)
+                )
+            if c_base + c_len < r_base + r_len:
+                i += 1
+            else:
+                j += 1
+        regions.append((len(base), len(base), len(current), len(result)))
+        return regions
+
+    @staticmethod
+    def merge_regions(
+        base: List[int],
+        current: List[int],
+        result: List[int],
+        result_blocks: Optional[List[Tuple[int, int, int]]] = None,
+    ) -> Iterator[Tuple[str, int, int, int, int, int, int]]:
+        """
+        Classify the stretches between sync regions.
+
+        Yields:
+            (kind, base start, base end, current start, current end, result
+            start, result end), where kind is "unchanged", "current" (only
+            the file changed), "result" (only the diff changed), "same" (both
+            made the same change) or "conflict"
+        """
+        base_pos = current_pos = result_pos = 0
+        for base_start, base_end, current_start, result_start in Merge3.sync_regions(
+            base, current, result, result_blocks
+        ):
+            in_base = base[base_pos:base_start]
+            in_current = current[current_pos:current_start]
+            in_result = result[result_pos:result_start]
+            if in_current or in_result:
+                if in_current == in_result:
+                    kind = "same"
+                elif in_current == in_base:
+                    kind = "result"
+                elif in_result == in_base:
+                    kind = "current"
+                else:
+                    kind = "conflict"
+                yield (
+                    kind,
+                    base_pos,
+                    base_start,
+                    current_pos,
+                    current_start,
+                    result_pos,
+                    result_start,
+                )
+
+            length = base_end - base_start
+            if length:
+                yield (
+                    "unchanged",
+                    base_start,
+                    base_end,
+                    current_start,
+                    current_start + length,
+                    result_start,
+                    result_start + length,
+                )
+            base_pos = base_end
+            current_pos = current_start + length
+            result_pos = result_start + length
+
+    @staticmethod
+    def merge_lines(
+        base: List[str],
+        current: List[str],
+        result: List[str],
+        result_blocks: Optional[List[Tuple[int, int, int]]] = None,
+    ) -> Tuple[List[str], int]:
+        """
+        Three-way merge of line lists.
+
+        Args:
+            base: Common ancestor lines
+            current: Lines changed on one side (the file)
+            result: Lines changed on the other side (the diff)
+            result_blocks: Matching blocks of base and result, if known
+
+        Returns:
+            Tuple of (merged lines, number of conflicts marked)
+        """
+        ids: Dict[str, int] = {}
+        base_ids = Merge3._intern(base, ids)
+        current_ids = Merge3._intern(current, ids)
+        result_ids = Merge3._intern(result, ids)
+
+        merged: List[str] = []
+        conflicts = 0
+        for kind, b0, b1, c0, c1, r0, r1 in Merge3.merge_regions(
+            base_ids, current_ids, result_ids, result_blocks
+        ):
+            if kind in ("unchanged", "current", "same"):
+                merged.extend(current[c0:c1])
+            elif kind == "result":
+                merged.extend(result[r0:r1])
+            else:
+                conflicts += 1
+                merged.append(CONFLICT_START)
+                merged.extend(current[c0:c1])
+                merged.append(CONFLICT_BASE)
+                merged.extend(base[b0:b1])
+                merged.append(CONFLICT_SEPARATOR)
+                merged.extend(result[r0:r1])
+                merged.append(CONFLICT_END)
+        return merged, conflicts
+
+    @staticmethod
+    def _hunk_blocks(
+        base_length: int, replacement_sources: List[Optional[int]]
+    ) -> List[Tuple[int, int, int]]:
+        """Matching blocks of base and result, read off the hunk's context lines."""
+        blocks: List[Tuple[int, int, int]] = []
+        for result_pos, base_pos in enumerate(replacement_sources):
+            if base_pos is None:
+                continue
+            if blocks:
+                last_base, last_result, length = blocks[-1]
+                if (last_base + length, last_result + length) == (base_pos, result_pos):
+                    blocks[-1] = (last_base, last_result, length + 1)
+                    continue
+            blocks.append((base_pos, result_pos, 1))
+        blocks.append((base_length, len(replacement_sources), 0))
+        return blocks
+
+    @staticmethod
+    def locate_base(
+        index: LineIndex, base: List[str], line_hint: Optional[int] = None
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Find the range of the file that corresponds to the base.
+
+        Each base line occurring in the file votes for the start position it
+        implies; the best supported start, nearest to the hint on ties, is
+        widened by the base length to absorb lines inserted or removed since,
+        then narrowed to the stretch that actually matches the base.
+
+        Args:
+            index: Line index of the file
+            base: Base lines reconstructed from the hunk
+            line_hint: Expected 0-based position of the base
+
+        Returns:
+            (start, end) of the matching range, or None if too little of the
+            base is found
+        """
+        votes: Dict[int, int] = {}
+        for offset, line in enumerate(base):
+            positions = index.find(line)
+            if len(positions) > Merge3.MAX_ANCHOR_OCCURRENCES:
+                continue
+            for pos in positions:
+                votes[pos - offset] = votes.get(pos - offset, 0) + 1
+        if not votes:
+            return None
+
+        hint = line_hint if line_hint is not None else 0
+        start = min(votes, key=lambda s: (-votes[s], abs(s - hint), s))
+        lines = index.lines
+        window_start = max(start - len(base), 0)
+        window_end = min(start + 2 * len(base), len(lines))
+
+        blocks = [
+            block
+            for block in SequenceMatcher(
+                None, base, lines[window_start:window_end], autojunk=False
+            ).get_matching_blocks()
+            if block.size
+        ]
+        matched = sum(block.size for block in blocks)
+        if not blocks or matched < len(base) * Merge3.MIN_MATCHED_FRACTION:
+            return None
+
+        first, last = blocks[0], blocks[-1]
+        begin = window_start + first.b - first.a
+        end = window_start + last.b + last.size + (len(base) - last.a - last.size)
+        return max(begin, window_start), min(end, window_end)
+
+    @staticmethod
+    def merge_hunk(
+        text_lines: List[str],
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        index: Optional[LineIndex] = None,
+    ) -> Tuple[HunkResult, Optional[Edit]]:
+        """
+        Merge a hunk whose context no longer matches into the file.
+
+        Args:
+            text_lines: File content without newlines
+            hunk: The hunk to merge
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            index: Line index of text_lines, built if not given
+
+        Returns:
+            Tuple of (HunkResult, edit or None if the base cannot be placed)
+        """
+        base, result, sources = Patcher._build_search_and_replacement(hunk)
+        if not base:
+            return HunkResult(False, None, "Nothing to merge against"), None
+        if line_hint is None:
+            header_numbers = Patcher.parse_hunk_header(hunk.header)
+            if header_numbers:
+                line_hint = max(header_numbers[2] - 1, 0)
+
+        located = Merge3.locate_base(
+            index if index is not None else LineIndex(text_lines), base, line_hint
+        )
+        if located is None:
+            return (
+                HunkResult(False, None, "Could not find the hunk's base in the file"),
+                None,
+            )
+
+        start, end = located
+        merged, conflicts = Merge3.merge_lines(
+            base, text_lines[start:end], result, Merge3._hunk_blocks(len(base), sources)
+        )
+        message = f"Merged hunk at line {start + 1}"
+        if conflicts:
+            plural = "s" if conflicts > 1 else ""
+            message += f" with {conflicts} conflict{plural} marked"
+        return (
+            HunkResult(
+                True,
+                None,
+                message,
+                found_at=start,
+                strategy="merge3",
+                conflicts=conflicts,
+            ),
+            (start, end, merged),
+        )
@@ -0,0 +1,111 @@
+"""
+Parallel hunk location - Python implementation
+Locates the hunks of large diffs concurrently against the original file.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+from patcher import Edit, Hunk, HunkResult, LineIndex, Patcher
+
+# Diffs with fewer hunks are located in-process
+PARALLEL_MIN_HUNKS = 64
+
+# Hunks handed to a worker per task
+HUNKS_PER_TASK = 16
+
+# Worker state set up once per process by _init_worker
+_worker_lines: List[str] = []
+_worker_index: Optional[LineIndex] = None
+_worker_path: Optional[str] = None
+
+
+def _init_worker(
+    segment_name: str, size: int, line_count: int, path: Optional[str]
+) -> None:
+    """Load the original lines from shared memory and index them once."""
+    global _worker_lines, _worker_index, _worker_path
+    segment = shared_memory.SharedMemory(name=segment_name)
+    try:
+        text = bytes(segment.buf[:size]).decode("utf-8", "surrogatepass")
+    finally:
+        segment.close()
+    _worker_lines = text.split("\n") if line_count else []
+    _worker_index = LineIndex(_worker_lines)
+    _worker_path = path
+
+
+def _locate_task(hunks: List[Hunk]) -> List[Tuple[HunkResult, Optional[Edit]]]:
+    """Locate a batch of hunks against the worker's original lines."""
+    return [
+        Patcher.locate_edit(
+            _worker_lines,
+            hunk,
+            Patcher.original_line_hint(hunk),
+            _worker_path,
+            _worker_index,
+        )
+        for hunk in hunks
+    ]
+
+
+class ParallelLocator:
+    """
+    Locates hunks across a process pool.
+
+    Every hunk is located against the unmodified file, so hunks are
+    independent of each other. The file content is placed in a shared memory
+    segment once; each worker decodes it and builds its line index a single
+    time, then locates batches of hunks.
+    """
+
+    @staticmethod
+    def locate_edits(
+        text_lines: List[str],
+        hunks: List[Hunk],
+        path: Optional[str] = None,
+        jobs: Optional[int] = None,
+    ) -> List[Tuple[HunkResult, Optional[Edit]]]:
+        """
+        Locate every hunk against the original lines, in parallel if worthwhile.
+
+        Gives the same results as Patcher.locate_edits. Small diffs and a
+        single job are handled in-process.
+
+        Args:
+            text_lines: Original file content without newlines
+            hunks: Hunks to locate
+            path: Path of the file, used to pick the symbol parser
+            jobs: Number of worker processes; defaults to the CPU count
+
+        Returns:
+            (HunkResult, edit or None) for each hunk, in hunk order
+        """
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if jobs <= 1 or len(hunks) < PARALLEL_MIN_HUNKS:
+            return Patcher.locate_edits(text_lines, hunks, path)
+
+        data = "\n".join(text_lines).encode("utf-8", "surrogatepass")
+        # Shared memory segments cannot be empty
+        segment = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            segment.buf[: len(data)] = data
+            batches = [
+                hunks[i : i + HUNKS_PER_TASK]
+                for i in range(0, len(hunks), HUNKS_PER_TASK)
+            ]
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, len(batches)),
+                initializer=_init_worker,
+                initargs=(segment.name, len(data), len(text_lines), path),
+            ) as pool:
+                results = []
+                for batch_results in pool.map(_locate_task, batches):
+                    results.extend(batch_results)
+        finally:
+            segment.close()
+            segment.unlink()
+        return results
@@ -3,10 +3,43 @@ Generic diff parsing and applying module - Python implementation
 Implements the same generic logic as the Lua version.
 """
 
+import bisect
+import codecs
+import heapq
 import os
 import re
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+import threading
+import time
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from rules import RULES, Rule
+from symbols import SymbolIndex
+from tiers import REORDERABLE_TIERS, TierPolicy
+from validation import Validation
+
+# Hunk header, possibly with content joined onto it
+HUNK_HEADER_PATTERN = re.compile(r"^(@@ -\d+,?\d* \+\d+,?\d* @@)(.*)$")
+
+# Function definition joined with its docstring
+FUNC_DOCSTRING_PATTERN = re.compile(
+    r'^(\s*def\s+[^:]+:)(""".*?"""|\'\'\'.*?\'\'\')(.*)$', re.DOTALL
+)
+
+# Statement joined onto the line of its block keyword, e.g. "if x:return 0"
+JOINED_STATEMENT_PATTERN = re.compile(
+    r"^(\s*)(if|while|for|elif|else|try|except|finally|with)([^:]*:)(.+)$"
+)
+
+# Closing bracket directly followed by a Python keyword
+JOINED_KEYWORD_PATTERN = re.compile(
+    r"[)\]}](?=(?:except|if|elif|else|while|for|try|finally|with|def|class|import"
+    r"|from|return|raise|pass|break|continue|yield|async|await)\b)"
+)
+
+# Diff lines searched for the indentation of content cut from a hunk header
+INDENT_LOOKAHEAD = 10
 
 
 @dataclass
@@ -26,11 +59,477 @@ class ParsedDiff:
     hunks: List[Hunk]
 
 
+# An edit replaces lines [start, end) with the given lines
+Edit = Tuple[int, int, List[Any]]
+
+# Byte order marks and their encodings; UTF-32 LE must be tried before UTF-16 LE
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# Encodings whose bytes for ASCII text are the ASCII bytes themselves
+ASCII_COMPATIBLE_ENCODINGS = ("utf-8", "latin-1")
+
+# Bytes inspected when looking for UTF-16 without a byte order mark
+ENCODING_SNIFF_SIZE = 1024
+
+
+def detect_encoding(data: bytes) -> Tuple[str, bytes]:
+    """
+    Guess the encoding of file content from its first bytes.
+
+    A byte order mark decides the encoding. Without one, text where most odd
+    (even) bytes and no even (odd) bytes are NUL is taken as UTF-16 LE (BE);
+    anything else is reported as UTF-8, which callers may still have to
+    fall back from when decoding fails.
+
+    Args:
+        data: File content, or at least its first ENCODING_SNIFF_SIZE bytes
+
+    Returns:
+        Tuple of (encoding, byte order mark or b"")
+    """
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if data.startswith(bom):
+            return encoding, bom
+
+    sample = data[: ENCODING_SNIFF_SIZE // 2 * 2]
+    if len(sample) >= 2 and b"\x00" in sample:
+        even, odd = sample[0::2], sample[1::2]
+        if b"\x00" not in even and odd.count(0) * 4 >= len(odd) * 3:
+            return "utf-16-le", b""
+        if b"\x00" not in odd and even.count(0) * 4 >= len(even) * 3:
+            return "utf-16-be", b""
+    return "utf-8", b""
+
+
+def ends_file_with_newline(line_count: int, edit: Edit) -> bool:
+    """
+    Tell whether an edit leaves the file ending with a newline.
+
+    Lines appended at the end are newline-terminated, and removing the end of
+    the file makes the preceding line, which has a newline, the last one.
+    Other edits keep the file's final newline (or lack of it).
+
+    Args:
+        line_count: Number of lines the edit was located against
+        edit: The edit
+
+    Returns:
+        True if the file must end with a newline after the edit
+    """
+    start, end, replacement = edit
+    if end != line_count:
+        return False
+    return bool(replacement) if start == end else not replacement
+
+
+def trim_edit(lines: List[Any], edit: Edit) -> Edit:
+    """
+    Shrink an edit to the lines it changes.
+
+    Context lines that the replacement repeats unchanged at either end are
+    dropped, so edits that only share context no longer overlap.
+
+    Args:
+        lines: Lines the edit was located against
+        edit: The edit
+
+    Returns:
+        The edit without its unchanged leading and trailing lines
+    """
+    start, end, replacement = edit
+    prefix = 0
+    limit = min(end - start, len(replacement))
+    while prefix < limit and lines[start + prefix] == replacement[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while (
+        suffix < limit
+        and lines[end - 1 - suffix] == replacement[len(replacement) - 1 - suffix]
+    ):
+        suffix += 1
+    return start + prefix, end - suffix, replacement[prefix : len(replacement) - suffix]
+
+
+def splice_edits(lines: List[Any], edits: List[Edit]) -> Tuple[List[Any], bool]:
+    """
+    Apply edits located against the same lines in a single pass.
+
+    Edits may share unchanged context lines, but the lines they change must
+    not overlap (see Patcher.find_conflicts). Insertions at the same position
+    keep the order of `edits`.
+
+    Args:
+        lines: Lines the edits were located against
+        edits: The edits, in hunk order
+
+    Returns:
+        Tuple of (new lines, whether the file must end with a newline)
+    """
+    ends_with_newline = any(ends_file_with_newline(len(lines), edit) for edit in edits)
+    trimmed = sorted(
+        (trim_edit(lines, edit) for edit in edits), key=lambda edit: edit[:2]
+    )
+
+    result: List[Any] = []
+    pos = 0
+    for start, end, replacement in trimmed:
+        result.extend(lines[pos:start])
+        result.extend(replacement)
+        pos = end
+    result.extend(lines[pos:])
+    return result, ends_with_newline
+
+
+@dataclass
+class FileLines:
+    """
+    File content stored once as lines without line endings.
+
+    The line ending convention and whether the last line is terminated are
+    kept alongside, so the content is written back byte for byte.
+    """
+
+    lines: List[str]
+    newline: str = "\n"
+    ends_with_newline: bool = True
+    encoding: str = "utf-8"
+    bom: bytes = b""
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FileLines":
+        """
+        Decode raw file content, detecting its encoding.
+
+        Content that is not valid in the detected encoding is read as Latin-1,
+        which accepts any byte sequence and writes it back unchanged.
+
+        Args:
+            data: Raw file content
+
+        Returns:
+            FileLines remembering the encoding and byte order mark
+        """
+        encoding, bom = detect_encoding(data)
+        try:
+            text = data[len(bom) :].decode(encoding)
+        except UnicodeDecodeError:
+            encoding, bom = "latin-1", b""
+            text = data.decode(encoding)
+        file_lines = cls.from_text(text)
+        file_lines.encoding = encoding
+        file_lines.bom = bom
+        return file_lines
+
+    @classmethod
+    def from_text(cls, text: str) -> "FileLines":
+        """
+        Split text into lines and record its line ending convention.
+
+        Files using CRLF throughout are stored with bare lines; files mixing
+        conventions keep any "\r" as part of the line so nothing is lost.
+
+        Args:
+            text: File content as read with newline translation disabled
+
+        Returns:
+            FileLines for the content
+        """
+        if not text:
+            return cls([])
+        newline_count = text.count("\n")
+        newline = (
+            "\r\n" if newline_count and text.count("\r\n") == newline_count else "\n"
+        )
+        ends_with_newline = text.endswith(newline)
+        if ends_with_newline:
+            text = text[: -len(newline)]
+        return cls(text.split(newline), newline, ends_with_newline)
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "FileLines":
+        """Build FileLines from lines that still carry their line endings."""
+        return cls.from_text("".join(lines))
+
+    def apply_edit(self, edit: Edit) -> None:
+        """Replace the lines of a single edit."""
+        start, end, replacement = edit
+        if ends_file_with_newline(len(self.lines), edit):
+            self.ends_with_newline = True
+        self.lines[start:end] = replacement
+
+    def apply_edits(self, edits: List[Edit]) -> None:
+        """
+        Apply edits located against the current lines in a single pass.
+
+        Args:
+            edits: Edits in hunk order whose changed lines do not overlap
+        """
+        self.lines, ends_with_newline = splice_edits(self.lines, edits)
+        if ends_with_newline:
+            self.ends_with_newline = True
+
+    def to_text(self) -> str:
+        """Join the lines back into the file content."""
+        if not self.lines:
+            return ""
+        text = self.newline.join(self.lines)
+        return text + self.newline if self.ends_with_newline else text
+
+    def to_bytes(self) -> bytes:
+        """Encode the content the way it was read, byte order mark included."""
+        return self.bom + self.to_text().encode(self.encoding)
+
+    def to_lines(self) -> List[str]:
+        """Return the lines with their line endings, like readlines()."""
+        if not self.lines:
+            return []
+        result = [line + self.newline for line in self.lines]
+        if not self.ends_with_newline:
+            result[-1] = self.lines[-1]
+        return result
+
+
+@dataclass
+class HunkResult:
+    """Outcome of applying a single hunk, with details about the match."""
+
+    success: bool
+    lines: Optional[List[str]]
+    message: str
+    found_at: int = -1
+    strategy: Optional[str] = None
+    candidates: List[int] = field(default_factory=list)
+    ambiguous: bool = False
+    score: Optional[float] = None
+    scope: Optional[str] = None
+    budget_exhausted: Optional[str] = None  # Tier running when the budget ran out
+    conflicts: int = 0  # Conflict markers written by the merge fallback
+
+
+@dataclass
+class HunkLocation:
+    """Where a hunk's search lines were found and which tier found them."""
+
+    found_at: int = -1
+    strategy: Optional[str] = None
+    candidates: List[int] = field(default_factory=list)
+    ambiguous: bool = False
+    score: Optional[float] = None
+    indent_delta: int = 0
+    joined_match_info: Optional[dict] = None
+    scope: Optional[str] = None
+
+
+@dataclass
+class DiffResult:
+    """
+    Outcome of applying a diff, with the result of every attempted hunk.
+
+    A diff whose merged hunks left conflict markers in the file is written
+    but not successful: `conflicts` counts the markers to resolve.
+    """
+
+    success: bool
+    message: str
+    hunk_results: List[HunkResult] = field(default_factory=list)
+    leftover: Optional[ParsedDiff] = None
+    conflicts: int = 0
+
+
+class CancellationToken:
+    """
+    Lets another thread, e.g. the editor, stop a running apply.
+
+    The matching tiers check the token between units of work, so a cancelled
+    call returns a "budget exhausted" result shortly after cancel().
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask every call using this token to stop."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._event.is_set()
+
+
+class BudgetExhausted(Exception):
+    """Raised inside a matching tier when its call's budget has run out."""
+
+    def __init__(self, tier: Optional[str], reason: str):
+        super().__init__(f"Budget exhausted in the {tier or 'search'} tier: {reason}")
+        self.tier = tier
+        self.reason = reason
+
+
+@dataclass
+class Budget:
+    """
+    Limits on the work one apply or locate call may do.
+
+    Lines compared count every line of each window a tier verifies or
+    scores. The clock starts at the first start() (every entry point calls
+    it), so a budget is meant for a single call. When a limit is reached, or
+    the token is cancelled, the tier running at the time raises
+    BudgetExhausted and the hunk fails with `budget_exhausted` naming it.
+    """
+
+    max_seconds: Optional[float] = None
+    max_comparisons: Optional[int] = None
+    token: Optional[CancellationToken] = None
+    comparisons: int = 0
+    tier: Optional[str] = None
+    deadline: Optional[float] = None
+
+    def start(self) -> "Budget":
+        """Start the clock, unless it is already running."""
+        if self.deadline is None and self.max_seconds is not None:
+            self.deadline = time.perf_counter() + self.max_seconds
+        return self
+
+    def enter(self, tier: str) -> None:
+        """Record the tier about to run and check that it may start."""
+        self.tier = tier
+        self.check()
+
+    def check(self) -> None:
+        """Raise BudgetExhausted if the call was cancelled or is out of time."""
+        if self.token is not None and self.token.cancelled:
+            raise BudgetExhausted(self.tier, "cancelled")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise BudgetExhausted(self.tier, f"time limit of {self.max_seconds}s")
+
+    def charge(self, lines: int) -> None:
+        """Count compared lines, then check every limit."""
+        self.comparisons += lines
+        if self.max_comparisons is not None and self.comparisons > self.max_comparisons:
+            raise BudgetExhausted(
+                self.tier, f"limit of {self.max_comparisons} line comparisons"
+            )
+        self.check()
+
+
+class LineIndex:
+    """
+    Maps each distinct line of a file to the positions where it occurs.
+
+    The index doubles as a line frequency table, so matching tiers can anchor
+    their search on the rarest line of a hunk instead of scanning every start
+    position. Derived views (stripped lines, non-blank positions, symbols)
+    are built lazily and shared by all tiers and hunks located against it.
+    """
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.positions: Dict[str, List[int]] = {}
+        for i, line in enumerate(lines):
+            self.positions.setdefault(line, []).append(i)
+        self._stripped: Optional["LineIndex"] = None
+        self._non_blank_positions: Optional[List[int]] = None
+        self._symbols: Dict[Optional[str], SymbolIndex] = {}
+
+    def find(self, line: str) -> List[int]:
+        """Return the sorted positions of `line`, empty if it never occurs."""
+        return self.positions.get(line, [])
+
+    def count(self, line: str) -> int:
+        """Return how many times `line` occurs."""
+        return len(self.positions.get(line, ()))
+
+    def stripped(self) -> "LineIndex":
+        """Return an index over the lines with surrounding whitespace removed."""
+        if self._stripped is None:
+            self._stripped = LineIndex([line.strip() for line in self.lines])
+        return self._stripped
+
+    def non_blank_positions(self) -> List[int]:
+        """Return the sorted positions of lines that are not whitespace-only."""
+        if self._non_blank_positions is None:
+            self._non_blank_positions = [
+                i for i, line in enumerate(self.lines) if line.strip()
+            ]
+        return self._non_blank_positions
+
+    def symbols(self, path: Optional[str] = None) -> SymbolIndex:
+        """Return the definitions in the lines, parsed as the file at `path`."""
+        if path not in self._symbols:
+            self._symbols[path] = SymbolIndex.for_lines(self.lines, path)
+        return self._symbols[path]
+
+    def anchor(self, search_lines: List[str]) -> Tuple[int, List[int]]:
+        """
+        Pick the rarest search line as the anchor.
+
+        Args:
+            search_lines: Lines to search for, in the same form as the index
+
+        Returns:
+            Tuple of (offset of the anchor in search_lines, its positions)
+        """
+        best_offset = 0
+        best_positions = self.find(search_lines[0])
+        for offset in range(1, len(search_lines)):
+            if not best_positions:
+                break
+            positions = self.find(search_lines[offset])
+            if len(positions) < len(best_positions):
+                best_offset, best_positions = offset, positions
+        return best_offset, best_positions
+
+    def anchored_starts(self, search_lines: List[str]) -> List[int]:
+        """
+        List the block start positions implied by the anchor occurrences.
+
+        Args:
+            search_lines: Lines to search for, in the same form as the index
+
+        Returns:
+            Sorted start positions where the whole block would still fit
+        """
+        offset, positions = self.anchor(search_lines)
+        last_start = len(self.lines) - len(search_lines)
+        return [
+            pos - offset for pos in positions if 0 <= pos - offset <= last_start
+        ]
+
+
 class Patcher:
     """Generic diff parsing and applying with minimal pattern matching."""
 
+    # Number of candidate locations listed in ambiguity messages
+    MAX_REPORTED_CANDIDATES = 5
+
+    # Conflicting hunk pairs listed in a failure message
+    MAX_REPORTED_CONFLICTS = 5
+
+    # Last-resort similarity tier: minimum average line similarity to accept a
+    # window, and hard limits on line comparisons and time spent scoring
+    SIMILARITY_THRESHOLD = 0.8
+    SIMILARITY_MAX_COMPARISONS = 50000
+    SIMILARITY_MAX_SECONDS = 0.25
+
+    # Columns a tab counts for when comparing indentation
+    INDENT_TAB_WIDTH = 4
+
+    # Files at least this large are patched in memory-mapped large-file mode
+    LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+
     @staticmethod
-    def _preprocess_diff_lines(lines: List[str]) -> List[str]:
+    def _preprocess_diff_lines(
+        lines: List[str], path: Optional[str] = None
+    ) -> List[str]:
         """
         Preprocess diff lines to handle malformed content like missing linebreaks.
 
@@ -38,63 +537,87 @@ class Patcher:
         - Hunk headers joined with content: "@@ -10,7 +10,7 @@clusters = get_clusters(platform)"
         - Context lines joined together: "             )except Exception as e:"
 
+        Lines are scanned once. Regexes only run on lines that contain the
+        characters they need, and the indentation of content cut from a hunk
+        header is inferred from a bounded lookahead of the following lines.
+        Joined lines are split by the "split_line" rules registered for the
+        language of `path`.
+
         Args:
             lines: Raw diff lines
+            path: Path of the patched file, used to select the rules
 
         Returns:
             Preprocessed lines with proper linebreaks
         """
-        processed_lines = []
+        processed_lines: List[str] = []
+        append = processed_lines.append
+        split_rules = RULES.rules_for("split_line", path)
 
-        for line in lines:
+        for i, line in enumerate(lines):
             # Handle hunk headers that are joined with content
             if line.startswith("@@"):
-                hunk_match = re.match(r"^(@@ -\d+,?\d* \+\d+,?\d* @@)(.*)$", line)
-                if hunk_match:
-                    header, content = hunk_match.groups()
-                    processed_lines.append(header)
-                    if content.strip():  # Only add content if it's not empty
-                        # Infer indentation by looking at the next line or context
-                        inferred_content = (
-                            Patcher._infer_indentation_for_extracted_content(
-                                content, lines, processed_lines
-                            )
-                        )
-                        # Add space prefix to make it a proper context line
-                        # Only skip if it already has a diff operator (not just spaces)
-                        if inferred_content.startswith(("+", "-")):
-                            processed_lines.append(inferred_content)
-                        else:
-                            processed_lines.append(" " + inferred_content)
-                else:
-                    processed_lines.append(line)
-            else:
-                # Handle context lines that are joined (common patterns)
-                split_lines = Patcher._split_joined_context_lines(line)
-                for split_line in split_lines:
-                    # If this was a split line and doesn't have proper diff prefix, add space prefix for context
-                    if (
-                        len(split_lines) > 1
-                        and split_line
-                        and not split_line.startswith((" ", "+", "-"))
-                    ):
-                        processed_lines.append(" " + split_line)
+                hunk_match = HUNK_HEADER_PATTERN.match(line)
+                if not hunk_match:
+                    append(line)
+                    continue
+                header, content = hunk_match.groups()
+                if Patcher._is_section_label(content):
+                    # Git-style section heading such as "@@ ... @@ def foo"
+                    append(header + content)
+                    continue
+                append(header)
+                if content.strip():  # Only add content if it's not empty
+                    # Infer indentation from the lines that follow
+                    inferred_content = Patcher._infer_indentation_for_extracted_content(
+                        content, lines[i + 1 : i + 1 + INDENT_LOOKAHEAD]
+                    )
+                    # Add space prefix to make it a proper context line
+                    # Only skip if it already has a diff operator (not just spaces)
+                    if inferred_content.startswith(("+", "-")):
+                        append(inferred_content)
                     else:
-                        processed_lines.append(split_line)
+                        append(" " + inferred_content)
+                continue
+
+            # Handle context lines that are joined (common patterns)
+            split_lines = RULES.first_hit(split_rules, line)[1] if line else None
+            if split_lines is None:
+                append(line)
+                continue
+            for split_line in split_lines:
+                # Split parts without a diff prefix become context lines
+                if split_line and not split_line.startswith((" ", "+", "-")):
+                    append(" " + split_line)
+                else:
+                    append(split_line)
 
         return processed_lines
 
+    @staticmethod
+    def _is_section_label(content: str) -> bool:
+        """Check whether text after a hunk header is a git-style section heading."""
+        return Validation.is_section_label(content)
+
+    @staticmethod
+    def hunk_section_label(header: str) -> Optional[str]:
+        """Return the section heading after the closing "@@" of a header, if any."""
+        match = re.match(r"^@@ [^@]*@@ (.+)$", header)
+        if not match or not match.group(1).strip():
+            return None
+        return match.group(1).strip()
+
     @staticmethod
     def _infer_indentation_for_extracted_content(
-        content: str, all_lines: List[str], processed_so_far: List[str]
+        content: str, following_lines: List[str]
     ) -> str:
         """
         Infer the correct indentation for content extracted from a malformed hunk header.
 
         Args:
             content: The content that was extracted from hunk header
-            all_lines: All original diff lines for context
-            processed_so_far: Lines processed so far
+            following_lines: The diff lines after the header (only the first
+                INDENT_LOOKAHEAD are looked at)
 
         Returns:
             Content with inferred indentation
@@ -102,37 +625,26 @@ class Patcher:
         if not content or content.startswith((" ", "+", "-")):
             return content
 
-        # Look at the current position in all_lines to find next context lines
-        current_pos = len(processed_so_far)
-
-        # Look ahead for addition/removal lines to infer indentation (they often have proper indentation)
-        for i in range(current_pos, min(current_pos + 5, len(all_lines))):
-            line = all_lines[i]
-
-            # Look at removal/addition lines - they often have the correct indentation
+        # Addition/removal lines often have the correct indentation
+        for line in following_lines[:5]:
             if line.startswith(("-", "+")):
                 line_content = line[1:]  # Remove +/- prefix
-                if line_content.strip():  # Only if not empty
-                    indentation_match = re.match(r"^(\s*)", line_content)
-                    if indentation_match:
-                        indentation = indentation_match.group(1)
-                        if len(indentation) >= 8:  # Reasonable indentation
-                            return indentation + content.strip()
-
-        # Look ahead for context lines to infer indentation
-        for i in range(current_pos, min(current_pos + 10, len(all_lines))):
-            line = all_lines[i]
-
-            # Look for context lines (start with space) or lines that likely have indentation
+                stripped = line_content.lstrip()
+                if stripped:  # Only if not empty
+                    indentation = line_content[: len(line_content) - len(stripped)]
+                    if len(indentation) >= 8:  # Reasonable indentation
+                        return indentation + content.strip()
+
+        # Then context lines
+        for line in following_lines[:INDENT_LOOKAHEAD]:
             if line.startswith(" ") and len(line) > 1:
-                # Extract the indentation from this context line
                 context_content = line[1:]  # Remove space prefix
-                indentation_match = re.match(r"^(\s*)", context_content)
-                if indentation_match:
-                    indentation = indentation_match.group(1)
-                    # If this looks like it could be the same level of indentation
-                    if len(indentation) >= 8:  # Reasonable indentation level
-                        return indentation + content.strip()
+                indentation = context_content[
+                    : len(context_content) - len(context_content.lstrip())
+                ]
+                # If this looks like it could be the same level of indentation
+                if len(indentation) >= 8:  # Reasonable indentation level
+                    return indentation + content.strip()
 
         # Fallback: assume standard indentation based on common patterns
         # If the content looks like it's inside a function or block, use 12 spaces
@@ -148,7 +660,9 @@ class Patcher:
         return content
 
     @staticmethod
-    def _split_joined_context_lines(line: str) -> List[str]:
+    def _split_joined_context_lines(
+        line: str, path: Optional[str] = None
+    ) -> List[str]:
         """
         Split context lines that have been improperly joined together.
 
@@ -159,58 +673,99 @@ class Patcher:
 
         Args:
             line: Line that might contain joined content
+            path: Path of the patched file, used to select the rules
 
         Returns:
             List of properly split lines
         """
         if not line:
             return [line]
+        _, split_lines = RULES.first_hit(RULES.rules_for("split_line", path), line)
+        return split_lines if split_lines is not None else [line]
 
-        # Pattern 1: Function definition joined with docstring
-        # "def func():"""docstring"""" -> ["def func():", "    \"\"\"docstring\"\"\""]
-        func_docstring_pattern = re.compile(
-            r'^(\s*def\s+[^:]+:)(""".*?"""|\'\'\'.*?\'\'\')(.*)$', re.DOTALL
-        )
-        match = func_docstring_pattern.match(line)
-        if match:
-            func_def, docstring, remainder = match.groups()
-
-            # Extract indentation from function definition
-            func_indent_match = re.match(r"^(\s*)", func_def)
-            func_indent = func_indent_match.group(1) if func_indent_match else ""
-
-            # Docstring should be indented 4 spaces more than function
-            docstring_line = func_indent + "    " + docstring
-
-            result = [func_def, docstring_line]
-            if remainder.strip():
-                result.append(func_indent + remainder.strip())
-            return result
-
-        # Pattern 2: Lines ending with ) followed by Python keywords
-        # Look for closing parenthesis/bracket followed by Python control keywords
-        joined_pattern = re.compile(
-            r"^(\s*.*[)\]}])((?:except|if|elif|else|while|for|try|finally|with|def|class|import|from|return|raise|pass|break|continue|yield|async|await)\b.*)$"
-        )
+    @staticmethod
+    def _split_function_docstring(line: str) -> Optional[List[str]]:
+        """
+        Split a function definition joined with its docstring.
+
+        "def func():\"\"\"docstring\"\"\"" -> ["def func():", "    \"\"\"docstring\"\"\""]
+
+        Returns:
+            The split lines, or None if the line is not such a join
+        """
+        if "def" not in line or ('"""' not in line and "'''" not in line):
+            return None
+        match = FUNC_DOCSTRING_PATTERN.match(line)
+        if not match:
+            return None
+        func_def, docstring, remainder = match.groups()
+
+        # Docstring should be indented 4 spaces more than function
+        func_indent = func_def[: len(func_def) - len(func_def.lstrip())]
+        docstring_line = func_indent + "    " + docstring
+
+        result = [func_def, docstring_line]
+        if remainder.strip():
+            result.append(func_indent + remainder.strip())
+        return result
 
-        match = joined_pattern.match(line)
-        if match:
-            first_part, second_part = match.groups()
+    @staticmethod
+    def _split_after_bracket(line: str) -> Optional[List[str]]:
+        """
+        Split a line where a keyword follows a closing parenthesis/bracket.
+
+        The split is made at the last such bracket, e.g.
+        "             )except Exception as e:" -> ["             )", "        except Exception as e:"]
+
+        Returns:
+            The split lines, or None if the line is not such a join
+        """
+        if ")" not in line and "]" not in line and "}" not in line:
+            return None
+        split_at = -1
+        for match in JOINED_KEYWORD_PATTERN.finditer(line):
+            split_at = match.end()
+        if split_at < 0:
+            return None
+        first_part, second_part = line[:split_at], line[split_at:]
 
-            # Special case: for except/finally/else after ), they should be outdented to match try/for/if level
-            if second_part.strip().startswith(("except", "finally", "else")):
-                # Extract base indentation from first part
-                first_indent_match = re.match(r"^(\s*)", first_part)
-                if first_indent_match:
-                    base_indent = first_indent_match.group(1)
-                    # Reduce indentation for except/finally/else (typically 4 spaces less)
-                    if len(base_indent) >= 4:
-                        except_indent = base_indent[:-4]  # Remove 4 spaces
-                        return [first_part, except_indent + second_part.strip()]
+        # Special case: for except/finally/else after ), they should be outdented to match try/for/if level
+        if second_part.strip().startswith(("except", "finally", "else")):
+            # Reduce indentation for except/finally/else (typically 4 spaces less)
+            base_indent = first_part[: len(first_part) - len(first_part.lstrip())]
+            if len(base_indent) >= 4:
+                except_indent = base_indent[:-4]  # Remove 4 spaces
+                return [first_part, except_indent + second_part.strip()]
 
-            return [first_part, second_part]
+        return [first_part, second_part]
+
+    @staticmethod
+    def _split_joined_statement(line: str) -> Optional[Tuple[str, str]]:
+        """
+        Split a statement joined onto its block keyword, e.g. "if not items:return 0".
+
+        Returns:
+            (keyword line, statement indented one level deeper), or None
+        """
+        if ":" not in line:
+            return None
+        match = JOINED_STATEMENT_PATTERN.match(line)
+        if not match:
+            return None
+        indent, keyword, condition_part, statement_part = match.groups()
+        split_line1 = indent + keyword + condition_part
+        split_line2 = indent + "    " + statement_part.strip()  # One level deeper
+        return split_line1, split_line2
 
-        return [line]
+    @staticmethod
+    def _diff_target_path(lines: List[str]) -> Optional[str]:
+        """Read the patched file's path from raw diff header lines, if present."""
+        for line in lines[1:2] + lines[:1]:
+            if line.startswith(("+++", "---")):
+                path = line[3:].split("\t", 1)[0].strip()
+                if path and path != "/dev/null":
+                    return path
+        return None
 
     @staticmethod
     def parse_diff(diff_content: str) -> Tuple[Optional[ParsedDiff], Optional[str]]:
@@ -225,7 +780,9 @@ class Patcher:
         """
         # Pre-process diff content to handle malformed hunk headers and joined lines
         original_lines = diff_content.split("\n")
-        lines = Patcher._preprocess_diff_lines(original_lines)
+        lines = Patcher._preprocess_diff_lines(
+            original_lines, Patcher._diff_target_path(original_lines)
+        )
 
         if len(lines) < 3:
             return None, "Diff content is too short to be valid."
@@ -294,6 +851,54 @@ class Patcher:
 
         return diff, None
 
+    @staticmethod
+    def parse_hunk_header(header: str) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Parse the line numbers of a hunk header.
+
+        Args:
+            header: Hunk header such as "@@ -10,7 +10,8 @@ def foo"
+
+        Returns:
+            Tuple of (old_start, old_count, new_start, new_count) or None if the
+            header carries no line numbers
+        """
+        match = re.match(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", header)
+        if not match:
+            return None
+        old_start, old_count, new_start, new_count = match.groups()
+        return (
+            int(old_start),
+            int(old_count) if old_count else 1,
+            int(new_start),
+            int(new_count) if new_count else 1,
+        )
+
+    @staticmethod
+    def shift_hunk_header(header: str, delta: int) -> str:
+        """
+        Move the old start line of a hunk header by `delta` lines.
+
+        The new side is left alone: it numbers the lines of the intended
+        file, which does not change when part of the diff is applied.
+
+        Args:
+            header: Hunk header such as "@@ -10,7 +10,8 @@ def foo"
+            delta: Lines to move by; negative moves up
+
+        Returns:
+            The header with a shifted old start line, or `header` unchanged if
+            it carries no line numbers
+        """
+        match = re.match(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@", header)
+        if not match or not delta:
+            return header
+        old_start, old_count, new_start, new_count = Patcher.parse_hunk_header(header)
+        return (
+            f"@@ -{max(old_start + delta, 0)},{old_count} "
+            f"+{new_start},{new_count} @@{header[match.end():]}"
+        )
+
     @staticmethod
     def read_file_lines(filepath: str) -> Optional[List[str]]:
         """
@@ -303,13 +908,10 @@ class Patcher:
             filepath: Path to the file to read
 
         Returns:
-            List of lines or None if file doesn't exist
+            List of lines with their line endings or None if file doesn't exist
         """
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return f.readlines()
-        except (FileNotFoundError, IOError):
-            return None
+        file_lines = Patcher.read_file(filepath)
+        return file_lines.to_lines() if file_lines is not None else None
 
     @staticmethod
     def write_file_lines(filepath: str, lines: List[str]) -> bool:
@@ -334,216 +936,540 @@ class Patcher:
             return False
 
     @staticmethod
-    def _try_fuzzy_whitespace_matching(
-        original_text_lines: List[str], search_lines: List[str]
-    ) -> int:
+    def read_file(filepath: str) -> Optional[FileLines]:
         """
-        Try to match lines allowing for differences in leading whitespace.
+        Read a file, keeping its encoding and line ending convention.
 
-        This handles cases where diff context lines have different indentation than
-        the original file due to missing space prefixes or other formatting issues.
+        The encoding is detected from a byte order mark or the content; see
+        detect_encoding.
 
         Args:
-            original_text_lines: Original file content without newlines
-            search_lines: Lines to search for
+            filepath: Path to the file to read
 
         Returns:
-            Index where match was found or -1 if no match
+            FileLines or None if the file doesn't exist
         """
+        try:
+            with open(filepath, "rb") as f:
+                return FileLines.from_bytes(f.read())
+        except (FileNotFoundError, IOError):
+            return None
 
-        def content_match(search_line: str, original_line: str) -> bool:
-            """Check if two lines match, allowing for whitespace differences."""
-            # First try exact match
-            if search_line == original_line:
-                return True
-
-            # Handle empty lines
-            if not search_line.strip() and not original_line.strip():
-                return True
+    @staticmethod
+    def write_file(filepath: str, file_lines: FileLines) -> bool:
+        """
+        Write lines back with the encoding and line endings they were read with.
 
-            # If both have content, check normalized versions
-            if search_line.strip() and original_line.strip():
-                search_content = search_line.strip()
-                original_content = original_line.strip()
+        Args:
+            filepath: Path to the file to write
+            file_lines: Content to write
 
-                # Exact content match (ignoring leading whitespace)
-                if search_content == original_content:
-                    return True
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            data = file_lines.to_bytes()
+        except UnicodeEncodeError:
+            return False
+        return Patcher._write_bytes(filepath, data)
 
-                # Allow small differences in indentation (1-2 spaces)
-                search_stripped = search_line.lstrip()
-                original_stripped = original_line.lstrip()
-                if search_stripped == original_stripped:
-                    search_indent = len(search_line) - len(search_stripped)
-                    original_indent = len(original_line) - len(original_stripped)
-                    # Allow up to 2 spaces difference in indentation
-                    if abs(search_indent - original_indent) <= 2:
-                        return True
+    @staticmethod
+    def _write_bytes(filepath: str, data: bytes) -> bool:
+        """Write raw content, creating the parent directory if needed."""
+        try:
+            directory = os.path.dirname(filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
 
+            with open(filepath, "wb") as f:
+                f.write(data)
+            return True
+        except (IOError, OSError):
             return False
 
-        # Try to find the search pattern with fuzzy whitespace matching
-        for i in range(len(original_text_lines) - len(search_lines) + 1):
-            match = True
-            for j in range(len(search_lines)):
-                if not content_match(search_lines[j], original_text_lines[i + j]):
-                    match = False
+    @staticmethod
+    def _try_blank_line_fuzzy_matching(
+        index: LineIndex, search_lines: List[str], budget: Optional[Budget] = None
+    ) -> int:
+        """
+        Try to match the non-empty search lines while skipping blank lines.
+
+        Blank lines in both the search pattern and the original are ignored. The
+        rarest non-empty search line anchors the search; each anchor occurrence
+        is checked against the sequence of non-blank original lines around it.
+
+        Args:
+            index: Line index of the original file content without newlines
+            search_lines: Lines to search for
+            budget: Work limits of the call, if any
+
+        Returns:
+            First position from which the non-empty lines match, or -1
+        """
+        non_empty_search_lines = [line for line in search_lines if line.strip()]
+        if not non_empty_search_lines:
+            return -1
+
+        text_lines = index.lines
+        non_blank = index.non_blank_positions()
+        offset, positions = index.anchor(non_empty_search_lines)
+
+        for pos in positions:
+            if budget is not None:
+                budget.charge(len(non_empty_search_lines))
+            start_rank = bisect.bisect_left(non_blank, pos) - offset
+            if start_rank < 0:
+                continue
+            if start_rank + len(non_empty_search_lines) > len(non_blank):
+                break
+            for k, search_line in enumerate(non_empty_search_lines):
+                if text_lines[non_blank[start_rank + k]] != search_line:
                     break
-            if match:
-                return i
+            else:
+                # Blank lines before the first match are part of the match
+                return non_blank[start_rank - 1] + 1 if start_rank > 0 else 0
 
         return -1
 
     @staticmethod
-    def _adjust_replacement_indentation(
+    def _blank_line_replacement(
         original_text_lines: List[str],
         found_at: int,
         search_lines: List[str],
         replacement_lines: List[str],
-    ) -> List[str]:
+        replacement_sources: List[Optional[int]],
+    ) -> Tuple[int, List[str]]:
         """
-        Adjust replacement lines to preserve original indentation when fuzzy whitespace matching was used.
+        Work out the edit of a hunk matched with blank lines ignored.
 
-        This handles cases where the search pattern has different indentation than the original file,
-        but we want to preserve the original file's indentation in the replacement.
+        The hunk and the file may disagree on their blank lines, so the
+        matched lines are walked together: blank lines of the file missing
+        from the hunk are kept, and blank lines of the hunk missing from the
+        file are neither removed nor written back as context.
 
         Args:
             original_text_lines: Original file content without newlines
             found_at: Index where the match was found
-            search_lines: Search pattern lines
+            search_lines: Lines that were searched for
             replacement_lines: Replacement pattern lines
+            replacement_sources: Search line index each replacement line repeats
 
         Returns:
-            Adjusted replacement lines with preserved indentation
+            Tuple of (end of the matched lines, replacement lines)
         """
-        adjusted_lines = []
-
-        for i, repl_line in enumerate(replacement_lines):
-            if i < len(search_lines):
-                # This replacement line corresponds to a search line
-                search_line = search_lines[i]
-                original_line = (
-                    original_text_lines[found_at + i]
-                    if found_at + i < len(original_text_lines)
-                    else ""
-                )
-
-                # If the search line and replacement line have the same content (just context)
-                # and the original line has different indentation, preserve the original indentation
-                if (
-                    search_line.strip() == repl_line.strip()
-                    and search_line.strip() == original_line.strip()
-                    and search_line.strip()
-                ):  # Not empty
-                    # Extract original indentation
-                    original_indent = original_line[
-                        : len(original_line) - len(original_line.lstrip())
-                    ]
-                    repl_content = repl_line.lstrip()
-                    adjusted_lines.append(original_indent + repl_content)
-                else:
-                    # For non-context lines or lines with different content, use as-is
-                    adjusted_lines.append(repl_line)
-            else:
-                # This is a new line being added, use as-is
-                adjusted_lines.append(repl_line)
+        lines = original_text_lines
+        # Search index of the next context line from each replacement line on
+        next_context = [len(search_lines)] * (len(replacement_sources) + 1)
+        for j in range(len(replacement_sources) - 1, -1, -1):
+            source = replacement_sources[j]
+            next_context[j] = source if source is not None else next_context[j + 1]
+
+        # Hunk lines in order: (search index or None, replacement line or
+        # None); removed lines have no replacement, added lines no search
+        # index. Removed lines come before the added lines of their block.
+        steps: List[Tuple[Optional[int], Optional[str]]] = []
+        next_search = 0
+        for j, (line, source) in enumerate(zip(replacement_lines, replacement_sources)):
+            steps.extend((k, None) for k in range(next_search, next_context[j]))
+            next_search = max(next_search, next_context[j])
+            if source is not None:
+                next_search = source + 1
+            steps.append((source, line))
+        steps.extend((k, None) for k in range(next_search, len(search_lines)))
+
+        replacement = []
+        pos = found_at
+        for source, line in steps:
+            if source is None:
+                replacement.append(line)
+            elif search_lines[source].strip():
+                # The tier matched every non-blank line, so one follows
+                while not lines[pos].strip():
+                    replacement.append(lines[pos])
+                    pos += 1
+                pos += 1
+                if line is not None:
+                    replacement.append(line)
+            elif pos < len(lines) and not lines[pos].strip():
+                pos += 1
+                if line is not None:
+                    replacement.append(line)
+        return pos, replacement
 
-        return adjusted_lines
+    @staticmethod
+    def _indent_width(line: str) -> int:
+        """Return the width of the leading whitespace, expanding tabs."""
+        indent = line[: len(line) - len(line.lstrip())]
+        return len(indent.expandtabs(Patcher.INDENT_TAB_WIDTH))
 
     @staticmethod
-    def _try_joined_statement_matching_with_info(
-        original_text_lines: List[str], search_lines: List[str]
-    ) -> Tuple[int, Optional[dict]]:
+    def _try_indent_shift_matching(
+        index: LineIndex, search_lines: List[str], budget: Optional[Budget] = None
+    ) -> Tuple[int, int]:
         """
-        Try to match joined statements by splitting them, returning match info.
+        Try to match the search block shifted by one uniform indentation delta.
 
-        This handles cases where diff contains malformed lines like "if not items:return 0"
-        while the original file has them properly formatted on separate lines.
+        The delta is taken from the first non-blank line of each candidate block
+        and every other non-blank line must be shifted by the same amount. Tabs
+        count as INDENT_TAB_WIDTH columns, so tab/space differences are covered.
 
         Args:
-            original_text_lines: Original file content without newlines
+            index: Line index of the original file content without newlines
             search_lines: Lines to search for
+            budget: Work limits of the call, if any
 
         Returns:
-            Tuple of (index where match was found or -1, match info dict or None)
+            Tuple of (position where the block matched or -1, indentation delta
+            in columns from the search lines to the file)
         """
-        # Pattern for common joined statements: condition:statement
-        joined_pattern = re.compile(
-            r"^(\s*)(if|while|for|elif|else|try|except|finally|with)([^:]*:)(.+)$"
-        )
-
-        for search_idx, search_line in enumerate(search_lines):
-            match = joined_pattern.match(search_line)
-            if match:
-                indent, keyword, condition_part, statement_part = match.groups()
-
-                # Split into separate lines
-                split_line1 = indent + keyword + condition_part
-                split_line2 = (
-                    indent + "    " + statement_part.strip()
-                )  # Add extra indentation for statement
-
-                # Try to find this split pattern in the original file
-                for i in range(len(original_text_lines) - len(search_lines)):
-                    # Check if we can match by substituting the joined line with split lines
-                    match_found = True
-                    orig_offset = 0
-
-                    for j, search_line_check in enumerate(search_lines):
-                        if j == search_idx:
-                            # This is the joined line - check if original has it split
-                            if (
-                                i + orig_offset < len(original_text_lines)
-                                and i + orig_offset + 1 < len(original_text_lines)
-                                and original_text_lines[i + orig_offset] == split_line1
-                                and original_text_lines[i + orig_offset + 1]
-                                == split_line2
-                            ):
-                                orig_offset += 2  # Skip both lines in original
-                            else:
-                                match_found = False
-                                break
-                        else:
-                            # Regular line - must match exactly
-                            if (
-                                i + orig_offset >= len(original_text_lines)
-                                or original_text_lines[i + orig_offset]
-                                != search_line_check
-                            ):
-                                match_found = False
-                                break
-                            orig_offset += 1
-
-                    if match_found:
-                        return i, {
-                            "joined_search_idx": search_idx,
-                            "split_line1": split_line1,
-                            "split_line2": split_line2,
-                            "original_lines_consumed": orig_offset,
-                        }
+        non_blank_offsets = [j for j, line in enumerate(search_lines) if line.strip()]
+        if not non_blank_offsets:
+            return -1, 0
+
+        text_lines = index.lines
+        stripped_index = index.stripped()
+        stripped_search_lines = [line.strip() for line in search_lines]
+        search_widths = [
+            Patcher._indent_width(search_lines[j]) for j in non_blank_offsets
+        ]
+
+        for start in Patcher._verify_starts(
+            stripped_index.lines,
+            stripped_search_lines,
+            stripped_index.anchored_starts(stripped_search_lines),
+            budget=budget,
+        ):
+            first = non_blank_offsets[0]
+            delta = Patcher._indent_width(text_lines[start + first]) - search_widths[0]
+            if all(
+                Patcher._indent_width(text_lines[start + j]) - width == delta
+                for j, width in zip(non_blank_offsets, search_widths)
+            ):
+                return start, delta
 
-        return -1, None
+        return -1, 0
 
     @staticmethod
-    def _apply_joined_replacement(
-        original_lines: List[str],
+    def _reindent_replacement(
+        original_text_lines: List[str],
         found_at: int,
-        search_lines: List[str],
         replacement_lines: List[str],
-        joined_match_info: dict,
+        replacement_sources: List[Optional[int]],
+        delta: int,
     ) -> List[str]:
         """
-        Apply replacement when we have joined statements that need special handling.
+        Shift added lines by a uniform indentation delta in a single pass.
+
+        Context lines are taken verbatim from the file. Added lines are
+        re-indented with the file's indentation character (tabs if the matched
+        block is tab-indented).
 
         Args:
-            original_lines: Original file lines with newlines
-            found_at: Index where match was found
-            search_lines: Search pattern lines
-            replacement_lines: Replacement pattern lines
+            original_text_lines: Original file content without newlines
+            found_at: Index where the match was found
+            replacement_lines: Replacement pattern lines
+            replacement_sources: Search line index each replacement line repeats
+            delta: Indentation delta in columns from the hunk to the file
+
+        Returns:
+            Replacement lines indented like the file
+        """
+        # The matched block has a non-blank line; index rather than slice so
+        # the rest of the file is not copied for every hunk
+        first_line = next(
+            original_text_lines[i]
+            for i in range(found_at, len(original_text_lines))
+            if original_text_lines[i].strip()
+        )
+        use_tabs = first_line.startswith("\t")
+        tab_width = Patcher.INDENT_TAB_WIDTH
+
+        adjusted_lines = []
+        for line, source in zip(replacement_lines, replacement_sources):
+            if source is not None:
+                adjusted_lines.append(original_text_lines[found_at + source])
+            elif not line.strip():
+                adjusted_lines.append(line)
+            else:
+                width = max(Patcher._indent_width(line) + delta, 0)
+                if use_tabs:
+                    indent = "\t" * (width // tab_width) + " " * (width % tab_width)
+                else:
+                    indent = " " * width
+                adjusted_lines.append(indent + line.lstrip())
+        return adjusted_lines
+
+    @staticmethod
+    def _try_fuzzy_whitespace_matching(
+        original_text_lines: List[str],
+        search_lines: List[str],
+        index: Optional[LineIndex] = None,
+        budget: Optional[Budget] = None,
+    ) -> int:
+        """
+        Try to match lines allowing for differences in leading whitespace.
+
+        This handles cases where diff context lines have different indentation than
+        the original file due to missing space prefixes or other formatting issues.
+        Two lines match when their content is equal once surrounding whitespace is
+        removed, so the search runs over the stripped view of the line index.
+
+        Args:
+            original_text_lines: Original file content without newlines
+            search_lines: Lines to search for
+            index: Line index of original_text_lines, built if not given
+            budget: Work limits of the call, if any
+
+        Returns:
+            Index where match was found or -1 if no match
+        """
+        if index is None:
+            index = LineIndex(original_text_lines)
+        stripped_index = index.stripped()
+        stripped_search_lines = [line.strip() for line in search_lines]
+
+        matches = Patcher._verify_starts(
+            stripped_index.lines,
+            stripped_search_lines,
+            stripped_index.anchored_starts(stripped_search_lines),
+            limit=1,
+            budget=budget,
+        )
+        return matches[0] if matches else -1
+
+    @staticmethod
+    def _try_similarity_matching(
+        index: LineIndex,
+        search_lines: List[str],
+        line_hint: Optional[int] = None,
+        removed_offsets: Optional[List[int]] = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_comparisons: int = SIMILARITY_MAX_COMPARISONS,
+        max_seconds: float = SIMILARITY_MAX_SECONDS,
+        budget: Optional[Budget] = None,
+    ) -> Tuple[int, float]:
+        """
+        Find the window whose lines are most similar to the search lines.
+
+        Candidate windows are the starts implied by search lines that occur
+        verbatim (ignoring surrounding whitespace) in the file, tried in order
+        of how many lines they share. Each window is scored by the average
+        per-line similarity ratio. Only context may differ: lines the hunk
+        removes must still be present verbatim. Both the number of line
+        comparisons and the elapsed time are capped, so the tier stays bounded
+        on large files.
+
+        Args:
+            index: Line index of the original file content without newlines
+            search_lines: Lines to search for
+            line_hint: Expected start position, used to break ties
+            removed_offsets: Offsets of search lines the hunk removes
+            threshold: Minimum score for a window to be accepted
+            max_comparisons: Maximum number of line comparisons
+            max_seconds: Maximum time spent, in seconds
+            budget: Work limits of the whole call, if any; checked on top of
+                the tier's own limits
+
+        Returns:
+            Tuple of (position of the best window or -1, its score)
+        """
+        stripped_index = index.stripped()
+        stripped_text_lines = stripped_index.lines
+        stripped_search_lines = [line.strip() for line in search_lines]
+        last_start = len(stripped_text_lines) - len(search_lines)
+        if last_start < 0:
+            return -1, 0.0
+
+        deadline = time.perf_counter() + max_seconds
+        comparisons = 0
+        removed = set(removed_offsets or ())
+
+        # Vote for window starts using lines that occur verbatim
+        votes: Dict[int, int] = {}
+        for offset, search_line in enumerate(stripped_search_lines):
+            if not search_line:
+                continue
+            positions = stripped_index.find(search_line)
+            comparisons += len(positions)
+            if comparisons > max_comparisons:
+                break
+            if budget is not None:
+                budget.charge(len(positions))
+            for pos in positions:
+                start = pos - offset
+                if 0 <= start <= last_start:
+                    votes[start] = votes.get(start, 0) + 1
+
+        def rank(start: int) -> Tuple[int, int, int]:
+            distance = abs(start - line_hint) if line_hint is not None else 0
+            return (-votes[start], distance, start)
+
+        best_at, best_score = -1, 0.0
+        for start in sorted(votes, key=rank):
+            if (
+                comparisons + len(search_lines) > max_comparisons
+                or time.perf_counter() > deadline
+            ):
+                break
+            if budget is not None:
+                budget.charge(len(search_lines))
+
+            total = 0.0
+            for j, search_line in enumerate(stripped_search_lines):
+                original_line = stripped_text_lines[start + j]
+                if original_line == search_line:
+                    total += 1.0
+                elif j in removed:
+                    break
+                else:
+                    comparisons += 1
+                    total += SequenceMatcher(None, search_line, original_line).ratio()
+            else:
+                score = total / len(search_lines)
+                if score > best_score:
+                    best_at, best_score = start, score
+
+        if best_score < threshold:
+            return -1, best_score
+        return best_at, best_score
+
+    @staticmethod
+    def _adjust_replacement_indentation(
+        original_text_lines: List[str],
+        found_at: int,
+        search_lines: List[str],
+        replacement_lines: List[str],
+    ) -> List[str]:
+        """
+        Adjust replacement lines to preserve original indentation when fuzzy whitespace matching was used.
+
+        This handles cases where the search pattern has different indentation than the original file,
+        but we want to preserve the original file's indentation in the replacement.
+
+        Args:
+            original_text_lines: Original file content without newlines
+            found_at: Index where the match was found
+            search_lines: Search pattern lines
+            replacement_lines: Replacement pattern lines
+
+        Returns:
+            Adjusted replacement lines with preserved indentation
+        """
+        adjusted_lines = []
+
+        for i, repl_line in enumerate(replacement_lines):
+            if i < len(search_lines):
+                # This replacement line corresponds to a search line
+                search_line = search_lines[i]
+                original_line = (
+                    original_text_lines[found_at + i]
+                    if found_at + i < len(original_text_lines)
+                    else ""
+                )
+
+                # If the search line and replacement line have the same content (just context)
+                # and the original line has different indentation, preserve the original indentation
+                if (
+                    search_line.strip() == repl_line.strip()
+                    and search_line.strip() == original_line.strip()
+                    and search_line.strip()
+                ):  # Not empty
+                    # Extract original indentation
+                    original_indent = original_line[
+                        : len(original_line) - len(original_line.lstrip())
+                    ]
+                    repl_content = repl_line.lstrip()
+                    adjusted_lines.append(original_indent + repl_content)
+                else:
+                    # For non-context lines or lines with different content, use as-is
+                    adjusted_lines.append(repl_line)
+            else:
+                # This is a new line being added, use as-is
+                adjusted_lines.append(repl_line)
+
+        return adjusted_lines
+
+    @staticmethod
+    def _try_joined_statement_matching_with_info(
+        original_text_lines: List[str],
+        search_lines: List[str],
+        index: Optional[LineIndex] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+    ) -> Tuple[int, Optional[dict]]:
+        """
+        Try to match joined statements by splitting them, returning match info.
+
+        This handles cases where diff contains malformed lines like "if not items:return 0"
+        while the original file has them properly formatted on separate lines.
+
+        Args:
+            original_text_lines: Original file content without newlines
+            search_lines: Lines to search for
+            index: Line index of original_text_lines, built if not given
+            path: Path of the file, used to select the "joined_statement" rules
+            budget: Work limits of the call, if any
+
+        Returns:
+            Tuple of (index where match was found or -1, match info dict or None)
+        """
+        rules = RULES.rules_for("joined_statement", path)
+        if not rules:
+            return -1, None
+        if index is None:
+            index = LineIndex(original_text_lines)
+
+        for search_idx, search_line in enumerate(search_lines):
+            rule, split = RULES.first_hit(rules, search_line)
+            if split:
+                split_line1, split_line2 = split
+
+                # The original file should contain the search block with the
+                # joined line replaced by its two split lines
+                expected_lines = (
+                    search_lines[:search_idx]
+                    + [split_line1, split_line2]
+                    + search_lines[search_idx + 1 :]
+                )
+                matches = Patcher._verify_starts(
+                    index.lines,
+                    expected_lines,
+                    index.anchored_starts(expected_lines),
+                    limit=1,
+                    budget=budget,
+                )
+
+                if matches:
+                    return matches[0], {
+                        "rule": rule.name,
+                        "joined_search_idx": search_idx,
+                        "split_line1": split_line1,
+                        "split_line2": split_line2,
+                        "original_lines_consumed": len(expected_lines),
+                    }
+
+        return -1, None
+
+    @staticmethod
+    def _apply_joined_replacement(
+        original_lines: List[str],
+        found_at: int,
+        search_lines: List[str],
+        replacement_lines: List[str],
+        joined_match_info: dict,
+    ) -> List[str]:
+        """
+        Apply replacement when we have joined statements that need special handling.
+
+        Args:
+            original_lines: Original file lines without newlines
+            found_at: Index where match was found
+            search_lines: Search pattern lines
+            replacement_lines: Replacement pattern lines
             joined_match_info: Info about the joined statement match
 
         Returns:
-            List of replacement lines with proper newlines
+            List of replacement lines without newlines
         """
         result = []
         search_idx = 0
@@ -560,31 +1486,23 @@ class Patcher:
                     repl_line = replacement_lines[replacement_idx]
 
                     # Check if the replacement line is also joined
-                    joined_pattern = re.compile(
-                        r"^(\s*)(if|while|for|elif|else|try|except|finally|with)([^:]*:)(.+)$"
-                    )
-                    repl_match = joined_pattern.match(repl_line)
+                    rule = RULES.get(joined_match_info["rule"])
+                    split = rule.run(repl_line) if rule is not None else None
 
-                    if repl_match:
+                    if split:
                         # Replacement is also joined - split it using original format
-                        indent, keyword, condition_part, statement_part = (
-                            repl_match.groups()
-                        )
-                        split_line1 = indent + keyword + condition_part
-                        split_line2 = indent + "    " + statement_part.strip()
-                        result.append(split_line1 + "\n")
-                        result.append(split_line2 + "\n")
+                        result.extend(split)
                     else:
                         # Replacement is not joined - use as-is, but preserve original split structure
                         # This handles cases where the replacement is just a comment addition
-                        result.append(repl_line + "\n")
+                        result.append(repl_line)
 
                     replacement_idx += 1
                 original_idx += 2  # Skip both original lines
             else:
                 # Regular line matching
                 if replacement_idx < len(replacement_lines):
-                    result.append(replacement_lines[replacement_idx] + "\n")
+                    result.append(replacement_lines[replacement_idx])
                     replacement_idx += 1
                 original_idx += 1
 
@@ -592,31 +1510,100 @@ class Patcher:
 
         # Add any remaining replacement lines
         while replacement_idx < len(replacement_lines):
-            result.append(replacement_lines[replacement_idx] + "\n")
+            result.append(replacement_lines[replacement_idx])
             replacement_idx += 1
 
         return result
 
     @staticmethod
-    def apply_hunk(
-        original_lines: List[str], hunk: Hunk
-    ) -> Tuple[bool, Optional[List[str]], str]:
+    def _find_exact_candidates(
+        index: LineIndex, search_lines: List[str], budget: Optional[Budget] = None
+    ) -> List[int]:
         """
-        Apply a single hunk to original file lines using search-and-replace strategy.
+        List every position where the search lines match exactly.
+
+        Candidates come from the positions of the rarest search line, so only
+        plausible starts are verified.
 
         Args:
-            original_lines: Original file content as lines
-            hunk: The hunk to apply
+            index: Line index of the original file content without newlines
+            search_lines: Lines to search for
+            budget: Work limits of the call, if any
 
         Returns:
-            Tuple of (success, modified_lines, message)
+            Sorted list of matching start positions
         """
-        if not hunk.lines:
-            return False, None, "Empty hunk"
+        starts = index.anchored_starts(search_lines)
+        return Patcher._verify_starts(index.lines, search_lines, starts, budget=budget)
+
+    @staticmethod
+    def _verify_starts(
+        text_lines: List[str],
+        search_lines: List[str],
+        starts: List[int],
+        limit: Optional[int] = None,
+        budget: Optional[Budget] = None,
+    ) -> List[int]:
+        """Keep the start positions where every search line matches exactly."""
+        verified = []
+        for i in starts:
+            if budget is not None:
+                budget.charge(len(search_lines))
+            for j, search_line in enumerate(search_lines):
+                if text_lines[i + j] != search_line:
+                    break
+            else:
+                verified.append(i)
+                if limit is not None and len(verified) >= limit:
+                    break
+        return verified
+
+    @staticmethod
+    def _rank_candidates(
+        candidates: List[int], line_hint: Optional[int]
+    ) -> Tuple[List[int], bool]:
+        """
+        Order candidate locations by distance from the expected line.
+
+        Every candidate matches all lines of the hunk exactly, and the hunk
+        has no lines beyond its context to compare the surrounding file
+        lines with, so the distance is the only thing that tells them apart.
+
+        Args:
+            candidates: Matching start positions in file order
+            line_hint: Expected 0-based start position, if the header gives one
+
+        Returns:
+            Tuple of (ranked candidates, whether the best one is ambiguous)
+        """
+        if len(candidates) <= 1:
+            return candidates, False
+        if line_hint is None:
+            return candidates, True
+
+        ranked = sorted(candidates, key=lambda pos: (abs(pos - line_hint), pos))
+        ambiguous = abs(ranked[0] - line_hint) == abs(ranked[1] - line_hint)
+        return ranked, ambiguous
 
+    @staticmethod
+    def _build_search_and_replacement(
+        hunk: Hunk,
+    ) -> Tuple[List[str], List[str], List[Optional[int]]]:
+        """
+        Split a hunk into the lines to search for and the lines to put back.
+
+        Args:
+            hunk: The hunk to process
+
+        Returns:
+            Tuple of (search_lines, replacement_lines, replacement_sources) where
+            replacement_sources[i] is the index of the search line that
+            replacement line i repeats as context, or None for new content
+        """
         # Build search and replacement patterns like the Lua version
         search_lines = []
         replacement_lines = []
+        replacement_sources = []
 
         # Process hunk lines to build search and replacement patterns
         # We need to be careful about trailing empty lines after additions
@@ -640,15 +1627,18 @@ class Patcher:
                     else:
                         # For empty lines before additions, add to replacement only
                         replacement_lines.append("")
+                        replacement_sources.append(None)
                 else:
                     # Regular empty context lines that exist in the file
                     search_lines.append("")
                     replacement_lines.append("")
+                    replacement_sources.append(len(search_lines) - 1)
             elif line.startswith(" "):
                 # Context lines go in both search and replacement
                 text = line[1:]  # Remove space prefix
                 search_lines.append(text)
                 replacement_lines.append(text)
+                replacement_sources.append(len(search_lines) - 1)
             elif line.startswith("-"):
                 # Removal lines only go in search pattern
                 text = line[1:]  # Remove - prefix
@@ -658,6 +1648,7 @@ class Patcher:
                 # Addition lines only go in replacement pattern
                 text = line[1:]  # Remove + prefix
                 replacement_lines.append(text)
+                replacement_sources.append(None)
                 # Do NOT add to search_lines - these are new content
                 addition_found = True
             elif line.startswith("~"):
@@ -665,204 +1656,1071 @@ class Patcher:
                 text = line[1:]  # Remove ~ prefix
                 search_lines.append(text)
                 replacement_lines.append(text)
+                replacement_sources.append(len(search_lines) - 1)
 
-        if not search_lines:
-            # Pure addition case - append to end of file
-            modified_lines = original_lines[:]
-            for line in replacement_lines:
-                modified_lines.append(line + "\n")
-            return True, modified_lines, "Applied pure addition hunk"
+        return search_lines, replacement_lines, replacement_sources
 
-        # Convert original lines to text (without newlines for matching)
-        original_text_lines = [line.rstrip("\n") for line in original_lines]
+    @staticmethod
+    def _locate_hunk(
+        index: LineIndex,
+        search_lines: List[str],
+        replacement_sources: List[Optional[int]],
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> HunkLocation:
+        """
+        Run the matching tiers in order until one finds the search lines.
 
-        # Find the search pattern in the original file
-        found_at = -1
+        Exact matching always comes first: when it can match, its result is
+        the one returned, whatever order the fuzzy tiers run in. When no
+        exact match is possible it costs a few index lookups, since its
+        search stops at the first search line missing from the file. The
+        similarity tier always comes last.
 
-        # First try exact matching
-        for i in range(len(original_text_lines) - len(search_lines) + 1):
-            match = True
-            for j in range(len(search_lines)):
-                if original_text_lines[i + j] != search_lines[j]:
-                    match = False
-                    break
-            if match:
-                found_at = i
+        Args:
+            index: Line index of the text to search, without newlines
+            search_lines: Lines to search for
+            replacement_sources: Search line index each replacement line repeats
+            line_hint: Expected 0-based position of the hunk in the text
+            path: Path of the file, used to select language-specific rules
+            budget: Work limits of the call, if any
+            tiers: Tier statistics of the diff source; the fuzzy tiers run in
+                the order it learned and every attempt is recorded in it
+
+        Returns:
+            HunkLocation; found_at is -1 if no tier matched
+
+        Raises:
+            BudgetExhausted: If the budget runs out in one of the tiers
+        """
+        original_text_lines = index.lines
+        found_at = -1
+        strategy = None
+        started = time.perf_counter()
+
+        # First try exact matching, considering every candidate location
+        if budget is not None:
+            budget.enter("exact")
+        candidates = Patcher._find_exact_candidates(index, search_lines, budget)
+        candidates, ambiguous = Patcher._rank_candidates(candidates, line_hint)
+        if candidates:
+            found_at = candidates[0]
+            strategy = "exact"
+        if tiers is not None:
+            tiers.record("exact", found_at != -1, time.perf_counter() - started)
+
+        # Then the fuzzy tiers: blank lines ignored, the whole block shifted by
+        # a single indentation delta, whitespace ignored, joined statements
+        # split apart
+        indent_delta = 0
+        joined_match_info = None
+        order = tiers.order() if tiers is not None else REORDERABLE_TIERS
+        for tier in order:
+            if found_at != -1:
                 break
+            if budget is not None:
+                budget.enter(tier)
+            started = time.perf_counter()
+            if tier == "blank_line_fuzzy":
+                found_at = Patcher._try_blank_line_fuzzy_matching(
+                    index, search_lines, budget
+                )
+            elif tier == "indent_shift":
+                found_at, indent_delta = Patcher._try_indent_shift_matching(
+                    index, search_lines, budget
+                )
+            elif tier == "whitespace_fuzzy":
+                found_at = Patcher._try_fuzzy_whitespace_matching(
+                    original_text_lines, search_lines, index, budget
+                )
+            elif tier == "joined_statement":
+                found_at, joined_match_info = (
+                    Patcher._try_joined_statement_matching_with_info(
+                        original_text_lines, search_lines, index, path, budget
+                    )
+                )
+            if found_at != -1:
+                strategy = tier
+            if tiers is not None:
+                tiers.record(tier, found_at != -1, time.perf_counter() - started)
 
-        # If exact matching fails, try fuzzy matching (ignoring blank lines)
-        if found_at == -1:
-            # Filter out empty lines from search pattern for fuzzy matching
-            non_empty_search_lines = [line for line in search_lines if line.strip()]
-
-            if len(non_empty_search_lines) > 0:
-                for i in range(len(original_text_lines)):
-                    # Try to match non-empty lines with possible blank lines in between
-                    search_idx = 0
-                    orig_idx = i
-
-                    while search_idx < len(non_empty_search_lines) and orig_idx < len(
-                        original_text_lines
-                    ):
-                        # Skip empty lines in original
-                        while (
-                            orig_idx < len(original_text_lines)
-                            and not original_text_lines[orig_idx].strip()
-                        ):
-                            orig_idx += 1
-
-                        if orig_idx >= len(original_text_lines):
-                            break
-
-                        # Check if current non-empty line matches
-                        if (
-                            original_text_lines[orig_idx]
-                            == non_empty_search_lines[search_idx]
-                        ):
-                            search_idx += 1
-                            orig_idx += 1
-                        else:
-                            break
-
-                    # If we matched all non-empty search lines, we found it
-                    if search_idx == len(non_empty_search_lines):
-                        found_at = i
-                        break
-
-        # If fuzzy matching also fails, try fuzzy whitespace matching
-        used_fuzzy_whitespace = False
+        # As a last resort, accept the most similar window above the threshold
+        score = None
         if found_at == -1:
-            found_at = Patcher._try_fuzzy_whitespace_matching(
-                original_text_lines, search_lines
+            if budget is not None:
+                budget.enter("similarity")
+            started = time.perf_counter()
+            context_offsets = {
+                source for source in replacement_sources if source is not None
+            }
+            found_at, score = Patcher._try_similarity_matching(
+                index,
+                search_lines,
+                line_hint,
+                removed_offsets=[
+                    j for j in range(len(search_lines)) if j not in context_offsets
+                ],
+                budget=budget,
             )
             if found_at != -1:
-                used_fuzzy_whitespace = True
+                strategy = "similarity"
+            if tiers is not None:
+                tiers.record(
+                    "similarity", found_at != -1, time.perf_counter() - started
+                )
 
-        # If fuzzy whitespace matching also fails, try joined statement splitting
-        joined_match_info = None
-        if found_at == -1:
-            found_at, joined_match_info = (
-                Patcher._try_joined_statement_matching_with_info(
-                    original_text_lines, search_lines
+        return HunkLocation(
+            found_at=found_at,
+            strategy=strategy,
+            candidates=candidates,
+            ambiguous=ambiguous,
+            score=score,
+            indent_delta=indent_delta,
+            joined_match_info=joined_match_info,
+        )
+
+    @staticmethod
+    def _locate_in_scope(
+        index: LineIndex,
+        hunk: Hunk,
+        search_lines: List[str],
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+    ) -> Optional[HunkLocation]:
+        """
+        Locate a hunk exactly inside the definition named by its heading.
+
+        Only exact matches are looked for: a fuzzy match inside the named
+        scope must not win over an exact match elsewhere in the file, so the
+        fuzzy tiers wait until the whole file has been searched exactly.
+
+        Args:
+            index: Line index of the file content without newlines; its
+                symbols are parsed once for all hunks located against it
+            hunk: The hunk, whose header may carry a section heading
+            search_lines: Lines to search for
+            line_hint: Expected 0-based position of the hunk
+            path: Path of the file, used to pick the symbol parser
+            budget: Work limits of the call, if any
+
+        Returns:
+            HunkLocation in file coordinates, or None if the heading names no
+            known symbol or the hunk does not match exactly inside it
+        """
+        label = Patcher.hunk_section_label(hunk.header)
+        name = SymbolIndex.label_name(label) if label else None
+        if not name:
+            return None
+        if budget is not None:
+            budget.enter("scope")
+
+        text_lines = index.lines
+        symbols = index.symbols(path).find(name)
+        if line_hint is not None:
+            symbols = sorted(symbols, key=lambda symbol: abs(symbol.start - line_hint))
+
+        for symbol in symbols:
+            # Hunks may run past the end of the definition they start in
+            start = symbol.start
+            end = min(symbol.end + len(search_lines), len(text_lines))
+            candidates = Patcher._find_exact_candidates(
+                LineIndex(text_lines[start:end]), search_lines, budget
+            )
+            if candidates:
+                candidates, ambiguous = Patcher._rank_candidates(
+                    [pos + start for pos in candidates], line_hint
+                )
+                return HunkLocation(
+                    found_at=candidates[0],
+                    strategy="exact",
+                    candidates=candidates,
+                    ambiguous=ambiguous,
+                    scope=f"{symbol.kind} {symbol.name}",
                 )
+
+        return None
+
+    @staticmethod
+    def apply_hunk(
+        original_lines: List[str],
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> Tuple[bool, Optional[List[str]], str]:
+        """
+        Apply a single hunk to original file lines using search-and-replace strategy.
+
+        Args:
+            original_lines: Original file content as lines
+            hunk: The hunk to apply
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            path: Path of the file, used to pick the symbol parser
+            budget: Time, comparison and cancellation limits of the call
+            tiers: Tier statistics of the diff source; see
+                tiers.TierStats.for_source
+
+        Returns:
+            Tuple of (success, modified_lines, message)
+        """
+        result = Patcher.apply_hunk_with_result(
+            original_lines, hunk, line_hint, path, budget, tiers
+        )
+        return result.success, result.lines, result.message
+
+    @staticmethod
+    def apply_hunk_with_result(
+        original_lines: List[str],
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> HunkResult:
+        """
+        Apply a single hunk and report how and where it matched.
+
+        When the context matches exactly in several places, every location is
+        listed in `candidates` and the one closest to `line_hint` is used. If
+        the header carries a section heading such as "def get_clusters", the
+        matching function or class is searched before the whole file.
+
+        Args:
+            original_lines: Original file content as lines
+            hunk: The hunk to apply
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            path: Path of the file, used to pick the symbol parser
+            budget: Time, comparison and cancellation limits of the call; a
+                hunk that runs out has `budget_exhausted` set to the tier
+                that was running
+            tiers: Tier statistics of the diff source; the fuzzy tiers run in
+                the order learned for it and every attempt is recorded
+
+        Returns:
+            HunkResult describing the outcome
+        """
+        file_lines = FileLines.from_lines(original_lines)
+        result = Patcher.apply_hunk_in_place(
+            file_lines, hunk, line_hint, path, budget, tiers
+        )
+        if result.success:
+            result.lines = file_lines.to_lines()
+        return result
+
+    @staticmethod
+    def apply_hunk_in_place(
+        file_lines: FileLines,
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> HunkResult:
+        """
+        Apply a single hunk directly to stored file lines.
+
+        Matching runs on the stored lines as they are and only the matched
+        range is replaced, so applying several hunks never copies the file.
+        The returned HunkResult has `lines` set to None; `file_lines` holds
+        the result.
+
+        Args:
+            file_lines: File content, modified in place on success
+            hunk: The hunk to apply
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            path: Path of the file, used to pick the symbol parser
+            budget: Time, comparison and cancellation limits of the call
+            tiers: Tier statistics of the diff source, if any
+
+        Returns:
+            HunkResult describing the outcome
+        """
+        result, edit = Patcher.locate_edit(
+            file_lines.lines, hunk, line_hint, path, budget=budget, tiers=tiers
+        )
+        if edit is not None:
+            file_lines.apply_edit(edit)
+        return result
+
+    @staticmethod
+    def trusted_location(
+        lines: List[Any], hunk: Hunk, search_lines: List[Any], line_hint: Optional[int]
+    ) -> Optional[HunkLocation]:
+        """
+        Try a hunk at the position its header names, without any search.
+
+        Only headers whose line counts agree with the hunk body are trusted.
+        A trusted header wins over the scope it names: the header line is
+        more precise than the heading, which git takes from the nearest
+        definition line above the hunk.
+
+        Args:
+            lines: File lines (text or bytes)
+            hunk: The hunk to locate
+            search_lines: Search lines of the hunk, same type as lines
+            line_hint: 0-based position from the header
+
+        Returns:
+            Exact HunkLocation at line_hint, or None if the lines differ or
+            the header is not trusted
+        """
+        if line_hint is None:
+            return None
+        end = line_hint + len(search_lines)
+        if end > len(lines) or lines[line_hint:end] != search_lines:
+            return None
+        if (
+            Validation.header_confidence(hunk.header, hunk.lines)
+            < Validation.HEADER_TRUSTED
+        ):
+            return None
+        return HunkLocation(found_at=line_hint, strategy="exact", candidates=[line_hint])
+
+    @staticmethod
+    def locate_edit(
+        text_lines: List[str],
+        hunk: Hunk,
+        line_hint: Optional[int] = None,
+        path: Optional[str] = None,
+        index: Optional[LineIndex] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> Tuple[HunkResult, Optional[Edit]]:
+        """
+        Work out the edit a hunk makes without changing the lines.
+
+        Args:
+            text_lines: File content without newlines
+            hunk: The hunk to locate
+            line_hint: Expected 0-based position of the hunk; defaults to the
+                new start line from the hunk header
+            path: Path of the file, used to pick the symbol parser
+            index: Line index of text_lines, built if not given
+            budget: Work limits of the call; when they run out the hunk fails
+                with `budget_exhausted` set to the tier that was running
+            tiers: Tier statistics of the diff source, if any
+
+        Returns:
+            Tuple of (HunkResult, edit or None if the hunk does not apply)
+        """
+        if not hunk.lines:
+            return HunkResult(False, None, "Empty hunk"), None
+
+        if line_hint is None:
+            header_numbers = Patcher.parse_hunk_header(hunk.header)
+            if header_numbers:
+                line_hint = max(header_numbers[2] - 1, 0)
+        search_lines, replacement_lines, replacement_sources = (
+            Patcher._build_search_and_replacement(hunk)
+        )
+
+        lines = text_lines
+        if not search_lines:
+            # Pure addition case - append to end of file
+            found_at = len(lines)
+            return (
+                HunkResult(
+                    True,
+                    None,
+                    "Applied pure addition hunk",
+                    found_at=found_at,
+                    strategy="pure_addition",
+                ),
+                (found_at, found_at, replacement_lines),
             )
 
+        # A trusted header is tried at its own position, then exact matches
+        # in the scope named in the header, then the whole file
+        try:
+            if budget is not None:
+                budget.start().check()
+            location = Patcher.trusted_location(lines, hunk, search_lines, line_hint)
+            if location is None and index is None:
+                index = LineIndex(lines)
+            if location is None:
+                location = Patcher._locate_in_scope(
+                    index, hunk, search_lines, line_hint, path, budget
+                )
+            if location is None:
+                location = Patcher._locate_hunk(
+                    index,
+                    search_lines,
+                    replacement_sources,
+                    line_hint,
+                    path,
+                    budget,
+                    tiers,
+                )
+        except BudgetExhausted as e:
+            return Patcher._budget_result(e), None
+
+        found_at = location.found_at
+        strategy = location.strategy
+        joined_match_info = location.joined_match_info
+        used_fuzzy_whitespace = strategy == "whitespace_fuzzy"
+
         if found_at == -1:
             return (
-                False,
+                HunkResult(
+                    False,
+                    None,
+                    "Could not find this context in the file",
+                    score=location.score,
+                ),
                 None,
-                "Could not find this context in the file",
             )
 
-        # Apply the replacement
-        modified_lines = []
-
-        # Add lines before the match
-        for i in range(found_at):
-            modified_lines.append(original_lines[i])
-
         # Handle replacement based on whether we have joined statements
         if joined_match_info:
             # Special handling for joined statements
-            modified_lines.extend(
-                Patcher._apply_joined_replacement(
-                    original_lines,
-                    found_at,
-                    search_lines,
-                    replacement_lines,
-                    joined_match_info,
-                )
+            replacement_to_use = Patcher._apply_joined_replacement(
+                lines,
+                found_at,
+                search_lines,
+                replacement_lines,
+                joined_match_info,
             )
             # Calculate how many original lines were consumed
-            start_after = found_at + joined_match_info["original_lines_consumed"]
+            end = found_at + joined_match_info["original_lines_consumed"]
         else:
             # Normal replacement
             if used_fuzzy_whitespace:
                 # When fuzzy whitespace matching was used, preserve original indentation
-                adjusted_replacement_lines = Patcher._adjust_replacement_indentation(
-                    original_text_lines, found_at, search_lines, replacement_lines
+                replacement_to_use = Patcher._adjust_replacement_indentation(
+                    lines, found_at, search_lines, replacement_lines
+                )
+            elif strategy == "indent_shift":
+                replacement_to_use = Patcher._reindent_replacement(
+                    lines,
+                    found_at,
+                    replacement_lines,
+                    replacement_sources,
+                    location.indent_delta,
                 )
-                replacement_to_use = adjusted_replacement_lines
+            elif strategy == "similarity":
+                # Context lines differ from the file, so keep the file's version
+                replacement_to_use = [
+                    lines[found_at + source] if source is not None else line
+                    for line, source in zip(replacement_lines, replacement_sources)
+                ]
             else:
                 # Standard replacement
                 replacement_to_use = replacement_lines
 
-            # Add replacement lines with proper newline handling
-            replacing_to_end = found_at + len(search_lines) == len(original_lines)
-            original_ends_with_newline = original_lines and original_lines[-1].endswith(
-                "\n"
-            )
+            end = found_at + len(search_lines)
+            if strategy == "blank_line_fuzzy":
+                # The matched lines need not number as many as the search lines
+                end, replacement_to_use = Patcher._blank_line_replacement(
+                    lines,
+                    found_at,
+                    search_lines,
+                    replacement_lines,
+                    replacement_sources,
+                )
+            if end == len(lines):
+                # Skip trailing empty lines when replacing to the end of file;
+                # the last line keeps the file's final newline (or lack of it)
+                last = len(replacement_to_use)
+                while last > 0 and replacement_to_use[last - 1] == "":
+                    last -= 1
+                replacement_to_use = replacement_to_use[:last]
 
-            # Find the last non-empty replacement line
-            last_content_line_idx = len(replacement_to_use) - 1
-            while (
-                last_content_line_idx >= 0
-                and replacement_to_use[last_content_line_idx] == ""
-            ):
-                last_content_line_idx -= 1
+        return Patcher._success_result(location), (found_at, end, replacement_to_use)
 
-            for i, line in enumerate(replacement_to_use):
-                if replacing_to_end and i > last_content_line_idx:
-                    # Skip trailing empty lines when replacing to the end of file
-                    continue
-                elif (
-                    replacing_to_end
-                    and i == last_content_line_idx
-                    and not original_ends_with_newline
+    @staticmethod
+    def find_conflicts(lines: List[Any], edits: List[Edit]) -> List[Tuple[int, int]]:
+        """
+        Find pairs of edits that cannot both be applied to the same lines.
+
+        Two edits conflict when the lines one of them changes overlap the
+        range the other one covers, context included. Edits that merely share
+        unchanged context lines do not conflict. The ranges are swept in start
+        order with a heap of open ranges, which costs O(H log H) plus the
+        number of overlapping pairs.
+
+        Args:
+            lines: Lines the edits were located against
+            edits: Edits in hunk order
+
+        Returns:
+            Sorted (earlier, later) pairs of conflicting edit indexes
+        """
+
+        def overlaps(first: Edit, second: Edit) -> bool:
+            # An empty range is an insertion point, inside a range only if
+            # it lies strictly between its first and last line
+            return first[0] < second[1] and second[0] < first[1]
+
+        trimmed = [trim_edit(lines, edit) for edit in edits]
+        order = sorted(range(len(edits)), key=lambda k: edits[k][:2])
+        open_ranges: List[Tuple[int, int]] = []  # Heap of (end, edit index)
+        conflicts = []
+        for k in order:
+            start = edits[k][0]
+            while open_ranges and open_ranges[0][0] <= start:
+                heapq.heappop(open_ranges)
+            for _, other in open_ranges:
+                if overlaps(trimmed[k], edits[other]) or overlaps(
+                    trimmed[other], edits[k]
                 ):
-                    # This is the last content line and original didn't end with newline
-                    modified_lines.append(line)
-                else:
-                    # Normal case - add newline
-                    modified_lines.append(line + "\n")
-            start_after = found_at + len(search_lines)
+                    conflicts.append((min(k, other), max(k, other)))
+            heapq.heappush(open_ranges, (edits[k][1], k))
+        return sorted(conflicts)
 
-        # Add lines after the match
-        for i in range(start_after, len(original_lines)):
-            modified_lines.append(original_lines[i])
+    @staticmethod
+    def describe_conflicts(conflicts: List[Tuple[int, int]]) -> str:
+        """Format conflicting hunk pairs as returned by find_conflicts."""
+        first, second = conflicts[0]
+        message = f"Failed to apply hunk {second + 1}: overlaps hunk {first + 1}"
+        for first, second in conflicts[1 : Patcher.MAX_REPORTED_CONFLICTS]:
+            message += f"; hunk {second + 1} overlaps hunk {first + 1}"
+        if len(conflicts) > Patcher.MAX_REPORTED_CONFLICTS:
+            message += f"; {len(conflicts) - Patcher.MAX_REPORTED_CONFLICTS} more"
+        return message
 
-        return True, modified_lines, f"Applied hunk at line {found_at + 1}"
+    @staticmethod
+    def original_line_hint(hunk: Hunk) -> Optional[int]:
+        """Return the 0-based old start line of a hunk, if its header has one."""
+        header_numbers = Patcher.parse_hunk_header(hunk.header)
+        return max(header_numbers[0] - 1, 0) if header_numbers else None
 
     @staticmethod
-    def apply_diff(parsed_diff: ParsedDiff) -> Tuple[bool, str]:
+    def locate_edits(
+        text_lines: List[str],
+        hunks: List[Hunk],
+        path: Optional[str] = None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> List[Tuple[HunkResult, Optional[Edit]]]:
+        """
+        Locate every hunk against the same unmodified lines.
+
+        One line index, with the symbols parsed from it, is shared by all
+        hunks, and each hunk is expected at the old start line from its header.
+
+        Args:
+            text_lines: Original file content without newlines
+            hunks: Hunks to locate
+            path: Path of the file, used to pick the symbol parser
+            budget: Limits shared by all the hunks
+            tiers: Tier statistics of the diff source, if any
+
+        Returns:
+            (HunkResult, edit or None) for each hunk, in hunk order
+        """
+        index = LineIndex(text_lines)
+        return [
+            Patcher.locate_edit(
+                text_lines,
+                hunk,
+                Patcher.original_line_hint(hunk),
+                path,
+                index,
+                budget,
+                tiers,
+            )
+            for hunk in hunks
+        ]
+
+    @staticmethod
+    def _budget_result(error: BudgetExhausted) -> HunkResult:
+        """Describe a hunk whose search ran out of budget."""
+        return HunkResult(
+            False, None, str(error), budget_exhausted=error.tier or "search"
+        )
+
+    @staticmethod
+    def _success_result(location: HunkLocation) -> HunkResult:
+        """
+        Describe a hunk applied at `location`.
+
+        Args:
+            location: Where and how the hunk matched
+
+        Returns:
+            Successful HunkResult with `lines` left as None
+        """
+        candidates = location.candidates
+        message = f"Applied hunk at line {location.found_at + 1}"
+        if location.scope:
+            message += f" in {location.scope}"
+        if location.strategy == "similarity":
+            message += f" (similarity {location.score:.2f})"
+        if len(candidates) > 1:
+            listed = ", ".join(
+                str(pos + 1)
+                for pos in sorted(candidates)[: Patcher.MAX_REPORTED_CANDIDATES]
+            )
+            if len(candidates) > Patcher.MAX_REPORTED_CANDIDATES:
+                listed += ", ..."
+            message += (
+                f" ({'ambiguous: ' if location.ambiguous else ''}"
+                f"{len(candidates)} candidate locations at lines {listed})"
+            )
+
+        return HunkResult(
+            True,
+            None,
+            message,
+            found_at=location.found_at,
+            strategy=location.strategy,
+            candidates=candidates,
+            ambiguous=location.ambiguous,
+            score=location.score,
+            scope=location.scope,
+        )
+
+    @staticmethod
+    def apply_diff(
+        parsed_diff: ParsedDiff,
+        journal=None,
+        large_file: Optional[bool] = None,
+        jobs: Optional[int] = None,
+        split_hunks: bool = False,
+        merge: bool = False,
+        resolver=None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> Tuple[bool, str]:
         """
         Apply a parsed diff to the target file.
 
         Args:
             parsed_diff: The parsed diff to apply
+            journal: Optional journal.Journal that records the applied change
+            large_file: Use the memory-mapped large-file mode; by default it is
+                used for files of at least LARGE_FILE_THRESHOLD bytes. It only
+                matches exactly or ignoring whitespace and hands diffs needing
+                the other tiers to the in-memory mode
+            jobs: Number of worker processes used to locate the hunks
+            split_hunks: Keep applying the other hunks when one fails; see
+                apply_diff_with_details
+            merge: Three-way merge hunks whose context has drifted; see
+                apply_diff_with_details
+            resolver: Optional path_utils.PathResolver used to find the
+                target file when the diff's path does not exist
+            budget: Time, comparison and cancellation limits shared by all
+                hunks; see apply_diff_with_details
+            tiers: Tier statistics of the diff source; see
+                apply_diff_with_details
 
         Returns:
             Tuple of (success, message)
         """
+        if resolver is not None:
+            parsed_diff = resolver.resolve_diff(parsed_diff)
         if parsed_diff.new_path == "/dev/null":
             return True, f"Skipped file deletion for {parsed_diff.old_path}"
 
+        is_new_file = parsed_diff.old_path == "/dev/null"
+        if large_file is None and not is_new_file:
+            try:
+                large_file = (
+                    os.path.getsize(parsed_diff.old_path)
+                    >= Patcher.LARGE_FILE_THRESHOLD
+                )
+            except OSError:
+                large_file = False
+        if (
+            large_file
+            and not is_new_file
+            and not split_hunks
+            and not merge
+            and budget is None
+            and tiers is None
+        ):
+            # Imported here because large_file builds on this module
+            from large_file import LargeFilePatcher
+
+            return LargeFilePatcher.apply_diff(parsed_diff, journal, jobs=jobs)
+
+        result = Patcher.apply_diff_with_details(
+            parsed_diff,
+            journal,
+            jobs=jobs,
+            split_hunks=split_hunks,
+            merge=merge,
+            budget=budget,
+            tiers=tiers,
+        )
+        return result.success, result.message
+
+    @staticmethod
+    def apply_diff_with_details(
+        parsed_diff: ParsedDiff,
+        journal=None,
+        jobs: Optional[int] = None,
+        split_hunks: bool = False,
+        merge: bool = False,
+        resolver=None,
+        budget: Optional[Budget] = None,
+        tiers: Optional[TierPolicy] = None,
+    ) -> DiffResult:
+        """
+        Apply a parsed diff in memory and report the outcome of every hunk.
+
+        All hunks are resolved against the original file and checked for
+        conflicts before anything is changed. Hunks that only match once an
+        earlier hunk has been applied are then applied one after another.
+
+        With `split_hunks`, as with the Lua option of the same name, a hunk
+        that cannot be applied (or conflicts with an earlier one) is skipped
+        instead of failing the whole diff. The skipped hunks are returned as
+        a leftover diff against the written file, ready to be retried.
+
+        With `merge`, a hunk that matches nowhere is three-way merged into
+        the part of the file its context and removed lines resemble most
+        (see merge3.Merge3). Changes made to the file since the diff was
+        written are kept, and conflict markers are only placed where both
+        sides changed the same lines. A diff that leaves markers is written
+        but reported as unsuccessful, with its `conflicts` counted.
+
+        With `budget`, the time, line comparisons and cancellation token are
+        shared by every hunk of the call. A hunk whose search runs out of
+        budget fails with `budget_exhausted` naming the tier that was
+        running, and is not merged. Hunks are then located in-process, since
+        workers cannot see the token.
+
+        With `tiers`, the fuzzy matching tiers run in the order learned for
+        the diff source and every tier attempt is counted in its statistics.
+        Hunks are then located in-process by the text engine, so that no
+        count is lost. Only tiers whose edits cannot differ are reordered
+        (see tiers.TIER_PRECEDENCE), so every hunk applies just as without it.
+
+        Args:
+            parsed_diff: The parsed diff to apply
+            journal: Optional journal.Journal that records the applied change
+            jobs: Number of worker processes used to locate the hunks
+            split_hunks: Skip failing hunks instead of stopping at the first
+            merge: Fall back to a three-way merge for hunks that match nowhere
+            resolver: Optional path_utils.PathResolver used to find the
+                target file when the diff's path does not exist
+            budget: Time, comparison and cancellation limits of the call
+            tiers: Tier statistics of the diff source; see
+                tiers.TierStats.for_source
+
+        Returns:
+            DiffResult with a HunkResult for every attempted hunk
+        """
+        if resolver is not None:
+            parsed_diff = resolver.resolve_diff(parsed_diff)
+        hunks = parsed_diff.hunks
+        target = parsed_diff.new_path
+        if target == "/dev/null":
+            return DiffResult(True, f"Skipped file deletion for {parsed_diff.old_path}")
+
         # Read the original file
         is_new_file = parsed_diff.old_path == "/dev/null"
         if is_new_file:
-            original_lines = []
+            original = b""
         else:
-            original_lines = Patcher.read_file_lines(parsed_diff.old_path)
-            if original_lines is None:
-                return False, f"Failed to read file {parsed_diff.old_path}"
-
-        # Apply each hunk
-        current_lines = original_lines
-        applied_hunks = 0
-
-        for i, hunk in enumerate(parsed_diff.hunks):
-            success, modified_lines, message = Patcher.apply_hunk(current_lines, hunk)
-            if success:
-                current_lines = modified_lines
-                applied_hunks += 1
+            try:
+                with open(parsed_diff.old_path, "rb") as f:
+                    original = f.read()
+            except (FileNotFoundError, IOError):
+                return DiffResult(False, f"Failed to read file {parsed_diff.old_path}")
+
+        # Imported here because bytes_mode builds on this module
+        from bytes_mode import BytesPatcher, RawLines
+
+        results: List[Optional[HunkResult]] = [None] * len(hunks)
+        # Lines added minus lines removed by each applied hunk
+        deltas = [0] * len(hunks)
+        modified = None
+        if budget is not None:
+            budget.start()
+        if budget is not None or tiers is not None:
+            jobs = None
+
+        # Exact ASCII hunks are located on the raw bytes, so the file is only
+        # decoded when a hunk needs the text matching tiers. Tier statistics
+        # are only gathered by the text engine.
+        raw_lines = None
+        if tiers is None and (not jobs or jobs <= 1):
+            raw_lines = RawLines.from_bytes(original)
+        if raw_lines is not None:
+            located = BytesPatcher.locate_edits(raw_lines, hunks, budget)
+            if located is not None:
+                edits, error = Patcher._accept_edits(
+                    raw_lines.lines, located, results, deltas, split_hunks
+                )
+                if error:
+                    return DiffResult(False, error, Patcher._attempted(results))
+                raw_lines.apply_edits(edits)
+                modified = raw_lines.to_bytes()
+
+        if modified is None:
+            file_lines = FileLines.from_bytes(original)
+            if jobs and jobs > 1:
+                # Imported here because parallel builds on this module
+                from parallel import ParallelLocator
+
+                located = ParallelLocator.locate_edits(
+                    file_lines.lines, hunks, parsed_diff.old_path, jobs
+                )
+            else:
+                located = Patcher.locate_edits(
+                    file_lines.lines, hunks, parsed_diff.old_path, budget, tiers
+                )
+            if split_hunks or all(edit is not None for _, edit in located):
+                edits, error = Patcher._accept_edits(
+                    file_lines.lines, located, results, deltas, split_hunks
+                )
+                if error:
+                    return DiffResult(False, error, Patcher._attempted(results))
+                file_lines.apply_edits(edits)
             else:
-                return False, f"Failed to apply hunk {i + 1}: {message}"
+                # Some hunks only match once earlier ones are applied, so all
+                # are applied one after another; the ones that match the
+                # original must still not overlap
+                indexes = [i for i, (_, edit) in enumerate(located) if edit]
+                conflicts = Patcher.find_conflicts(
+                    file_lines.lines, [located[i][1] for i in indexes]
+                )
+                if conflicts:
+                    hunk_pairs = [(indexes[a], indexes[b]) for a, b in conflicts]
+                    return DiffResult(False, Patcher.describe_conflicts(hunk_pairs))
+
+            # Hunks that depend on earlier ones are applied one after another
+            for i, hunk in enumerate(hunks):
+                if results[i] is not None:
+                    continue
+                line_count = len(file_lines.lines)
+                results[i] = Patcher.apply_hunk_in_place(
+                    file_lines,
+                    hunk,
+                    path=parsed_diff.old_path,
+                    budget=budget,
+                    tiers=tiers,
+                )
+                if (
+                    not results[i].success
+                    and merge
+                    and results[i].budget_exhausted is None
+                ):
+                    # Imported here because merge3 builds on this module
+                    from merge3 import Merge3
+
+                    merged, edit = Merge3.merge_hunk(file_lines.lines, hunk)
+                    if edit is not None:
+                        file_lines.apply_edit(edit)
+                        results[i] = merged
+                deltas[i] = len(file_lines.lines) - line_count
+                if not results[i].success and not split_hunks:
+                    return DiffResult(
+                        False,
+                        f"Failed to apply hunk {i + 1}: {results[i].message}",
+                        Patcher._attempted(results),
+                    )
+            try:
+                modified = file_lines.to_bytes()
+            except UnicodeEncodeError:
+                return DiffResult(
+                    False,
+                    f"Failed to write file {target}: "
+                    f"content cannot be encoded as {file_lines.encoding}",
+                    Patcher._attempted(results),
+                )
+
+        hunk_results = Patcher._attempted(results)
+        failed = [i for i, result in enumerate(hunk_results) if not result.success]
+        applied_hunks = len(hunks) - len(failed)
+        leftover = None
+        if failed:
+            leftover = ParsedDiff(
+                target, target, Patcher._leftover_hunks(hunks, failed, deltas)
+            )
+            if not applied_hunks:
+                return DiffResult(
+                    False,
+                    f"Failed to apply any hunks to {target}\n"
+                    f"First error: {hunk_results[failed[0]].message}",
+                    hunk_results,
+                    leftover,
+                )
 
         # Write the modified file
-        if not Patcher.write_file_lines(parsed_diff.new_path, current_lines):
-            return False, f"Failed to write file {parsed_diff.new_path}"
+        if not Patcher._write_bytes(target, modified):
+            return DiffResult(False, f"Failed to write file {target}", hunk_results)
+
+        if journal is not None:
+            journal.record(
+                target,
+                FileLines.from_bytes(original),
+                FileLines.from_bytes(modified),
+                created=is_new_file,
+            )
 
-        return (
-            True,
-            f"Successfully applied {applied_hunks} hunks to {parsed_diff.new_path}",
-        )
+        conflicted = [i for i, result in enumerate(hunk_results) if result.conflicts]
+        conflicts = sum(result.conflicts for result in hunk_results)
+        if conflicted:
+            plural = "s" if conflicts > 1 else ""
+            message = (
+                f"Applied {applied_hunks}/{len(hunks)} hunks to {target} "
+                f"with {conflicts} conflict{plural} to resolve\n"
+                f"Conflicted hunks: {', '.join(f'#{i + 1}' for i in conflicted)}"
+            )
+            if failed:
+                message += f"\nFailed hunks: {', '.join(f'#{i + 1}' for i in failed)}"
+        elif failed:
+            message = (
+                f"Partially applied {applied_hunks}/{len(hunks)} hunks to {target}\n"
+                f"Failed hunks: {', '.join(f'#{i + 1}' for i in failed)}"
+            )
+        else:
+            message = f"Successfully applied {applied_hunks} hunks to {target}"
+        return DiffResult(not conflicted, message, hunk_results, leftover, conflicts)
+
+    @staticmethod
+    def _accept_edits(
+        lines: List[Any],
+        located: List[Tuple[HunkResult, Optional[Edit]]],
+        results: List[Optional[HunkResult]],
+        deltas: List[int],
+        split_hunks: bool,
+    ) -> Tuple[List[Edit], Optional[str]]:
+        """
+        Pick the located edits that can be applied together.
+
+        Results of the accepted hunks, and of hunks rejected for a conflict,
+        are stored in `results`; unlocated hunks are left as None.
+
+        Args:
+            lines: Lines the edits were located against
+            located: (HunkResult, edit or None) for each hunk
+            results: Per-hunk results, updated in place
+            deltas: Per-hunk line count changes, set for the accepted hunks
+            split_hunks: Reject the later hunk of each conflicting pair
+                instead of failing
+
+        Returns:
+            Tuple of (accepted edits in hunk order, error message if
+            conflicts make the whole diff fail)
+        """
+        indexes = [i for i, (_, edit) in enumerate(located) if edit is not None]
+        conflicts = [
+            (indexes[first], indexes[second])
+            for first, second in Patcher.find_conflicts(
+                lines, [located[i][1] for i in indexes]
+            )
+        ]
+        if conflicts and not split_hunks:
+            return [], Patcher.describe_conflicts(conflicts)
+
+        # Pairs come sorted by their earlier hunk, so every rejection of a
+        # hunk is known before its own conflicts are considered
+        rejected: Dict[int, int] = {}
+        for first, second in conflicts:
+            if first not in rejected and second not in rejected:
+                rejected[second] = first
+
+        edits = []
+        for i in indexes:
+            if i in rejected:
+                results[i] = HunkResult(
+                    False, None, f"Overlaps hunk {rejected[i] + 1}"
+                )
+            else:
+                results[i] = located[i][0]
+                start, end, replacement = located[i][1]
+                deltas[i] = len(replacement) - (end - start)
+                edits.append(located[i][1])
+        return edits, None
+
+    @staticmethod
+    def _leftover_hunks(
+        hunks: List[Hunk], failed: List[int], deltas: List[int]
+    ) -> List[Hunk]:
+        """
+        Return the failed hunks with headers numbered for the written file.
+
+        Each failed hunk moves by the lines added and removed by the applied
+        hunks before it in the diff.
+
+        Args:
+            hunks: All hunks of the diff
+            failed: Indexes of the failed hunks
+            deltas: Line count change of each applied hunk
+
+        Returns:
+            The failed hunks, in diff order
+        """
+        failed_set = set(failed)
+        leftover = []
+        shift = 0
+        for i, hunk in enumerate(hunks):
+            if i in failed_set:
+                leftover.append(
+                    Hunk(
+                        header=Patcher.shift_hunk_header(hunk.header, shift),
+                        lines=hunk.lines,
+                    )
+                )
+            else:
+                shift += deltas[i]
+        return leftover
+
+    @staticmethod
+    def _attempted(results: List[Optional[HunkResult]]) -> List[HunkResult]:
+        """Return the results of the hunks that were attempted, in hunk order."""
+        return [result for result in results if result is not None]
+
+    @staticmethod
+    def format_diff(parsed_diff: ParsedDiff) -> str:
+        """
+        Render a parsed diff back into unified diff text.
+
+        Args:
+            parsed_diff: The diff to render
+
+        Returns:
+            Diff text that parse_diff reads back into the same hunks
+        """
+        lines = [f"--- {parsed_diff.old_path}", f"+++ {parsed_diff.new_path}"]
+        for hunk in parsed_diff.hunks:
+            lines.append(hunk.header)
+            lines.extend(hunk.lines)
+        return "\n".join(lines)
+
+
+# Built-in repair rules; languages whose syntax cannot produce these joins
+# skip them
+for _rule in (
+    Rule(
+        "function_docstring",
+        "split_line",
+        Patcher._split_function_docstring,
+        ("python",),
+    ),
+    Rule(
+        "bracket_keyword",
+        "split_line",
+        Patcher._split_after_bracket,
+        ("python", "javascript"),
+    ),
+    Rule(
+        "joined_statement",
+        "joined_statement",
+        Patcher._split_joined_statement,
+        ("python",),
+    ),
+):
+    RULES.register(_rule)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Run as a script this file is the __main__ module, not patcher; the
+    # command line interface works on the regular module so that its classes
+    # are the ones the helper modules use
+    from cli import main
+
+    sys.exit(main())
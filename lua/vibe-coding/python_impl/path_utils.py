@@ -0,0 +1,442 @@
+"""
+Path utility functions for diff processing - Python implementation
+Resolves the often wrong paths of generated diffs against a project file index.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from patcher import ParsedDiff
+
+
+class GitIgnore:
+    """
+    The rules of one .gitignore file.
+
+    Supports comments, negation, directory-only patterns, anchored patterns
+    and `*`, `?`, `[...]` and `**` wildcards.
+    """
+
+    def __init__(self, base: str, rules: List[Tuple[Pattern, bool, bool, bool]]):
+        """
+        Args:
+            base: Directory of the .gitignore file relative to the root, "" for
+                the root itself
+            rules: (regex, negated, directory only, anchored) per pattern
+        """
+        self.base = base
+        self.rules = rules
+
+    @classmethod
+    def parse(cls, base: str, text: str) -> "GitIgnore":
+        """Parse the content of a .gitignore file located in `base`."""
+        rules = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            rules.append(
+                (cls._translate(line.lstrip("/")), negated, dir_only, anchored)
+            )
+        return cls(base, rules)
+
+    @staticmethod
+    def _translate(pattern: str) -> Pattern:
+        """Translate a gitignore glob into a regular expression."""
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i):
+                parts.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                parts.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                parts.append("[^/]")
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+                end = pattern.index("]", i + 2)
+                members = pattern[i + 1 : end]
+                if members.startswith("!"):
+                    members = "^" + members[1:]
+                parts.append("[" + members.replace("\\", "\\\\") + "]")
+                i = end + 1
+            elif pattern[i] == "\\" and i + 1 < len(pattern):
+                parts.append(re.escape(pattern[i + 1]))
+                i += 2
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return re.compile("".join(parts) + r"\Z")
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Check a path against the rules; the last matching rule wins.
+
+        Args:
+            rel_path: Path relative to the index root, inside self.base
+            is_dir: Whether the path is a directory
+
+        Returns:
+            True if ignored, False if re-included, None if no rule matches
+        """
+        path = rel_path[len(self.base) + 1 :] if self.base else rel_path
+        name = path.rsplit("/", 1)[-1]
+        verdict = None
+        for regex, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path if anchored else name):
+                verdict = not negated
+        return verdict
+
+
+@dataclass
+class _DirState:
+    """What the index knows about one directory."""
+
+    mtime_ns: int
+    ignore_mtime_ns: Optional[int]
+    scanned_ns: int
+    files: List[str]
+    subdirs: List[str]
+    parent_ignores: Tuple[GitIgnore, ...]
+    ignores: Tuple[GitIgnore, ...]
+
+
+class FileIndex:
+    """
+    Index of the files below a root directory by every path suffix.
+
+    `a/b/c.py` is found under `c.py`, `b/c.py` and `a/b/c.py`, so lookups by
+    basename or by any trailing part of a path are a dictionary access.
+    Ignored files (per .gitignore) and `.git` are left out. refresh() only
+    re-lists directories whose modification time changed.
+    """
+
+    # Directories modified this close to their scan are listed again on the
+    # next refresh, as a change in the same timestamp tick would go unseen
+    RACY_WINDOW_NS = 1_000_000_000
+
+    def __init__(self, root: str = "."):
+        self.root = root
+        self.generation = 0
+        self._dirs: Dict[str, _DirState] = {}
+        self._suffixes: Dict[str, Dict[str, None]] = {}
+        self._scan("", ())
+
+    def __len__(self) -> int:
+        return sum(len(state.files) for state in self._dirs.values())
+
+    def candidates(self, path: str) -> List[str]:
+        """
+        Find indexed files ending with the longest possible suffix of `path`.
+
+        Args:
+            path: Slash-separated path, relative or not
+
+        Returns:
+            Sorted paths relative to the root, empty if even the basename is
+            unknown
+        """
+        parts = [part for part in path.split("/") if part not in ("", ".", "..")]
+        for k in range(len(parts)):
+            found = self._suffixes.get("/".join(parts[k:]))
+            if found:
+                return sorted(found)
+        return []
+
+    def refresh(self) -> bool:
+        """
+        Bring the index up to date with the file system.
+
+        Returns:
+            True if anything changed
+        """
+        changed = False
+        # Parents are always indexed before their subdirectories
+        for rel_dir in list(self._dirs):
+            state = self._dirs.get(rel_dir)
+            if state is None:
+                continue
+            full = os.path.join(self.root, rel_dir)
+            try:
+                mtime_ns = os.stat(full).st_mtime_ns
+            except OSError:
+                self._remove_dir(rel_dir)
+                changed = True
+                continue
+            ignore_mtime_ns = self._ignore_mtime(full)
+
+            if ignore_mtime_ns != state.ignore_mtime_ns:
+                self._remove_dir(rel_dir)
+                self._scan(rel_dir, state.parent_ignores)
+                changed = True
+            elif (
+                mtime_ns != state.mtime_ns
+                or state.scanned_ns - state.mtime_ns < self.RACY_WINDOW_NS
+            ):
+                changed = self._rescan(rel_dir, state) or changed
+        if changed:
+            self.generation += 1
+        return changed
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    @staticmethod
+    def _ignore_mtime(full_dir: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(full_dir, ".gitignore")).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _ignored(ignores: Tuple[GitIgnore, ...], rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for gitignore in ignores:
+            verdict = gitignore.match(rel_path, is_dir)
+            if verdict is not None:
+                ignored = verdict
+        return ignored
+
+    def _list(
+        self, rel_dir: str, ignores: Tuple[GitIgnore, ...]
+    ) -> Optional[Tuple[int, List[str], List[str]]]:
+        """List the indexed files and subdirectories of a directory."""
+        full = os.path.join(self.root, rel_dir)
+        try:
+            mtime_ns = os.stat(full).st_mtime_ns
+            entries = list(os.scandir(full))
+        except OSError:
+            return None
+        files, subdirs = [], []
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if not self._ignored(ignores, self._join(rel_dir, entry.name), is_dir):
+                (subdirs if is_dir else files).append(entry.name)
+        return mtime_ns, files, subdirs
+
+    def _scan(self, rel_dir: str, parent_ignores: Tuple[GitIgnore, ...]) -> None:
+        """Index a directory and everything below it."""
+        full = os.path.join(self.root, rel_dir)
+        ignore_mtime_ns = self._ignore_mtime(full)
+        ignores = parent_ignores
+        if ignore_mtime_ns is not None:
+            try:
+                with open(os.path.join(full, ".gitignore"), errors="replace") as f:
+                    ignores = ignores + (GitIgnore.parse(rel_dir, f.read()),)
+            except OSError:
+                pass
+
+        listed = self._list(rel_dir, ignores)
+        if listed is None:
+            return
+        mtime_ns, files, subdirs = listed
+        self._dirs[rel_dir] = _DirState(
+            mtime_ns,
+            ignore_mtime_ns,
+            time.time_ns(),
+            files,
+            subdirs,
+            parent_ignores,
+            ignores,
+        )
+        for name in files:
+            self._add_file(self._join(rel_dir, name))
+        for name in subdirs:
+            self._scan(self._join(rel_dir, name), ignores)
+
+    def _rescan(self, rel_dir: str, state: _DirState) -> bool:
+        """Pick up the entries added to or removed from a single directory."""
+        listed = self._list(rel_dir, state.ignores)
+        if listed is None:
+            self._remove_dir(rel_dir)
+            return True
+        mtime_ns, files, subdirs = listed
+        old_files, old_subdirs = set(state.files), set(state.subdirs)
+        state.mtime_ns, state.scanned_ns = mtime_ns, time.time_ns()
+        state.files, state.subdirs = files, subdirs
+
+        changed = False
+        for name in old_files.difference(files):
+            self._remove_file(self._join(rel_dir, name))
+            changed = True
+        for name in old_subdirs.difference(subdirs):
+            self._remove_dir(self._join(rel_dir, name))
+            changed = True
+        for name in files:
+            if name not in old_files:
+                self._add_file(self._join(rel_dir, name))
+                changed = True
+        for name in subdirs:
+            if name not in old_subdirs:
+                self._scan(self._join(rel_dir, name), state.ignores)
+                changed = True
+        return changed
+
+    def _remove_dir(self, rel_dir: str) -> None:
+        state = self._dirs.pop(rel_dir, None)
+        if state is None:
+            return
+        for name in state.files:
+            self._remove_file(self._join(rel_dir, name))
+        for name in state.subdirs:
+            self._remove_dir(self._join(rel_dir, name))
+
+    def _add_file(self, rel_path: str) -> None:
+        parts = rel_path.split("/")
+        for k in range(len(parts)):
+            self._suffixes.setdefault("/".join(parts[k:]), {})[rel_path] = None
+
+    def _remove_file(self, rel_path: str) -> None:
+        parts = rel_path.split("/")
+        for k in range(len(parts)):
+            key = "/".join(parts[k:])
+            paths = self._suffixes.get(key)
+            if paths is not None:
+                paths.pop(rel_path, None)
+                if not paths:
+                    del self._suffixes[key]
+
+
+class PathResolver:
+    """
+    Finds the file a diff path refers to, like the Lua resolve_file_path.
+
+    A path that exists is used as is; otherwise the file index is searched
+    for files ending with as much of the path as possible, and ties are
+    broken by how much of the directory structure matches. The index is
+    built on first use and refreshed at most once per `refresh_interval`
+    seconds, so resolving many paths does not walk the file system each time.
+    """
+
+    def __init__(self, root: str = ".", refresh_interval: float = 1.0):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self._index: Optional[FileIndex] = None
+        self._refreshed_at = 0.0
+
+    @property
+    def index(self) -> FileIndex:
+        """The file index, refreshed if it is older than the interval."""
+        now = time.monotonic()
+        if self._index is None:
+            self._index = FileIndex(self.root)
+            self._refreshed_at = now
+        elif now - self._refreshed_at >= self.refresh_interval:
+            self._index.refresh()
+            self._refreshed_at = now
+        return self._index
+
+    @staticmethod
+    def clean_path(path: str) -> str:
+        """Remove malformed leading dashes and spaces."""
+        return re.sub(r"^[-\s]*", "", path)
+
+    def resolve(self, original_path: str) -> Optional[str]:
+        """
+        Find the actual file for a path from a diff header.
+
+        Args:
+            original_path: The path from the diff
+
+        Returns:
+            The resolved path (relative to the root when found through the
+            index), or None if no file matches
+        """
+        if not original_path:
+            return None
+        cleaned = re.sub(r"^\w/", "", self.clean_path(original_path)).lstrip("/")
+
+        if cleaned and os.path.isfile(os.path.join(self.root, cleaned)):
+            return cleaned
+        if os.path.isabs(original_path) and os.path.isfile(original_path):
+            root = os.path.abspath(self.root)
+            if original_path.startswith(root + os.sep):
+                return os.path.relpath(original_path, root)
+            return original_path
+
+        candidates = self.index.candidates(cleaned)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return self.find_best_match(candidates, cleaned)
+
+    def resolve_diff(self, parsed_diff: ParsedDiff) -> ParsedDiff:
+        """
+        Return the diff with its paths pointed at the file it modifies.
+
+        Resolved paths are joined to the root, so the diff can be applied
+        from any working directory. New files and unresolvable paths are left
+        unchanged; the new path is only rewritten when it names the same file
+        as the old one.
+        """
+        if parsed_diff.old_path == "/dev/null":
+            return parsed_diff
+        resolved = self.resolve(parsed_diff.old_path)
+        if resolved is None:
+            return parsed_diff
+        resolved = os.path.normpath(os.path.join(self.root, resolved))
+        if resolved == parsed_diff.old_path:
+            return parsed_diff
+        new_path = parsed_diff.new_path
+        if new_path == parsed_diff.old_path:
+            new_path = resolved
+        return replace(parsed_diff, old_path=resolved, new_path=new_path)
+
+    @staticmethod
+    def find_best_match(candidates: List[str], original_path: str) -> str:
+        """
+        Pick the candidate sharing the most structure with the original path.
+
+        Scores one point per component of the original path found in the
+        candidate and two per trailing parent directory the two share.
+
+        Args:
+            candidates: Candidate paths
+            original_path: The path from the diff
+
+        Returns:
+            The best candidate, the first one on ties
+        """
+        parts = [part for part in original_path.split("/") if part]
+        original_dirs = original_path.split("/")
+        best_match, best_score = candidates[0], 0
+        for candidate in candidates:
+            score = sum(1 for part in parts if part in candidate)
+            if "/" in original_path and "/" in candidate:
+                candidate_dirs = candidate.split("/")
+                for i in range(2, min(len(original_dirs), len(candidate_dirs)) + 1):
+                    if original_dirs[-i] != candidate_dirs[-i]:
+                        break
+                    score += 2
+            if score > best_score:
+                best_match, best_score = candidate, score
+        return best_match
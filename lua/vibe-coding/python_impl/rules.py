@@ -0,0 +1,168 @@
+"""
+Language-aware repair rules - Python implementation
+Registry of the joined-line heuristics, selected by file extension and metered.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Languages recognized from file extensions; rules name the languages they
+# are meant for
+LANGUAGE_EXTENSIONS: Dict[str, Tuple[str, ...]] = {
+    "python": (".py", ".pyi", ".pyw"),
+    "javascript": (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"),
+    "lua": (".lua",),
+    "json": (".json",),
+    "yaml": (".yml", ".yaml"),
+    "toml": (".toml",),
+    "shell": (".sh", ".bash", ".zsh"),
+    "markdown": (".md",),
+    "vim": (".vim",),
+}
+
+EXTENSION_LANGUAGES: Dict[str, str] = {
+    extension: language
+    for language, extensions in LANGUAGE_EXTENSIONS.items()
+    for extension in extensions
+}
+
+
+def language_for_path(path: Optional[str]) -> Optional[str]:
+    """Return the language of a file from its extension, None if unknown."""
+    if not path:
+        return None
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+
+@dataclass
+class Rule:
+    """
+    One repair heuristic with its usage counters.
+
+    `apply` returns None when the rule does not fire. Rules without
+    `languages` run for every file; files of unknown language run every rule.
+    """
+
+    name: str
+    stage: str
+    apply: Callable[..., Any]
+    languages: Optional[Tuple[str, ...]] = None
+    enabled: bool = True
+    calls: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+
+    def run(self, *args: Any) -> Any:
+        """Apply the rule and update its counters."""
+        start = time.perf_counter()
+        result = self.apply(*args)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        if result is not None:
+            self.hits += 1
+        return result
+
+
+class RuleRegistry:
+    """
+    Rules grouped by stage, in registration order.
+
+    The rules that apply to a stage and language are looked up once and
+    cached until a rule is registered, enabled or disabled.
+    """
+
+    def __init__(self):
+        self._rules: Dict[str, Rule] = {}
+        self._selected: Dict[Tuple[str, Optional[str]], List[Rule]] = {}
+
+    def register(self, rule: Rule) -> Rule:
+        """Add a rule, replacing any rule with the same name."""
+        self._rules[rule.name] = rule
+        self._selected.clear()
+        return rule
+
+    def get(self, name: str) -> Optional[Rule]:
+        """Return the rule with the given name, if registered."""
+        return self._rules.get(name)
+
+    def set_enabled(self, name: str, enabled: bool) -> None:
+        """Switch a rule on or off."""
+        self._rules[name].enabled = enabled
+        self._selected.clear()
+
+    def rules_for(self, stage: str, path: Optional[str] = None) -> List[Rule]:
+        """
+        Return the enabled rules of a stage that apply to a file.
+
+        Args:
+            stage: Stage name, e.g. "split_line"
+            path: Path of the file being patched, if known
+
+        Returns:
+            Rules in registration order
+        """
+        language = language_for_path(path)
+        key = (stage, language)
+        selected = self._selected.get(key)
+        if selected is None:
+            selected = [
+                rule
+                for rule in self._rules.values()
+                if rule.stage == stage
+                and rule.enabled
+                and (
+                    language is None
+                    or rule.languages is None
+                    or language in rule.languages
+                )
+            ]
+            self._selected[key] = selected
+        return selected
+
+    @staticmethod
+    def first_hit(rules: List[Rule], *args: Any) -> Tuple[Optional[Rule], Any]:
+        """
+        Run rules in order until one fires.
+
+        Args:
+            rules: Rules as returned by rules_for
+            *args: Arguments passed to each rule
+
+        Returns:
+            Tuple of (rule that fired, its result), or (None, None)
+        """
+        for rule in rules:
+            result = rule.run(*args)
+            if result is not None:
+                return rule, result
+        return None, None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return the counters of every rule, most expensive first."""
+        return sorted(
+            (
+                {
+                    "name": rule.name,
+                    "stage": rule.stage,
+                    "languages": rule.languages,
+                    "enabled": rule.enabled,
+                    "calls": rule.calls,
+                    "hits": rule.hits,
+                    "seconds": rule.seconds,
+                }
+                for rule in self._rules.values()
+            ),
+            key=lambda entry: -entry["seconds"],
+        )
+
+    def reset_stats(self) -> None:
+        """Zero the counters of every rule."""
+        for rule in self._rules.values():
+            rule.calls = rule.hits = 0
+            rule.seconds = 0.0
+
+
+# Registry used by the patcher; patcher.py registers the built-in rules
+RULES = RuleRegistry()
@@ -22,6 +22,19 @@ def run_tests():
         "tests.test_validation",
         "tests.test_patcher",
         "tests.test_python_implementation",
+        "tests.test_journal",
+        "tests.test_symbols",
+        "tests.test_rules",
+        "tests.test_large_file",
+        "tests.test_bytes_mode",
+        "tests.test_parallel",
+        "tests.test_merge3",
+        "tests.test_path_utils",
+        "tests.test_canonical",
+        "tests.test_serialization",
+        "tests.test_transcript",
+        "tests.test_tiers",
+        "tests.test_cli",
     ]
 
     total_tests = 0
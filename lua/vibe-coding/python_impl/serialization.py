@@ -0,0 +1,205 @@
+"""
+Diff serialization - Python implementation
+Compact binary and JSON encodings of parsed diffs for worker pools and Lua.
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Tuple, Union
+
+from patcher import Hunk, ParsedDiff
+
+# Binary layout, all integers little-endian:
+#   magic (4 bytes) | record count N (u32) | N byte lengths (u32 each)
+#   | N tag bytes | UTF-8 records, separated by newlines
+# The lengths come right after the 8-byte header so they can be viewed in
+# place as an array of u32.
+MAGIC = b"VPD1"
+HEADER = struct.Struct("<4sI")
+
+# Record tags. Hunk lines are tagged with their prefix character, so lines
+# can be counted or filtered by kind from the tag bytes alone.
+TAG_OLD_PATH = 0x01
+TAG_NEW_PATH = 0x02
+TAG_HUNK_HEADER = 0x03
+TAG_RAW = 0x04  # Hunk line without a diff prefix, e.g. an empty line
+LINE_TAGS = {prefix: ord(prefix) for prefix in (" ", "+", "-", "~", "\\")}
+
+# Format version of the JSON encoding
+JSON_VERSION = 1
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class DiffCodec:
+    """
+    Encodes parsed diffs for other processes.
+
+    The binary form is a length-prefixed record table with a tag byte per
+    record. Decoding works on a memoryview of the buffer, so a diff received
+    in shared memory or an mmap is read without copying the buffer: the
+    records are decoded with one call and split apart at C speed, and the
+    hunks are slices between the header tags.
+
+    The JSON form mirrors the diff table of the Lua patcher
+    ({old_path, new_path, hunks = {{header, lines}}}) and can be read there
+    with Utils.json_decode.
+    """
+
+    @staticmethod
+    def encode(parsed_diff: ParsedDiff) -> bytes:
+        """
+        Encode a diff in the binary form.
+
+        Args:
+            parsed_diff: The diff to encode
+
+        Returns:
+            The encoded diff
+        """
+        tags = bytearray((TAG_OLD_PATH, TAG_NEW_PATH))
+        records = [parsed_diff.old_path, parsed_diff.new_path]
+        for hunk in parsed_diff.hunks:
+            tags.append(TAG_HUNK_HEADER)
+            records.append(hunk.header)
+            records.extend(hunk.lines)
+            tags.extend([LINE_TAGS.get(line[:1], TAG_RAW) for line in hunk.lines])
+
+        text = "\n".join(records)
+        blob = text.encode("utf-8", "surrogatepass")
+        if len(blob) == len(text):
+            lengths = array("I", map(len, records))
+        else:
+            lengths = array(
+                "I", (len(r.encode("utf-8", "surrogatepass")) for r in records)
+            )
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        return b"".join(
+            (HEADER.pack(MAGIC, len(records)), lengths.tobytes(), tags, blob)
+        )
+
+    @staticmethod
+    def decode(buffer: Buffer) -> ParsedDiff:
+        """
+        Decode a diff encoded by encode().
+
+        Args:
+            buffer: The encoded diff; bytes, bytearray or memoryview
+
+        Returns:
+            The decoded diff
+
+        Raises:
+            ValueError: If the buffer is not an encoded diff
+        """
+        view = memoryview(buffer).cast("B")
+        if len(view) < HEADER.size:
+            raise ValueError("Truncated diff encoding")
+        magic, count = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a binary diff encoding")
+        tags_start = HEADER.size + 4 * count
+        blob_start = tags_start + count
+        if count < 2 or len(view) < blob_start:
+            raise ValueError("Truncated diff encoding")
+        tags = view[tags_start:blob_start].tobytes()
+        if tags[0] != TAG_OLD_PATH or tags[1] != TAG_NEW_PATH:
+            raise ValueError("Diff encoding has no paths")
+
+        records = str(view[blob_start:], "utf-8", "surrogatepass").split("\n")
+        if len(records) != count:
+            # Some record holds a newline: cut the records by their lengths
+            records = DiffCodec._split_by_lengths(view, count, blob_start)
+
+        diff = ParsedDiff(old_path=records[0], new_path=records[1], hunks=[])
+        start = tags.find(TAG_HUNK_HEADER, 2)
+        if start == -1 and count > 2:
+            raise ValueError("Diff encoding has a line before any hunk")
+        while start != -1:
+            end = tags.find(TAG_HUNK_HEADER, start + 1)
+            stop = count if end == -1 else end
+            diff.hunks.append(
+                Hunk(header=records[start], lines=records[start + 1 : stop])
+            )
+            start = end
+        return diff
+
+    @staticmethod
+    def line_counts(buffer: Buffer) -> Tuple[int, int]:
+        """
+        Count the removed and added lines of an encoded diff from its tags.
+
+        Nothing but the tag bytes is read, so this is cheap even for large
+        diffs held in shared memory.
+
+        Returns:
+            Tuple of (removed lines, added lines)
+        """
+        view = memoryview(buffer).cast("B")
+        magic, count = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a binary diff encoding")
+        tags_start = HEADER.size + 4 * count
+        tags = view[tags_start : tags_start + count].tobytes()
+        return tags.count(LINE_TAGS["-"]), tags.count(LINE_TAGS["+"])
+
+    @staticmethod
+    def _split_by_lengths(
+        view: memoryview, count: int, blob_start: int
+    ) -> List[str]:
+        """Cut the records out of the blob using the length table."""
+        if sys.byteorder == "little":
+            lengths: Any = view[HEADER.size : HEADER.size + 4 * count].cast("I")
+        else:
+            lengths = array("I", view[HEADER.size : HEADER.size + 4 * count])
+            lengths.byteswap()
+        blob = view[blob_start:]
+        if sum(lengths) + count - 1 != len(blob):
+            raise ValueError("Truncated diff encoding")
+        records = []
+        position = 0
+        for length in lengths:
+            records.append(
+                str(blob[position : position + length], "utf-8", "surrogatepass")
+            )
+            position += length + 1
+        return records
+
+    @staticmethod
+    def to_json(parsed_diff: ParsedDiff) -> str:
+        """Encode a diff as JSON in the shape of the Lua diff table."""
+        return json.dumps(
+            {
+                "version": JSON_VERSION,
+                "old_path": parsed_diff.old_path,
+                "new_path": parsed_diff.new_path,
+                "hunks": [
+                    {"header": hunk.header, "lines": hunk.lines}
+                    for hunk in parsed_diff.hunks
+                ],
+            }
+        )
+
+    @staticmethod
+    def from_json(content: str) -> ParsedDiff:
+        """
+        Decode a diff encoded by to_json() or by the Lua side.
+
+        Raises:
+            ValueError: If the JSON does not describe a diff
+        """
+        data: Dict[str, Any] = json.loads(content)
+        try:
+            return ParsedDiff(
+                old_path=data["old_path"],
+                new_path=data["new_path"],
+                hunks=[
+                    Hunk(header=hunk["header"], lines=list(hunk.get("lines") or []))
+                    for hunk in data.get("hunks") or []
+                ],
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid diff JSON: {e}") from e
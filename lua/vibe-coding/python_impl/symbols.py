@@ -0,0 +1,184 @@
+"""
+Symbol index for locating hunks by scope - Python implementation
+Maps function and class names to the line ranges they span in a file.
+"""
+
+import ast
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Definition lines in most languages: optional modifiers, a keyword, a name
+DEFINITION_PATTERN = re.compile(
+    r"^\s*(?:(?:export|public|private|protected|static|async|local|pub|inline|"
+    r"virtual|override|final|abstract|default)\s+)*"
+    r"(def|class|function|func|fn|sub|struct|impl|interface|module|enum|trait)\b"
+    r"\s*(?:\([^)]*\)\s*)?([A-Za-z_$][\w$.:]*)"
+)
+
+# Fallback for C-like signatures such as "static int main(int argc)"
+CALL_LIKE_PATTERN = re.compile(r"([A-Za-z_$][\w$]*)\s*\(")
+
+# Lines that close a scope at the same indentation as its definition
+SCOPE_CLOSERS = ("}", "end", ")", "]")
+
+PYTHON_EXTENSIONS = (".py", ".pyi", ".pyw")
+
+
+@dataclass
+class Symbol:
+    """A named definition and the 0-based line range [start, end) it spans."""
+
+    name: str
+    kind: str
+    start: int
+    end: int
+
+
+class SymbolIndex:
+    """Function and class definitions of a file, looked up by name."""
+
+    # Indexes are cached by file path and content digest
+    MAX_CACHED_INDEXES = 64
+    _cache: Dict[Tuple[Optional[str], str], "SymbolIndex"] = {}
+
+    def __init__(self, symbols: List[Symbol]):
+        self.symbols = symbols
+        self.by_name: Dict[str, List[Symbol]] = {}
+        for symbol in symbols:
+            self.by_name.setdefault(symbol.name, []).append(symbol)
+
+    def find(self, name: str) -> List[Symbol]:
+        """Return the symbols called `name`, in file order."""
+        return self.by_name.get(name, [])
+
+    @classmethod
+    def for_lines(cls, lines: List[str], path: Optional[str] = None) -> "SymbolIndex":
+        """
+        Return the (cached) symbol index for file content.
+
+        Args:
+            lines: File content without newlines
+            path: File path, used to pick the parser
+
+        Returns:
+            SymbolIndex for the content
+        """
+        source = "\n".join(lines)
+        digest = hashlib.blake2b(
+            source.encode("utf-8", "surrogatepass"), digest_size=16
+        ).hexdigest()
+        key = (path, digest)
+
+        index = cls._cache.get(key)
+        if index is None:
+            index = cls.build(lines, path, source)
+            if len(cls._cache) >= cls.MAX_CACHED_INDEXES:
+                cls._cache.pop(next(iter(cls._cache)))
+            cls._cache[key] = index
+        return index
+
+    @classmethod
+    def build(
+        cls, lines: List[str], path: Optional[str] = None, source: Optional[str] = None
+    ) -> "SymbolIndex":
+        """
+        Build a symbol index without consulting the cache.
+
+        Python files are parsed with `ast`; other files, and Python files that
+        do not parse, fall back to indentation heuristics.
+
+        Args:
+            lines: File content without newlines
+            path: File path, used to pick the parser
+            source: The lines joined with newlines, if already available
+
+        Returns:
+            SymbolIndex for the content
+        """
+        symbols = None
+        if path is None or path.endswith(PYTHON_EXTENSIONS):
+            symbols = cls._python_symbols(
+                source if source is not None else "\n".join(lines)
+            )
+        if symbols is None:
+            symbols = cls._indentation_symbols(lines)
+        return cls(symbols)
+
+    @staticmethod
+    def _python_symbols(source: str) -> Optional[List[Symbol]]:
+        """Collect Python definitions with `ast`, or None if it does not parse."""
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            return None
+
+        symbols = []
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "def"
+            elif isinstance(node, ast.ClassDef):
+                kind = "class"
+            else:
+                continue
+            symbols.append(
+                Symbol(node.name, kind, node.lineno - 1, node.end_lineno or node.lineno)
+            )
+        symbols.sort(key=lambda symbol: symbol.start)
+        return symbols
+
+    @staticmethod
+    def _indentation_symbols(lines: List[str]) -> List[Symbol]:
+        """
+        Collect definitions using the indentation of the following lines.
+
+        A scope ends before the next non-blank line indented no deeper than its
+        definition; a closing line such as "}" or "end" at that indentation is
+        included in the scope.
+        """
+        symbols = []
+        for i, line in enumerate(lines):
+            match = DEFINITION_PATTERN.match(line)
+            if not match:
+                continue
+            kind, name = match.groups()
+            indent = len(line) - len(line.lstrip())
+
+            end = len(lines)
+            for j in range(i + 1, len(lines)):
+                stripped = lines[j].strip()
+                if not stripped:
+                    continue
+                if len(lines[j]) - len(lines[j].lstrip()) <= indent:
+                    end = j + 1 if stripped.startswith(SCOPE_CLOSERS) else j
+                    break
+
+            symbols.append(Symbol(SymbolIndex.short_name(name), kind, i, end))
+        return symbols
+
+    @staticmethod
+    def short_name(name: str) -> str:
+        """Drop module or receiver qualifiers such as "M." or "Class::"."""
+        return re.split(r"[.:]+", name)[-1] or name
+
+    @staticmethod
+    def label_name(label: str, definitions_only: bool = False) -> Optional[str]:
+        """
+        Extract the symbol name from a hunk section label.
+
+        Args:
+            label: Text after the closing "@@", such as "def get_clusters(x):"
+            definitions_only: Only accept labels starting with a definition
+                keyword, without the C-like "name(" fallback
+
+        Returns:
+            The symbol name or None
+        """
+        match = DEFINITION_PATTERN.match(label)
+        if match:
+            return SymbolIndex.short_name(match.group(2))
+        if definitions_only:
+            return None
+        match = CALL_LIKE_PATTERN.search(label)
+        return match.group(1) if match else None
@@ -0,0 +1,96 @@
+"""
+Test encoding detection and the bytes-level fast path.
+"""
+
+import codecs
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from bytes_mode import BytesPatcher, RawLines
+from patcher import FileLines, Hunk, Patcher, detect_encoding
+
+
+def _apply_to_bytes(content, diff_body):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "file.txt")
+        with open(path, "wb") as f:
+            f.write(content)
+        parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+        assert error is None, error
+        success, message = Patcher.apply_diff(parsed_diff)
+        assert success, message
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def test_detect_encoding():
+    """Byte order marks and BOM-less UTF-16 are recognized."""
+    assert detect_encoding(codecs.BOM_UTF8 + b"x") == ("utf-8", codecs.BOM_UTF8)
+    assert detect_encoding(codecs.BOM_UTF32_LE + b"x\0\0\0")[0] == "utf-32-le"
+    assert detect_encoding(codecs.BOM_UTF16_BE + b"\0x")[0] == "utf-16-be"
+    assert detect_encoding("abc\n".encode("utf-16-le")) == ("utf-16-le", b"")
+    assert detect_encoding("abc\n".encode("utf-16-be")) == ("utf-16-be", b"")
+    assert detect_encoding(b"plain text\n") == ("utf-8", b"")
+
+
+def test_file_lines_fall_back_to_latin1():
+    """Content that is not valid UTF-8 is read as Latin-1 and round-trips."""
+    data = "caf\xe9\nna\xefve\n".encode("latin-1")
+    file_lines = FileLines.from_bytes(data)
+
+    assert file_lines.encoding == "latin-1"
+    assert file_lines.lines == ["caf\xe9", "na\xefve"]
+    assert file_lines.to_bytes() == data
+
+
+def test_apply_diff_keeps_latin1_encoding():
+    """Both ASCII and non-ASCII hunks apply to a Latin-1 file."""
+    original = "a = 1\nname = 'caf\xe9'\nb = 2\n".encode("latin-1")
+
+    ascii_result = _apply_to_bytes(original, "@@ -3,1 +3,1 @@\n-b = 2\n+b = 20")
+    assert ascii_result == "a = 1\nname = 'caf\xe9'\nb = 20\n".encode("latin-1")
+
+    text_result = _apply_to_bytes(
+        original, "@@ -2,1 +2,1 @@\n-name = 'caf\xe9'\n+name = 'na\xefve'"
+    )
+    assert text_result == "a = 1\nname = 'na\xefve'\nb = 2\n".encode("latin-1")
+
+
+def test_apply_diff_keeps_bom_and_utf16():
+    """Byte order marks and UTF-16 content are written back as they were read."""
+    utf8_bom = codecs.BOM_UTF8 + b"x = 1\r\ny = 2\r\n"
+    assert (
+        _apply_to_bytes(utf8_bom, "@@ -1,2 +1,2 @@\n-x = 1\n+x = 3\n y = 2")
+        == codecs.BOM_UTF8 + b"x = 3\r\ny = 2\r\n"
+    )
+
+    utf16 = codecs.BOM_UTF16_LE + "x = 1\ny = 2\n".encode("utf-16-le")
+    assert (
+        _apply_to_bytes(utf16, "@@ -1,2 +1,2 @@\n-x = 1\n+x = 3\n y = 2")
+        == codecs.BOM_UTF16_LE + "x = 3\ny = 2\n".encode("utf-16-le")
+    )
+
+
+def test_bytes_patcher_matches_text_engine():
+    """The fast path gives the text engine's result or declines the hunk."""
+    content = "def f():\n    return 1\n\ndef g():\n    return 1\n"
+    exact = Hunk("@@ -4,2 +4,2 @@", ["-def g():", "+def h():", "     return 1"])
+    labelled = Hunk("@@ -4,2 +4,2 @@ def g():", ["     return 1"])
+    fuzzy = Hunk("@@ -1,1 +1,1 @@", ["-  def g():", "+def h():"])
+
+    raw_lines = RawLines.from_bytes(content.encode())
+    result = BytesPatcher.apply_hunk_in_place(raw_lines, exact)
+    file_lines = FileLines.from_text(content)
+    expected = Patcher.apply_hunk_in_place(file_lines, exact)
+    assert result == expected
+    assert raw_lines.to_bytes() == file_lines.to_bytes()
+
+    assert BytesPatcher.apply_hunk_in_place(raw_lines, labelled) is None
+    assert BytesPatcher.apply_hunk_in_place(raw_lines, fuzzy) is None
+    assert RawLines.from_bytes("x\n".encode("utf-16")) is None
@@ -0,0 +1,59 @@
+"""
+Test canonical diff normalization and hashing.
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from canonical import DiffCanonicalizer
+from patcher import Patcher
+
+
+def _parse(diff):
+    parsed_diff, error = Patcher.parse_diff(diff)
+    assert error is None, error
+    return parsed_diff
+
+
+def test_retried_diffs_share_a_digest():
+    """Line numbers, headings, timestamps and whitespace noise are ignored."""
+    first = _parse(
+        "--- a/src/app.py\n+++ b/src/app.py\n"
+        "@@ -10,4 +10,4 @@ def run():\n"
+        "     value = 1\n-    return value\n+    return value + 1\n \n"
+    )
+    retry = _parse(
+        "--- src/app.py\t2024-05-01 10:00:00\n+++ ./src/app.py \n"
+        "@@ -12,3 +12,3 @@\n"
+        "     value = 1  \n-    return value\t\n+    return value + 1\n"
+    )
+
+    assert DiffCanonicalizer.canonical_text(first) == (
+        "--- src/app.py\n+++ src/app.py\n@@ @@\n"
+        "     value = 1\n-    return value\n+    return value + 1\n"
+    )
+    assert DiffCanonicalizer.digest(first) == DiffCanonicalizer.digest(retry)
+    assert len(DiffCanonicalizer.digest(first)) == 32
+
+
+def test_different_edits_differ():
+    """Changed content, indentation, paths or hunk order change the digest."""
+    base = "--- a/f.py\n+++ b/f.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+    digest = DiffCanonicalizer.digest(_parse(base))
+    variants = [
+        base.replace("x = 2", "x = 3"),
+        base.replace("+x = 2", "+  x = 2"),
+        base.replace("f.py", "g.py"),
+    ]
+    for variant in variants:
+        assert DiffCanonicalizer.digest(_parse(variant)) != digest
+
+    two = "--- a/f.py\n+++ b/f.py\n@@ -1 +1 @@\n-a\n+b\n@@ -5 +5 @@\n-c\n+d\n"
+    swapped = "--- a/f.py\n+++ b/f.py\n@@ -5 +5 @@\n-c\n+d\n@@ -1 +1 @@\n-a\n+b\n"
+    assert DiffCanonicalizer.digest(_parse(two)) != DiffCanonicalizer.digest(
+        _parse(swapped)
+    )
@@ -0,0 +1,259 @@
+"""
+Test the batch command-line entry point.
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from cli import ApplyOptions, BatchApplier, DiffJob, main
+from tiers import TierStats
+
+
+def _write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _diff(path, old, new):
+    return f"--- {path}\n+++ {path}\n@@ -1,1 +1,1 @@\n-{old}\n+{new}"
+
+
+def _run(jobs, workers=1, options=None, **kwargs):
+    out = io.StringIO()
+    ok = BatchApplier.run(
+        jobs, out, options or ApplyOptions(), workers=workers, **kwargs
+    )
+    return ok, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_apply_directory_of_diffs():
+    """Diff files found in a directory are applied in name order."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        _write(target, "one\n")
+        os.mkdir(os.path.join(tmp, "diffs"))
+        _write(os.path.join(tmp, "diffs", "1.diff"), _diff(target, "one", "two"))
+        _write(os.path.join(tmp, "diffs", "2.patch"), _diff(target, "two", "three"))
+        _write(os.path.join(tmp, "diffs", "notes.txt"), "ignored")
+
+        ok, records = _run(BatchApplier.read_files([os.path.join(tmp, "diffs")]))
+
+        assert ok
+        assert [os.path.basename(r["id"]) for r in records] == ["1.diff", "2.patch"]
+        assert records[0]["hunks"][0]["line"] == 1
+        with open(target) as f:
+            assert f.read() == "three\n"
+
+        ok, records = _run(BatchApplier.read_files([os.path.join(tmp, "*.nothing")]))
+        assert not ok and "No diff files match" in records[0]["message"]
+
+
+def test_jsonl_stream_reports_every_diff_in_order():
+    """Bad records get error results and results keep the input order."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"{i}.txt") for i in range(4)]
+        for path in paths:
+            _write(path, "old\n")
+        lines = [
+            json.dumps({"id": f"d{i}", "diff": _diff(path, "old", "new")})
+            for i, path in enumerate(paths)
+        ]
+        lines.insert(2, "not json")
+        lines.append(json.dumps({"id": "bad", "diff": _diff(paths[0], "missing", "x")}))
+        stream = "\n".join(lines) + "\n"
+
+        for workers in (1, 2):
+            for path in paths:
+                _write(path, "old\n")
+            ok, records = _run(BatchApplier.read_jsonl(io.StringIO(stream)), workers)
+
+            assert not ok
+            ids = [record["id"] for record in records]
+            assert ids == ["d0", "d1", "stdin:3", "d2", "d3", "bad"]
+            successes = [record["success"] for record in records]
+            assert successes == [True, True, False, True, True, False]
+            for path in paths:
+                with open(path) as f:
+                    assert f.read() == "new\n"
+
+
+def test_gap_in_job_indexes_is_an_error():
+    """Results that cannot be written in order raise instead of being lost."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.txt")
+        _write(path, "old\n")
+        jobs = [
+            DiffJob(0, "d0", _diff(path, "old", "new")),
+            DiffJob(2, "d2", None, "Not a diff"),
+        ]
+
+        try:
+            _run(iter(jobs), workers=2)
+        except RuntimeError as e:
+            assert "diff 1 is missing" in str(e)
+        else:
+            raise AssertionError("Missing result was not reported")
+
+
+def test_python_m_patcher_apply():
+    """The module entry point reads JSONL from stdin and sets the exit status."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        _write(target, "one\n")
+        stdin = json.dumps({"diff": _diff(target, "one", "two")}) + "\n"
+
+        completed = subprocess.run(
+            [sys.executable, "-m", "patcher", "apply"],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            cwd=parent_dir,
+        )
+
+        assert completed.returncode == 0, completed.stderr
+        record = json.loads(completed.stdout)
+        assert record["id"] == "stdin:1" and record["success"]
+        with open(target) as f:
+            assert f.read() == "two\n"
+
+
+def test_apply_transcript_blocks():
+    """Each fenced diff block of a transcript is applied in order."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        _write(target, "one\n")
+        log = os.path.join(tmp, "session.log")
+        _write(
+            log,
+            "Step one:\n```diff\n" + _diff(target, "one", "two") + "\n```\n"
+            "Then:\n```diff\n" + _diff(target, "two", "three") + "\n```\n"
+            "```diff\n" + _diff(target, "three", "four"),
+        )
+
+        ok, records = _run(BatchApplier.read_transcripts([log]))
+
+        assert not ok
+        assert [record["id"] for record in records] == [
+            f"{log}:2",
+            f"{log}:10",
+            f"{log}:17",
+        ]
+        assert [record["success"] for record in records] == [True, True, False]
+        assert records[2]["message"] == "Diff block has no closing fence"
+        with open(target) as f:
+            assert f.read() == "three\n"
+
+
+def test_skip_duplicate_diffs():
+    """Retries of an applied diff are skipped and reported with its outcome."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        other = os.path.join(tmp, "b.txt")
+        diff = _diff(target, "one", "two")
+        retry = diff.replace("@@ -1,1 +1,1 @@", "@@ -3 +3 @@") + "  \n"
+        failing = _diff(other, "missing", "x")
+        stream = "\n".join(
+            json.dumps({"id": job_id, "diff": content})
+            for job_id, content in [
+                ("first", diff),
+                ("bad", failing),
+                ("retry", retry),
+                ("bad-again", failing),
+            ]
+        )
+
+        for workers in (1, 2):
+            _write(target, "one\n")
+            _write(other, "zero\n")
+            ok, records = _run(
+                BatchApplier.read_jsonl(io.StringIO(stream)),
+                workers,
+                skip_duplicates=True,
+            )
+
+            assert not ok
+            assert [r.get("duplicate_of") for r in records] == [
+                None,
+                None,
+                "first",
+                "bad",
+            ]
+            assert [r["success"] for r in records] == [True, False, True, False]
+            with open(target) as f:
+                assert f.read() == "two\n"
+
+
+def test_timeout_reports_exhausted_hunks():
+    """A diff out of search time fails with the tier named per hunk."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        _write(target, "one\n")
+        jobs = BatchApplier.read_jsonl(
+            io.StringIO(json.dumps({"id": "a", "diff": _diff(target, "one", "two")}))
+        )
+
+        ok, records = _run(jobs, options=ApplyOptions(timeout=0.0))
+
+        assert not ok
+        assert records[0]["hunks"][0]["budget_exhausted"] == "search"
+        assert "time limit" in records[0]["hunks"][0]["message"]
+        with open(target) as f:
+            assert f.read() == "one\n"
+
+
+def test_tier_stats_file_is_updated():
+    """--tier-stats learns from every applied diff and saves the counts."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.txt")
+        _write(target, "one\ntwo\n")
+        diff_path = os.path.join(tmp, "a.diff")
+        # Stale header and indented context, so the search has to run
+        _write(
+            diff_path,
+            f"--- {target}\n+++ {target}\n@@ -5,2 +5,2 @@\n   one\n-  two\n+  TWO",
+        )
+        stats_path = os.path.join(tmp, "tiers.json")
+
+        status = main(
+            ["apply", diff_path, "--tier-stats", stats_path, "--source", "model"]
+        )
+
+        assert status == 0
+        counters = TierStats.load(stats_path).counters("model")
+        assert counters["exact"].attempts == 1
+        assert counters["indent_shift"].hits == 1
+
+
+def test_tier_stats_collect_worker_counts():
+    """Counts recorded in worker processes are merged into the saved file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        diff_paths = []
+        for name in ("a", "b"):
+            target = os.path.join(tmp, f"{name}.txt")
+            diff_paths.append(os.path.join(tmp, f"{name}.diff"))
+            _write(
+                diff_paths[-1],
+                f"--- {target}\n+++ {target}\n@@ -5,2 +5,2 @@\n   one\n-  two\n+  TWO",
+            )
+        stats_path = os.path.join(tmp, "tiers.json")
+
+        for run in (1, 2):
+            for name in ("a", "b"):
+                _write(os.path.join(tmp, f"{name}.txt"), "one\ntwo\n")
+            status = main(
+                ["apply", *diff_paths, "--jobs", "2", "--tier-stats", stats_path]
+            )
+
+            assert status == 0
+            counters = TierStats.load(stats_path).counters("default")
+            assert counters["exact"].attempts == 2 * run
+            assert counters["indent_shift"].hits == 2 * run
@@ -0,0 +1,127 @@
+"""
+Test the undo journal for applied diffs.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from journal import Journal, compute_line_edits, revert_line_edits
+from patcher import Patcher
+
+
+def _apply(journal, path, diff_body):
+    parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+    assert error is None, error
+    return Patcher.apply_diff(parsed_diff, journal=journal)
+
+
+def test_compute_and_revert_line_edits():
+    """Edits only cover the changed lines and revert exactly."""
+    before = [f"line {i}\n" for i in range(1000)]
+    after = before[:]
+    after[10] = "changed\n"
+    after.insert(500, "inserted\n")
+    del after[900]
+
+    edits = compute_line_edits(before, after)
+
+    assert len(edits) == 3
+    assert sum(len(e.old_lines) + len(e.new_lines) for e in edits) == 4
+    assert revert_line_edits(after, edits) == before
+
+
+def test_record_and_undo_last():
+    """Applies are journaled and can be undone newest first."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.py")
+        with open(target, "w") as f:
+            f.write("x = 1\ny = 2\nz = 3\n")
+        journal = Journal(os.path.join(tmp, "journal.jsonl"))
+
+        assert _apply(journal, target, "@@ -1,2 +1,2 @@\n-x = 1\n+x = 10\n y = 2")[0]
+        assert _apply(journal, target, "@@ -2,2 +2,2 @@\n y = 2\n-z = 3\n+z = 30")[0]
+        assert len(journal.entries()) == 2
+
+        # Entries persist and are reloaded from disk
+        reloaded = Journal(journal.path)
+        assert [e.entry_id for e in reloaded.undoable()] == [1, 2]
+
+        success, message = reloaded.undo_last(2)
+        assert success, message
+        with open(target) as f:
+            assert f.read() == "x = 1\ny = 2\nz = 3\n"
+        assert reloaded.undoable() == []
+
+
+def test_undo_requires_unchanged_file():
+    """Undoing an older entry fails while a later change is still applied."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "a.py")
+        with open(target, "w") as f:
+            f.write("a\nb\n")
+        journal = Journal(os.path.join(tmp, "journal.jsonl"))
+
+        assert _apply(journal, target, "@@ -1,1 +1,1 @@\n-a\n+A\n b")[0]
+        assert _apply(journal, target, "@@ -2,1 +2,1 @@\n A\n-b\n+B")[0]
+
+        success, message = journal.undo(1)
+        assert not success
+        assert "changed since" in message
+
+        assert journal.undo(2)[0]
+        assert journal.undo(1)[0]
+        assert not journal.undo(1)[0]
+        with open(target) as f:
+            assert f.read() == "a\nb\n"
+
+
+def test_undo_new_file_removes_it():
+    """Undoing a file creation deletes the file again."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "new.txt")
+        journal = Journal(os.path.join(tmp, "journal.jsonl"))
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- /dev/null\n+++ {target}\n@@ -0,0 +1,1 @@\n+hello"
+        )
+
+        assert Patcher.apply_diff(parsed_diff, journal=journal)[0]
+        assert journal.entries()[0].created
+
+        assert journal.undo_last()[0]
+        assert not os.path.exists(target)
+
+
+def test_hashes_are_taken_over_file_bytes():
+    """Latin-1 files journal the same hashes in memory and large-file mode."""
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = Journal(os.path.join(tmp, "journal.jsonl"))
+        path = os.path.join(tmp, "f.txt")
+        original = "caf\xe9 = 1\r\nx = 2\r\n".encode("latin-1")
+        with open(path, "wb") as f:
+            f.write(original)
+        diff_body = "@@ -1,2 +1,2 @@\n caf\xe9 = 1\n-x = 2\n+x = 3"
+
+        for large_file in (False, True):
+            parsed_diff, _ = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+            success, message = Patcher.apply_diff(
+                parsed_diff, journal=journal, large_file=large_file
+            )
+            assert success, message
+
+            with open(path, "rb") as f:
+                written = f.read()
+            assert written == "caf\xe9 = 1\r\nx = 3\r\n".encode("latin-1")
+            entry = journal.entries()[-1]
+            assert entry.before_hash == hashlib.sha256(original).hexdigest()
+            assert entry.after_hash == hashlib.sha256(written).hexdigest()
+
+            assert journal.undo_last()[0]
+            with open(path, "rb") as f:
+                assert f.read() == original
@@ -0,0 +1,219 @@
+"""
+Test the memory-mapped large-file mode.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from journal import Journal
+from large_file import LargeFilePatcher, MappedFile
+from patcher import Patcher
+
+
+def _write(directory, content, name="big.txt"):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def _apply(path, diff_body, **kwargs):
+    parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+    assert error is None, error
+    return Patcher.apply_diff(parsed_diff, large_file=True, **kwargs)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_mapped_file_offsets_are_lazy():
+    """Only the lines needed for a lookup are indexed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"".join(b"line %d\n" % i for i in range(10000)))
+
+        with MappedFile(path) as mapped:
+            mapped.SCAN_BLOCK_SIZE = 64
+            assert mapped.line(3) == "line 3"
+            assert len(mapped.offsets) < 20
+            assert mapped.line_count() == 10000
+            assert mapped.line_of(mapped.line_start(9999) + 2) == 9999
+
+
+def test_large_file_mode_applies_hunks_in_order():
+    """Several hunks are located against the original and streamed out."""
+    with tempfile.TemporaryDirectory() as tmp:
+        lines = [b"row %d\n" % i for i in range(1000)]
+        path = _write(tmp, b"".join(lines))
+
+        success, message = _apply(
+            path,
+            "@@ -500,2 +500,2 @@\n row 499\n-row 500\n+ROW 500\n"
+            "@@ -10,2 +10,3 @@\n row 9\n+inserted\n row 10",
+        )
+
+        assert success, message
+        expected = lines[:10] + [b"inserted\n"] + lines[10:500] + [b"ROW 500\n"]
+        assert _read(path) == b"".join(expected + lines[501:])
+
+
+def test_large_file_mode_preserves_crlf_and_missing_final_newline():
+    """Replacement lines use the file's line endings."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"a\r\nb\r\nc")
+
+        success, message = _apply(path, "@@ -2,2 +2,2 @@\n b\n-c\n+C")
+
+        assert success, message
+        assert _read(path) == b"a\r\nb\r\nC"
+
+
+def test_large_file_mode_whitespace_insensitive_match():
+    """Indentation differences are tolerated and the file's indent is kept."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"def f():\n        x = 1\n        return x\n")
+
+        success, message = _apply(path, "@@ -2,2 +2,2 @@\n x = 1\n-return x\n+return -x")
+
+        assert success, message
+        assert _read(path) == b"def f():\n        x = 1\n        return -x\n"
+
+
+def test_large_file_mode_rejects_overlapping_hunks():
+    """Hunks that resolve to overlapping ranges leave the file untouched."""
+    with tempfile.TemporaryDirectory() as tmp:
+        original = b"a\nb\nc\nd\n"
+        path = _write(tmp, original)
+
+        success, message = _apply(
+            path, "@@ -1,2 +1,2 @@\n a\n-b\n+B\n@@ -2,2 +2,2 @@\n b\n-c\n+C"
+        )
+
+        assert not success
+        assert "overlaps hunk 1" in message
+        assert _read(path) == original
+
+
+def test_large_file_mode_applies_hunks_sharing_context():
+    """Hunks that only share unchanged context lines are both applied."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"a\nb\nc\nd\n")
+
+        success, message = _apply(
+            path, "@@ -1,2 +1,2 @@\n-a\n+A\n b\n@@ -2,2 +2,2 @@\n b\n-c\n+C"
+        )
+
+        assert success, message
+        assert _read(path) == b"A\nb\nC\nd\n"
+
+
+def test_large_file_mode_is_journaled():
+    """The journal records edits without reading the file into memory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        original = b"x\ny\nz"
+        path = _write(tmp, original)
+        journal = Journal(os.path.join(tmp, "journal.jsonl"))
+
+        assert _apply(path, "@@ -3,0 +4,1 @@\n+w", journal=journal)[0]
+        assert _read(path) == b"x\ny\nz\nw\n"
+
+        assert journal.undo_last()[0]
+        assert _read(path) == original
+
+
+def test_large_file_mode_reads_latin1_like_memory_mode():
+    """Content that is not UTF-8 is read as Latin-1 and written back as is."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, "caf\xe9 = 1\nx = 2\n".encode("latin-1"))
+
+        success, message = _apply(
+            path, "@@ -1,2 +1,2 @@\n caf\xe9 = 1\n-x = 2\n+x = 3"
+        )
+
+        assert success, message
+        assert _read(path) == "caf\xe9 = 1\nx = 3\n".encode("latin-1")
+
+
+def test_large_file_mode_falls_back_to_memory_tiers():
+    """Hunks the mapped search cannot find are applied in memory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"alpha = 1\nbeta = 2\ngamma = 3\n")
+
+        # A context line has drifted; only the similarity tier finds it
+        success, message = _apply(
+            path, "@@ -1,3 +1,3 @@\n alpha = 1\n-beta = 2\n+beta = 5\n gamma = 33"
+        )
+
+        assert success, message
+        assert _read(path) == b"alpha = 1\nbeta = 5\ngamma = 3\n"
+
+
+def test_large_file_mode_fallback_keeps_jobs():
+    """The in-memory fallback runs with the caller's worker count."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"alpha = 1\nbeta = 2\ngamma = 3\n")
+
+        calls = []
+        original_details = Patcher.apply_diff_with_details
+        Patcher.apply_diff_with_details = staticmethod(
+            lambda *args, **kwargs: calls.append(kwargs.get("jobs"))
+            or original_details(*args, **kwargs)
+        )
+        try:
+            success, message = _apply(
+                path,
+                "@@ -1,3 +1,3 @@\n alpha = 1\n-beta = 2\n+beta = 5\n gamma = 33",
+                jobs=3,
+            )
+        finally:
+            Patcher.apply_diff_with_details = staticmethod(original_details)
+
+        assert success, message
+        assert calls == [3]
+        assert _read(path) == b"alpha = 1\nbeta = 5\ngamma = 3\n"
+
+
+def test_large_file_mode_keeps_mixed_line_endings():
+    """Only files ending every line with CRLF are treated as CRLF files."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"a\r\nb\nc\n")
+
+        with MappedFile(path) as mapped:
+            assert mapped.newline == b"\n"
+            assert mapped.line(0) == "a\r"
+
+        assert _apply(path, "@@ -2,2 +2,2 @@\n-b\n+B\n c")[0]
+        assert _read(path) == b"a\r\nB\nc\n"
+
+
+def test_threshold_selects_large_file_mode():
+    """Files above LARGE_FILE_THRESHOLD use large-file mode automatically."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(tmp, b"a\nb\n")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {path}\n+++ {path}\n@@ -1,1 +1,1 @@\n-a\n+A\n b"
+        )
+
+        threshold = Patcher.LARGE_FILE_THRESHOLD
+        Patcher.LARGE_FILE_THRESHOLD = 1
+        calls = []
+        original_apply = LargeFilePatcher.apply_diff
+        LargeFilePatcher.apply_diff = staticmethod(
+            lambda *args, **kwargs: calls.append(args)
+            or original_apply(*args, **kwargs)
+        )
+        try:
+            assert Patcher.apply_diff(parsed_diff)[0]
+        finally:
+            Patcher.LARGE_FILE_THRESHOLD = threshold
+            LargeFilePatcher.apply_diff = staticmethod(original_apply)
+
+        assert len(calls) == 1
+        assert _read(path) == b"A\nb\n"
@@ -0,0 +1,129 @@
+"""
+Test the three-way merge fallback for hunks with drifted context.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from merge3 import CONFLICT_END, CONFLICT_START, Merge3
+from patcher import Hunk, Patcher
+
+
+def _apply(path, content, diff_body, **kwargs):
+    with open(path, "w") as f:
+        f.write(content)
+    parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+    assert error is None, error
+    return Patcher.apply_diff(parsed_diff, **kwargs)
+
+
+def test_merge_lines_keeps_both_sides():
+    """Changes to different lines are combined without conflicts."""
+    base = ["a", "b", "c", "d", "e"]
+    current = ["a", "B", "c", "d", "e", "f"]
+    result = ["a", "b", "c", "D", "e"]
+
+    assert Merge3.merge_lines(base, current, result) == (
+        ["a", "B", "c", "D", "e", "f"],
+        0,
+    )
+    assert Merge3.merge_lines(base, result, result) == (result, 0)
+
+
+def test_merge_lines_marks_real_conflicts():
+    """Only the lines changed on both sides are wrapped in markers."""
+    merged, conflicts = Merge3.merge_lines(
+        ["a", "b", "c"], ["a", "mine", "c"], ["a", "theirs", "c"]
+    )
+
+    assert conflicts == 1
+    assert merged == [
+        "a",
+        CONFLICT_START,
+        "mine",
+        "||||||| base",
+        "b",
+        "=======",
+        "theirs",
+        CONFLICT_END,
+        "c",
+    ]
+
+
+def test_merge_hunk_with_drifted_context():
+    """A hunk whose context was edited since is merged at the right place."""
+    lines = [f"filler {i}" for i in range(100)]
+    lines[50:54] = ["def f(x):", "    # validated", "    y = x * 2", "    return y"]
+    hunk = Hunk(
+        "@@ -10,3 +10,3 @@",
+        [" def f(x):", "     y = x * 2", "-    return y", "+    return y + 1"],
+    )
+
+    result, edit = Merge3.merge_hunk(lines, hunk)
+
+    assert result.success and result.strategy == "merge3"
+    start, end, merged = edit
+    assert start == 50
+    assert end == 54
+    assert merged == [
+        "def f(x):",
+        "    # validated",
+        "    y = x * 2",
+        "    return y + 1",
+    ]
+    assert Merge3.merge_hunk(["unrelated"] * 10, hunk)[1] is None
+
+
+def test_apply_diff_merge_fallback():
+    """The merge fallback is opt-in and applies where strict matching fails."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.py")
+        content = "import os\nimport sys\n\nVALUE = 1\nOTHER = 2\nLAST = 3\n"
+        diff_body = (
+            "@@ -1,5 +1,5 @@\n import os\n-import re\n+import json\n \n"
+            " VALUE = 1\n OTHER = 2"
+        )
+
+        success, _ = _apply(path, content, diff_body)
+        assert not success
+
+        success, message = _apply(path, content, diff_body, merge=True)
+        assert not success
+        assert "with 1 conflict to resolve" in message
+        with open(path) as f:
+            merged = f.read()
+        assert merged.startswith("import os\n" + CONFLICT_START + "\nimport sys\n")
+        assert merged.endswith(
+            "import json\n" + CONFLICT_END + "\n\nVALUE = 1\nOTHER = 2\nLAST = 3\n"
+        )
+
+
+def test_conflicts_are_reported_separately():
+    """Hunks merged with conflict markers make the diff unsuccessful."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.py")
+        content = "a = 1\nb = 2\nc = 3\nd = 4\ne = 5\n"
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {path}\n+++ {path}\n"
+            "@@ -1,3 +1,3 @@\n a = 1\n-b = 0\n+b = 9\n c = 3\n"
+            "@@ -4,2 +4,2 @@\n d = 4\n-e = 5\n+e = 6"
+        )
+        with open(path, "w") as f:
+            f.write(content)
+
+        result = Patcher.apply_diff_with_details(parsed_diff, merge=True)
+
+        assert not result.success
+        assert result.conflicts == 1
+        assert [hunk.conflicts for hunk in result.hunk_results] == [1, 0]
+        assert result.message.endswith("Conflicted hunks: #1")
+        assert "Successfully" not in result.message
+        with open(path) as f:
+            written = f.read()
+        assert CONFLICT_START in written and written.endswith("e = 6\n")
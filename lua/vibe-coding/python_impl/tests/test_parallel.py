@@ -0,0 +1,102 @@
+"""
+Test locating hunks across a process pool.
+"""
+
+import difflib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from parallel import PARALLEL_MIN_HUNKS, ParallelLocator
+from patcher import Patcher
+
+
+def _many_hunk_diff(path, before, after):
+    diff = "".join(
+        difflib.unified_diff(
+            [line + "\n" for line in before],
+            [line + "\n" for line in after],
+            path,
+            path,
+            n=1,
+        )
+    )
+    parsed_diff, error = Patcher.parse_diff(diff.rstrip("\n"))
+    assert error is None, error
+    return parsed_diff
+
+
+def _apply(path, content, diff_body, **kwargs):
+    with open(path, "w") as f:
+        f.write(content)
+    parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{diff_body}")
+    assert error is None, error
+    return Patcher.apply_diff(parsed_diff, **kwargs)
+
+
+def test_parallel_locate_matches_serial():
+    """Workers find the same edits as the in-process locator."""
+    before = [f"line {i}" for i in range(2000)]
+    after = before[:]
+    for i in range(0, 2000, 20):
+        after[i] = f"changed {i}"
+    parsed_diff = _many_hunk_diff("f.txt", before, after)
+    assert len(parsed_diff.hunks) >= PARALLEL_MIN_HUNKS
+
+    serial = Patcher.locate_edits(before, parsed_diff.hunks, "f.txt")
+    parallel = ParallelLocator.locate_edits(before, parsed_diff.hunks, "f.txt", jobs=2)
+
+    assert parallel == serial
+    assert all(edit is not None for _, edit in parallel)
+
+
+def test_apply_diff_with_jobs():
+    """Hunks located in parallel are applied in a single pass."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.txt")
+        before = [f"line {i}" for i in range(1000)]
+        after = before[:]
+        for i in range(5, 1000, 10):
+            after[i] = f"changed {i}"
+        del after[-1]
+        with open(path, "w") as f:
+            f.write("\n".join(before) + "\n")
+
+        success, message = Patcher.apply_diff(
+            _many_hunk_diff(path, before, after), jobs=2
+        )
+
+        assert success, message
+        with open(path) as f:
+            assert f.read() == "\n".join(after) + "\n"
+
+
+def test_jobs_fall_back_to_sequential_and_report_overlaps():
+    """Dependent hunks still apply; overlapping hunks are rejected."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.txt")
+
+        # The second hunk's context only exists after the first is applied
+        success, message = _apply(
+            path,
+            "a\nb\nc\n",
+            "@@ -1,2 +1,2 @@\n-a\n+x\n b\n@@ -1,2 +1,2 @@\n x\n-b\n+y",
+            jobs=2,
+        )
+        assert success, message
+        with open(path) as f:
+            assert f.read() == "x\ny\nc\n"
+
+        success, message = _apply(
+            path,
+            "a\nb\nc\n",
+            "@@ -1,2 +1,2 @@\n a\n-b\n+B\n@@ -2,2 +2,2 @@\n b\n-c\n+C",
+            jobs=2,
+        )
+        assert not success
+        assert "overlaps hunk 1" in message
@@ -18,7 +18,7 @@ parent_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(parent_dir))
 
 from fixture_loader_v2 import FixtureLoader
-from patcher import Patcher, Hunk
+from patcher import Budget, CancellationToken, FileLines, Patcher, Hunk, LineIndex
 
 # Load all fixtures once
 _fixture_loader = FixtureLoader()
@@ -147,6 +147,506 @@ def test_apply_hunk():
     assert "print('old')" not in result
 
 
+def test_apply_hunk_ranks_repeated_context_by_header_line():
+    """Repeated context is resolved by the header line number and reported."""
+    block = ["    if x:\n", "        return None\n", "\n"]
+    original_lines = block * 4
+
+    # The counts disagree with the body, so the whole file is searched
+    test_hunk = Hunk(
+        header="@@ -7,4 +7,4 @@",
+        lines=["     if x:", "-        return None", "+        return 1"],
+    )
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk)
+
+    assert result.success
+    assert result.strategy == "exact"
+    assert result.found_at == 6
+    assert sorted(result.candidates) == [0, 3, 6, 9]
+    assert not result.ambiguous
+    assert "4 candidate locations" in result.message
+    assert result.lines[7] == "        return 1\n"
+    assert result.lines.count("        return None\n") == 3
+
+
+def test_apply_hunk_trusts_header_with_matching_counts():
+    """A header whose counts agree with the body is tried at its own line first."""
+    block = ["    if x:\n", "        return None\n", "\n"]
+    lines = ["     if x:", "-        return None", "+        return 1"]
+
+    trusted = Patcher.apply_hunk_with_result(
+        block * 4, Hunk(header="@@ -7,2 +7,2 @@", lines=lines)
+    )
+    assert (trusted.found_at, trusted.candidates) == (6, [6])
+    assert trusted.lines[7] == "        return 1\n"
+
+    # A header pointing at the wrong lines falls back to the full search
+    moved = Patcher.apply_hunk_with_result(
+        block * 4, Hunk(header="@@ -8,2 +8,2 @@", lines=lines)
+    )
+    assert moved.found_at == 6
+    assert sorted(moved.candidates) == [0, 3, 6, 9]
+
+
+def test_apply_hunk_reports_ambiguity_without_line_numbers():
+    """Without usable line numbers the first match is used and flagged."""
+    original_lines = ["}\n", "return None\n"] * 1000
+    test_hunk = Hunk(header="@@ ... @@", lines=[" }", "-return None", "+return 0"])
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk)
+
+    assert result.success
+    assert result.found_at == 0
+    assert result.ambiguous
+    assert len(result.candidates) == 1000
+    assert "ambiguous: 1000 candidate locations" in result.message
+
+
+def test_line_index_anchors_on_rarest_line():
+    """Only positions of the rarest search line are considered as starts."""
+    lines = ["", ")", "else:", "unique()", ")", "", ")", "else:"]
+    index = LineIndex(lines)
+
+    offset, positions = index.anchor([")", "else:", "unique()"])
+
+    assert offset == 2
+    assert positions == [3]
+    assert index.anchored_starts([")", "else:", "unique()"]) == [1]
+
+
+def test_fuzzy_tiers_use_anchor_on_repetitive_file():
+    """Blank-line and whitespace tiers find a block among repeated idioms."""
+    text_lines = ["    )", "", "    else:"] * 2000 + [
+        "    target()",
+        "",
+        "    )",
+    ]
+    index = LineIndex(text_lines)
+
+    assert Patcher._try_blank_line_fuzzy_matching(index, ["    target()", "    )"]) == 6000
+    assert (
+        Patcher._try_fuzzy_whitespace_matching(
+            text_lines, ["target()", "", ")"], index
+        )
+        == 6000
+    )
+
+
+def test_similarity_tier_tolerates_renamed_context():
+    """Drifted context is matched by similarity and kept as in the file."""
+    original_lines = [
+        "def load(path):\n",
+        "    handle = open(path)\n",
+        "    data = handle.read()\n",
+        "    return data\n",
+    ]
+    test_hunk = Hunk(
+        header="@@ -1,4 +1,4 @@",
+        lines=[
+            " def load(path):",
+            "     fh = open(path)",
+            "     data = fh.read()",
+            "-    return data",
+            "+    return data.strip()",
+        ],
+    )
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk)
+
+    assert result.success
+    assert result.strategy == "similarity"
+    assert result.score >= Patcher.SIMILARITY_THRESHOLD
+    assert "similarity" in result.message
+    assert result.lines == original_lines[:3] + ["    return data.strip()\n"]
+
+
+def test_similarity_tier_respects_comparison_budget():
+    """No window is scored once the comparison budget is used up."""
+    text_lines = ["x = 1", "y = 2", "z = 3"]
+    index = LineIndex(text_lines)
+
+    found_at, _ = Patcher._try_similarity_matching(
+        index, ["x = 1", "y = 20", "z = 3"], max_comparisons=2
+    )
+    assert found_at == -1
+
+    found_at, score = Patcher._try_similarity_matching(
+        index, ["x = 1", "y = 20", "z = 3"]
+    )
+    assert found_at == 0
+    assert 0.8 < score < 1.0
+
+
+def test_indent_shift_tier_reindents_added_lines():
+    """A hunk pasted at the wrong nesting level is shifted as a whole."""
+    original_lines = [
+        "class A:\n",
+        "    def run(self):\n",
+        "        if self.ready:\n",
+        "            self.go()\n",
+    ]
+    test_hunk = Hunk(
+        header="@@ -2,3 +2,4 @@",
+        lines=[
+            " def run(self):",
+            "     if self.ready:",
+            "-        self.go()",
+            "+        self.log()",
+            "+        self.go()",
+        ],
+    )
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk)
+
+    assert result.success
+    assert result.strategy == "indent_shift"
+    assert result.lines == [
+        "class A:\n",
+        "    def run(self):\n",
+        "        if self.ready:\n",
+        "            self.log()\n",
+        "            self.go()\n",
+    ]
+
+
+def test_indent_shift_tier_converts_spaces_to_tabs():
+    """Space-indented hunks against a tab-indented file keep tabs."""
+    original_lines = ["func main() {\n", "\tif ok {\n", "\t\treturn\n", "\t}\n", "}\n"]
+    test_hunk = Hunk(
+        header="@@ -2,3 +2,3 @@",
+        lines=[
+            "     if ok {",
+            "-        return",
+            "+        os.Exit(1)",
+            "     }",
+        ],
+    )
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk)
+
+    assert result.success
+    assert result.strategy == "indent_shift"
+    assert result.lines[2] == "\t\tos.Exit(1)\n"
+    assert result.lines[1] == "\tif ok {\n"
+
+
+def test_section_label_is_kept_in_header():
+    """Git-style section headings are not turned into context lines."""
+    parsed_diff, error = Patcher.parse_diff(
+        "--- a.py\n+++ a.py\n@@ -5,2 +5,2 @@ def second():\n     x = 1\n-    return x\n+    return -x"
+    )
+
+    assert error is None
+    hunk = parsed_diff.hunks[0]
+    assert hunk.header == "@@ -5,2 +5,2 @@ def second():"
+    assert hunk.lines == ["     x = 1", "-    return x", "+    return -x"]
+    assert Patcher.hunk_section_label(hunk.header) == "def second():"
+
+
+def test_joined_header_content_indented_from_following_lines():
+    """Content cut from a header takes the indentation of the lines after it."""
+    parsed_diff, error = Patcher.parse_diff(
+        "--- a.py\n+++ a.py\n@@ -1,1 +1,1 @@\n        foo()return x\n"
+        "@@ -9,3 +9,3 @@value = 1\n-        old = 2\n+            new = 2"
+    )
+
+    assert error is None
+    assert parsed_diff.hunks[0].lines == ["        foo()", " return x"]
+    assert parsed_diff.hunks[1].lines[0] == "         value = 1"
+
+
+def test_apply_hunk_searches_labelled_scope_first():
+    """Repeated bodies are disambiguated by the section heading."""
+    original_lines = [
+        "def first():\n",
+        "    x = 1\n",
+        "    return x\n",
+        "\n",
+        "def second():\n",
+        "    x = 1\n",
+        "    return x\n",
+    ]
+    test_hunk = Hunk(
+        header="@@ -1,2 +1,2 @@ def second():",
+        lines=["     x = 1", "-    return x", "+    return -x"],
+    )
+
+    result = Patcher.apply_hunk_with_result(original_lines, test_hunk, path="m.py")
+
+    assert result.success
+    assert result.scope == "def second"
+    assert result.found_at == 5
+    assert result.lines[2] == "    return x\n"
+    assert result.lines[6] == "    return -x\n"
+
+
+def test_exact_match_outside_labelled_scope_beats_fuzzy_match_inside():
+    """A wrong heading cannot pull a hunk into a merely similar function."""
+    original_lines = [
+        "def foo():\n",
+        "    total = compute(1)\n",
+        "    total += 1\n",
+        "    return total\n",
+        "\n",
+        "def bar():\n",
+        "    total = compute(2)\n",
+        "    total += 1\n",
+        "    return total\n",
+    ]
+    body = [
+        "     total = compute(2)",
+        "-    total += 1",
+        "+    total += 2",
+        "     return total",
+    ]
+
+    for header in ["@@ -7,3 +7,3 @@ def foo():", "@@ -2,3 +2,3 @@ def foo():"]:
+        result = Patcher.apply_hunk_with_result(
+            original_lines, Hunk(header=header, lines=body), path="m.py"
+        )
+
+        assert result.success, header
+        assert result.strategy == "exact"
+        assert result.found_at == 6
+        assert result.lines[2] == "    total += 1\n"
+        assert result.lines[7] == "    total += 2\n"
+
+
+def test_file_lines_round_trip():
+    """Line endings and a missing final newline survive splitting."""
+    for text in ["", "\n", "a\nb\n", "a\r\nb\r\n", "a\r\nb", "a\r\nb\nc"]:
+        file_lines = FileLines.from_text(text)
+        assert file_lines.to_text() == text
+        assert "".join(file_lines.to_lines()) == text
+    assert FileLines.from_text("a\r\nb\r\n").lines == ["a", "b"]
+
+
+def test_apply_diff_preserves_crlf_line_endings():
+    """CRLF files are matched on bare lines and written back with CRLF."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "crlf.txt")
+        with open(target, "w", newline="") as f:
+            f.write("one\r\ntwo\r\nthree")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {target}\n+++ {target}\n@@ -1,3 +1,3 @@\n one\n-two\n+TWO\n three"
+        )
+
+        success, message = Patcher.apply_diff(parsed_diff)
+
+        assert success, message
+        with open(target, newline="") as f:
+            assert f.read() == "one\r\nTWO\r\nthree"
+
+
+def test_pure_addition_terminates_unterminated_last_line():
+    """Appending to a file without a final newline starts a new line."""
+    file_lines = FileLines.from_text("last")
+    test_hunk = Hunk(header="@@ -0,0 +1,1 @@", lines=["+added"])
+
+    result = Patcher.apply_hunk_in_place(file_lines, test_hunk)
+
+    assert result.success
+    assert file_lines.to_text() == "last\nadded\n"
+
+
+def test_find_conflicts_ignores_shared_context():
+    """Only hunks changing lines the other one covers conflict."""
+    lines = ["a", "b", "c", "d", "e"]
+    shares_context = [(0, 2, ["A", "b"]), (1, 3, ["b", "C"])]
+    changes_context = [(0, 2, ["a", "B"]), (1, 3, ["b", "C"])]
+    inserts_inside = [(1, 4, ["b", "c", "D"]), (2, 2, ["new"])]
+
+    assert Patcher.find_conflicts(lines, shares_context) == []
+    assert Patcher.find_conflicts(lines, changes_context) == [(0, 1)]
+    assert Patcher.find_conflicts(lines, inserts_inside) == [(0, 1)]
+
+    many = [(i, i + 1, [f"x{i}"]) for i in range(0, 20000, 2)]
+    many.append((0, 20000, ["whole"]))
+    assert len(Patcher.find_conflicts([""] * 20000, many)) == 10000
+
+
+def test_apply_diff_reports_conflicting_hunks():
+    """Conflicts are reported before writing; shared context is fine."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        with open(target, "w") as f:
+            f.write("a\nb\nc\nd\n")
+
+        def apply(diff_body):
+            parsed_diff, _ = Patcher.parse_diff(
+                f"--- {target}\n+++ {target}\n{diff_body}"
+            )
+            return Patcher.apply_diff(parsed_diff)
+
+        success, message = apply(
+            "@@ -1,2 +1,2 @@\n-a\n+A\n b\n@@ -3,1 +3,1 @@\n-c\n+C"
+            "\n@@ -2,2 +2,2 @@\n-b\n+B\n c"
+        )
+        assert not success
+        assert message == (
+            "Failed to apply hunk 3: overlaps hunk 1; hunk 3 overlaps hunk 2"
+        )
+        with open(target) as f:
+            assert f.read() == "a\nb\nc\nd\n"
+
+        # Checked even when another hunk does not match the original
+        success, message = apply(
+            "@@ -1,2 +1,2 @@\n a\n-b\n+B\n@@ -2,2 +2,2 @@\n-b\n+X\n c"
+            "\n@@ -9,1 +9,1 @@\n-missing\n+M"
+        )
+        assert not success
+        assert message == "Failed to apply hunk 2: overlaps hunk 1"
+
+        success, message = apply(
+            "@@ -1,2 +1,2 @@\n-a\n+A\n b\n@@ -2,2 +2,2 @@\n b\n-c\n+C"
+        )
+        assert success, message
+        with open(target) as f:
+            assert f.read() == "A\nb\nC\nd\n"
+
+
+def test_blank_lines_missing_from_either_side():
+    """Blank lines only the hunk or only the file has are matched around."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        cases = [
+            # A deletion at the end of the file, with a trailing blank line
+            ("a\nb\n", "@@ -1,2 +1,1 @@\n a\n-b\n", "a\n"),
+            ("a\nb\nc\n", "@@ -1,3 +1,2 @@\n a\n-b\n \n c\n", "a\nc\n"),
+            (
+                "def f():\n    a = 1\n\n    return a\n",
+                "@@ -1,3 +1,3 @@\n def f():\n     a = 1\n-    return a\n+    return -a",
+                "def f():\n    a = 1\n\n    return -a\n",
+            ),
+        ]
+        for content, diff_body, expected in cases:
+            with open(target, "w") as f:
+                f.write(content)
+            parsed_diff, _ = Patcher.parse_diff(
+                f"--- {target}\n+++ {target}\n{diff_body}"
+            )
+
+            success, message = Patcher.apply_diff(parsed_diff)
+
+            assert success, message
+            with open(target) as f:
+                assert f.read() == expected
+
+
+def test_split_hunks_returns_leftover_diff():
+    """Failed hunks are skipped and returned as a diff that can be retried."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        with open(target, "w") as f:
+            f.write("a\nb\nc\nd\ne\n")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {target}\n+++ {target}\n"
+            "@@ -1,2 +1,2 @@\n-a\n+A\n b\n"
+            "@@ -3,1 +3,1 @@\n-missing\n+M\n"
+            "@@ -5,1 +5,1 @@\n-e\n+E"
+        )
+
+        assert not Patcher.apply_diff(parsed_diff)[0]
+        assert not Patcher.apply_diff_with_details(parsed_diff).success
+        result = Patcher.apply_diff_with_details(parsed_diff, split_hunks=True)
+
+        assert result.success
+        assert result.message.endswith("Failed hunks: #2")
+        assert [r.success for r in result.hunk_results] == [True, False, True]
+        with open(target) as f:
+            assert f.read() == "A\nb\nc\nd\nE\n"
+
+        leftover, error = Patcher.parse_diff(Patcher.format_diff(result.leftover))
+        assert error is None
+        assert leftover.hunks == [parsed_diff.hunks[1]]
+
+
+def test_leftover_headers_follow_applied_hunks():
+    """Leftover hunks are numbered for the file as written."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        with open(target, "w") as f:
+            f.write("a\nb\nc\nd\ne\n")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {target}\n+++ {target}\n"
+            "@@ -1,1 +1,3 @@\n a\n+a1\n+a2\n"
+            "@@ -4,1 +6,1 @@ def d():\n-missing\n+M"
+        )
+
+        result = Patcher.apply_diff_with_details(parsed_diff, split_hunks=True)
+
+        assert result.success
+        assert [hunk.header for hunk in result.leftover.hunks] == [
+            "@@ -6,1 +6,1 @@ def d():"
+        ]
+        assert Patcher.shift_hunk_header("@@ -4 +4 @@", 0) == "@@ -4 +4 @@"
+        assert Patcher.shift_hunk_header("@@ ... @@", 3) == "@@ ... @@"
+
+def test_split_hunks_rejects_later_conflicting_hunk():
+    """Of two conflicting hunks only the first one is applied."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        with open(target, "w") as f:
+            f.write("a\nb\nc\n")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {target}\n+++ {target}\n"
+            "@@ -1,2 +1,2 @@\n a\n-b\n+B\n@@ -2,2 +2,2 @@\n b\n-c\n+C"
+        )
+
+        success, message = Patcher.apply_diff(parsed_diff, split_hunks=True)
+
+        assert success
+        assert "Partially applied 1/2 hunks" in message
+        with open(target) as f:
+            assert f.read() == "a\nB\nc\n"
+
+
+def test_budget_stops_pathological_hunk():
+    """A hunk drifted inside repetitive content stops at its budget."""
+    original = ["x = 1\n", "y = 2\n"] * 5000
+    test_hunk = Hunk(
+        header="@@ -1,3 +1,3 @@", lines=[" x = 1", "-x = 1", "+x = 0", " y = 2"]
+    )
+
+    result = Patcher.apply_hunk_with_result(
+        original, test_hunk, budget=Budget(max_comparisons=1000)
+    )
+
+    assert not result.success
+    assert result.budget_exhausted == "exact"
+    assert "limit of 1000 line comparisons" in result.message
+
+    unlimited = Patcher.apply_hunk_with_result(original, test_hunk)
+    assert unlimited.success
+    assert unlimited.strategy == "similarity"
+
+
+def test_cancelled_budget_skips_remaining_hunks():
+    """Cancelling the token fails every hunk of the diff without writing."""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "f.txt")
+        with open(target, "w") as f:
+            f.write("a\nb\nc\n")
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {target}\n+++ {target}\n@@ -1,2 +1,2 @@\n-a\n+A\n b"
+        )
+        token = CancellationToken()
+        token.cancel()
+
+        result = Patcher.apply_diff_with_details(
+            parsed_diff, merge=True, budget=Budget(token=token)
+        )
+
+        assert not result.success
+        assert result.hunk_results[0].budget_exhausted == "search"
+        assert "cancelled" in result.hunk_results[0].message
+        with open(target) as f:
+            assert f.read() == "a\nb\nc\n"
+
+        assert Patcher.apply_diff(parsed_diff, budget=Budget(max_seconds=60))[0]
+
+
 if HAS_PYTEST:
     @pytest.mark.parametrize("fixture", _all_fixtures, ids=lambda f: f['name'])
     def test_patcher_fixture_case(fixture):
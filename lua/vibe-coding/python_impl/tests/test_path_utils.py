@@ -0,0 +1,114 @@
+"""
+Test diff path resolution and the project file index.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from path_utils import FileIndex, GitIgnore, PathResolver
+from patcher import Patcher
+
+
+def _touch(root, rel_path, content=""):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_gitignore_rules():
+    """Basename, anchored, directory-only and negated patterns."""
+    gitignore = GitIgnore.parse(
+        "sub", "# comment\n*.log\n!keep.log\n/build\ncache/\ndocs/**/*.tmp\n"
+    )
+
+    assert gitignore.match("sub/a/b.log", False) is True
+    assert gitignore.match("sub/keep.log", False) is False
+    assert gitignore.match("sub/build", True) is True
+    assert gitignore.match("sub/x/build", True) is None
+    assert gitignore.match("sub/x/cache", True) is True
+    assert gitignore.match("sub/cache", False) is None
+    assert gitignore.match("sub/docs/a/b/c.tmp", False) is True
+
+
+def test_file_index_suffixes_and_gitignore():
+    """Files are found by any path suffix; ignored files are left out."""
+    with tempfile.TemporaryDirectory() as tmp:
+        _touch(tmp, ".gitignore", "build/\n*.pyc\n")
+        _touch(tmp, "src/pkg/util.py")
+        _touch(tmp, "tests/pkg/util.py")
+        _touch(tmp, "src/pkg/util.pyc")
+        _touch(tmp, "build/pkg/util.py")
+        _touch(tmp, ".git/config")
+
+        index = FileIndex(tmp)
+
+        assert index.candidates("util.py") == ["src/pkg/util.py", "tests/pkg/util.py"]
+        assert index.candidates("lib/src/pkg/util.py") == ["src/pkg/util.py"]
+        assert index.candidates("config") == []
+        assert index.candidates("util.pyc") == []
+
+
+def test_file_index_refreshes_changed_directories():
+    """Added, removed and newly ignored files are picked up by refresh."""
+    with tempfile.TemporaryDirectory() as tmp:
+        _touch(tmp, "a/one.py")
+        index = FileIndex(tmp)
+
+        _touch(tmp, "a/b/two.py")
+        os.remove(os.path.join(tmp, "a", "one.py"))
+        assert index.refresh()
+        assert index.candidates("two.py") == ["a/b/two.py"]
+        assert index.candidates("one.py") == []
+
+        _touch(tmp, ".gitignore", "b/\n")
+        assert index.refresh()
+        assert index.candidates("two.py") == []
+
+
+def test_resolver_and_apply_diff():
+    """Wrong relative paths in a diff are resolved to the project file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        _touch(tmp, "src/app/models.py", "x = 1\n")
+        _touch(tmp, "tests/app/test_models.py", "")
+        _touch(tmp, "other/models.py", "")
+        resolver = PathResolver(tmp, refresh_interval=0)
+
+        assert resolver.resolve("b/project/src/app/models.py") == "src/app/models.py"
+        assert resolver.resolve("app/models.py") == "src/app/models.py"
+        assert resolver.resolve("missing.py") is None
+
+        target = os.path.join(tmp, "src", "app", "models.py")
+        assert PathResolver().resolve(target) == target
+
+        diff = "--- app/models.py\n+++ app/models.py\n@@ -1,1 +1,1 @@\n-x = 1\n+x = 2"
+        parsed_diff, error = Patcher.parse_diff(diff)
+        assert error is None, error
+        resolved = PathResolver(tmp).resolve_diff(parsed_diff)
+        assert resolved.old_path == resolved.new_path == target
+
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            success, message = Patcher.apply_diff(parsed_diff, resolver=PathResolver())
+        finally:
+            os.chdir(cwd)
+        assert success, message
+        with open(target) as f:
+            assert f.read() == "x = 2\n"
+
+        # The root is not the working directory
+        parsed_diff, _ = Patcher.parse_diff(
+            "--- app/models.py\n+++ app/models.py\n@@ -1,1 +1,1 @@\n-x = 2\n+x = 3"
+        )
+        success, message = Patcher.apply_diff(parsed_diff, resolver=PathResolver(tmp))
+        assert success, message
+        with open(target) as f:
+            assert f.read() == "x = 3\n"
+
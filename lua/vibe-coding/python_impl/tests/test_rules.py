@@ -0,0 +1,68 @@
+"""
+Test the language-aware repair rule registry.
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from patcher import Patcher
+from rules import RULES, Rule, RuleRegistry, language_for_path
+
+
+def _parse(path, body):
+    parsed_diff, error = Patcher.parse_diff(f"--- {path}\n+++ {path}\n{body}")
+    assert error is None, error
+    return parsed_diff.hunks[0].lines
+
+
+def test_rules_are_selected_by_extension():
+    """Python joins are repaired in Python files but left alone in JSON and Lua."""
+    body = "@@ -1,2 +1,2 @@\n         foo()except ValueError:\n-x\n+y"
+
+    assert _parse("a.py", body)[:2] == ["         foo()", "     except ValueError:"]
+    assert _parse("b/data.json", body)[0] == "         foo()except ValueError:"
+    assert _parse("init.lua", body)[0] == "         foo()except ValueError:"
+    # Unknown file types keep every rule
+    assert len(_parse("notes", body)) == 4
+
+    assert language_for_path("src/App.TSX") == "javascript"
+    assert language_for_path("Makefile") is None
+    names = [rule.name for rule in RULES.rules_for("split_line", "x.js")]
+    assert names == ["bracket_keyword"]
+
+
+def test_rule_counters_and_switches():
+    """Rules count calls, hits and time, and can be switched off."""
+    registry = RuleRegistry()
+    rule = registry.register(
+        Rule("upper", "demo", lambda line: line.upper() if "x" in line else None)
+    )
+    rules = registry.rules_for("demo", "a.py")
+
+    assert registry.first_hit(rules, "abc") == (None, None)
+    assert registry.first_hit(rules, "xyz") == (rule, "XYZ")
+    assert (rule.calls, rule.hits) == (2, 1)
+    assert registry.stats()[0]["seconds"] > 0
+
+    registry.set_enabled("upper", False)
+    assert registry.rules_for("demo", "a.py") == []
+    registry.reset_stats()
+    assert (rule.calls, rule.hits, rule.seconds) == (0, 0, 0.0)
+
+
+def test_joined_statement_rule_only_for_python():
+    """The joined-statement tier is skipped for languages it does not fit."""
+    original = ["def f(items):", "    if not items:", "        return 0", "    return 1"]
+    search = ["def f(items):", "    if not items:return 0"]
+
+    found_at, info = Patcher._try_joined_statement_matching_with_info(
+        original, search, path="f.py"
+    )
+    assert found_at == 0 and info["rule"] == "joined_statement"
+    assert Patcher._try_joined_statement_matching_with_info(
+        original, search, path="f.lua"
+    ) == (-1, None)
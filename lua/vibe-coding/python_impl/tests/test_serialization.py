@@ -0,0 +1,66 @@
+"""
+Test the binary and JSON encodings of parsed diffs.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from patcher import Hunk, ParsedDiff, Patcher
+from serialization import DiffCodec
+
+
+def _sample():
+    parsed_diff, error = Patcher.parse_diff(
+        "--- a/src/café.py\n+++ b/src/café.py\n"
+        "@@ -1,3 +1,3 @@\n def f():\n-    return 'old'\n+    return 'né'\n \n"
+        "@@ -10 +10,2 @@\n-x = 1\n+x = 2\n+y = 3\n\\ No newline at end of file\n"
+    )
+    assert error is None, error
+    return parsed_diff
+
+
+def test_binary_round_trip_from_memoryview():
+    """Diffs round-trip through a memoryview, including awkward records."""
+    diffs = [
+        _sample(),
+        ParsedDiff("a.txt", "b.txt", [Hunk("@@ -1 +1 @@", ["", "~raw", "-\udcff"])]),
+        ParsedDiff("a", "b", [Hunk("@@ a\nb @@", ["+two\nlines"]), Hunk("@@ @@", [])]),
+        ParsedDiff("a", "b", []),
+    ]
+    for parsed_diff in diffs:
+        data = bytearray(DiffCodec.encode(parsed_diff))
+        assert DiffCodec.decode(memoryview(data)) == parsed_diff
+
+    assert DiffCodec.line_counts(DiffCodec.encode(_sample())) == (2, 3)
+
+
+def test_invalid_buffers_are_rejected():
+    """Truncated or foreign buffers raise ValueError."""
+    data = DiffCodec.encode(_sample())
+    for bad in (b"", b"XXXX" + data[4:], data[:-5], data[:20]):
+        try:
+            DiffCodec.decode(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"decoded invalid buffer {bad[:8]!r}")
+
+
+def test_json_matches_lua_diff_table():
+    """The JSON form has the keys of the Lua diff table and reads back."""
+    parsed_diff = _sample()
+    data = json.loads(DiffCodec.to_json(parsed_diff))
+
+    assert set(data) == {"version", "old_path", "new_path", "hunks"}
+    assert data["hunks"][1] == {
+        "header": "@@ -10 +10,2 @@",
+        "lines": parsed_diff.hunks[1].lines,
+    }
+    assert DiffCodec.from_json(DiffCodec.to_json(parsed_diff)) == parsed_diff
+    # Lua encodes empty tables as objects
+    lua = '{"old_path": "a", "new_path": "a", "hunks": [{"header": "@@", "lines": {}}]}'
+    assert DiffCodec.from_json(lua).hunks[0].lines == []
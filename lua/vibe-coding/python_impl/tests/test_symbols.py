@@ -0,0 +1,106 @@
+"""
+Test the symbol index used for scope-aware hunk location.
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from patcher import Hunk, Patcher
+from symbols import SymbolIndex
+
+
+def test_python_symbols_use_ast_ranges():
+    """Python definitions span from the def line to their last line."""
+    lines = [
+        "class Service:",
+        "    def start(self):",
+        "        return 1",
+        "",
+        "    async def stop(self):",
+        "        return 2",
+        "",
+        "def main():",
+        "    pass",
+    ]
+    index = SymbolIndex.build(lines, "service.py")
+
+    assert [(s.name, s.kind, s.start, s.end) for s in index.symbols] == [
+        ("Service", "class", 0, 6),
+        ("start", "def", 1, 3),
+        ("stop", "def", 4, 6),
+        ("main", "def", 7, 9),
+    ]
+
+
+def test_indentation_symbols_for_other_languages():
+    """Brace and end delimited scopes include their closing line."""
+    lines = [
+        "function M.setup(opts)",
+        "  local x = 1",
+        "end",
+        "",
+        "export async function load() {",
+        "  return 1;",
+        "}",
+        "func (s *Server) Start() {",
+        "}",
+    ]
+    index = SymbolIndex.build(lines, "mixed.lua")
+
+    assert [(s.name, s.start, s.end) for s in index.symbols] == [
+        ("setup", 0, 3),
+        ("load", 4, 7),
+        ("Start", 7, 9),
+    ]
+
+
+def test_invalid_python_falls_back_to_indentation():
+    """A Python file that does not parse still gets an index."""
+    lines = ["def broken(:", "    pass", "def ok():", "    pass"]
+    index = SymbolIndex.build(lines, "broken.py")
+
+    assert [s.name for s in index.symbols] == ["broken", "ok"]
+
+
+def test_for_lines_is_cached_by_content():
+    """The same content returns the cached index; new content does not."""
+    lines = ["def a():", "    pass"]
+
+    first = SymbolIndex.for_lines(lines, "a.py")
+    assert SymbolIndex.for_lines(list(lines), "a.py") is first
+    assert SymbolIndex.for_lines(lines + ["def b():", "    pass"], "a.py") is not first
+
+
+def test_labelled_hunks_share_one_parse():
+    """The symbols of a file are looked up once for all hunks of a call."""
+    lines = []
+    for i in range(5):
+        lines += [f"def f{i}():", "    x = 0", "    return x", ""]
+    body = ["     x = 0", "-    return x", "+    return 1"]
+    hunks = [Hunk(f"@@ -1,2 +1,2 @@ def f{i}():", body) for i in range(5)]
+
+    calls = []
+    for_lines = SymbolIndex.__dict__["for_lines"]
+    SymbolIndex.for_lines = classmethod(
+        lambda cls, *args: calls.append(args) or for_lines.__func__(cls, *args)
+    )
+    try:
+        located = Patcher.locate_edits(lines, hunks, "f.py")
+    finally:
+        SymbolIndex.for_lines = for_lines
+
+    assert [result.scope for result, _ in located] == [f"def f{i}" for i in range(5)]
+    assert len(calls) == 1
+
+
+def test_label_name():
+    """Section headings yield the name of the definition."""
+    assert SymbolIndex.label_name("def get_clusters(platform):") == "get_clusters"
+    assert SymbolIndex.label_name("class Foo(Base):") == "Foo"
+    assert SymbolIndex.label_name("static int main(int argc)") == "main"
+    assert SymbolIndex.label_name("static int main(int argc)", True) is None
+    assert SymbolIndex.label_name("x = 1") is None
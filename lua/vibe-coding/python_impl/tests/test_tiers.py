@@ -0,0 +1,151 @@
+"""
+Test adaptive ordering of the matching tiers.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from patcher import Hunk, Patcher
+from tiers import MIN_ATTEMPTS, REORDERABLE_TIERS, TIER_PRECEDENCE, TierStats
+
+ORIGINAL = [
+    "def first():\n",
+    "    a = 1\n",
+    "\n",
+    "    return a\n",
+    "\n",
+    "def second():\n",
+    "    b = 2\n",
+    "    return b\n",
+]
+
+
+def test_tiers_that_keep_missing_move_back():
+    """A source's failing tiers are tried after the ones that match for it."""
+    stats = TierStats()
+    assert stats.order("model") == list(REORDERABLE_TIERS)
+
+    for _ in range(MIN_ATTEMPTS):
+        stats.record("model", "blank_line_fuzzy", False, 0.01)
+        stats.record("model", "joined_statement", True, 0.01)
+
+    assert stats.order("model") == [
+        "joined_statement",
+        "blank_line_fuzzy",
+        "indent_shift",
+        "whitespace_fuzzy",
+    ]
+    assert stats.order("other") == list(REORDERABLE_TIERS)
+
+
+def test_reordering_never_changes_the_edit():
+    """Tiers that could edit a hunk differently keep their relative order."""
+    stats = TierStats()
+    for _ in range(MIN_ATTEMPTS):
+        stats.record("model", "blank_line_fuzzy", False, 0.01)
+        stats.record("model", "indent_shift", False, 0.01)
+        stats.record("model", "whitespace_fuzzy", True, 0.01)
+    policy = stats.for_source("model")
+    order = policy.order()
+    for first, second in TIER_PRECEDENCE:
+        assert order.index(first) < order.index(second)
+
+    original = ["def f():\n", "    a = 1\n", "    \n", "    return a\n"]
+    # A dedented hunk, and a blank line that lost its whitespace
+    hunks = [
+        Hunk(header="@@ -1,2 +1,2 @@", lines=[" a = 1", "-return a", "+return -a"]),
+        Hunk(
+            header="@@ -1,3 +1,3 @@",
+            lines=["     a = 1", " ", "-    return a", "+    return -a"],
+        ),
+    ]
+    for hunk in hunks:
+        result = Patcher.apply_hunk_with_result(original, hunk, tiers=policy)
+        assert result.lines == Patcher.apply_hunk_with_result(original, hunk).lines
+
+
+def test_exact_match_wins_whatever_the_order():
+    """Reordering never replaces an exact match, and attempts are counted."""
+    stats = TierStats()
+    for _ in range(MIN_ATTEMPTS):
+        stats.record("model", "blank_line_fuzzy", False, 1.0)
+    policy = stats.for_source("model")
+    assert policy.order()[0] == "joined_statement"
+
+    exact = Hunk(
+        header="@@ -1,2 +1,2 @@",
+        lines=["     b = 2", "-    return b", "+    return -b"],
+    )
+    result = Patcher.apply_hunk_with_result(ORIGINAL, exact, tiers=policy)
+    assert result.strategy == "exact"
+    assert result.lines == Patcher.apply_hunk_with_result(ORIGINAL, exact).lines
+
+    # Blank lines dropped from the context: only blank_line_fuzzy matches
+    blank_dropped = Hunk(
+        header="@@ -1,4 +1,4 @@",
+        lines=[" def first():", "     a = 1", "-    return a", "+    return -a"],
+    )
+    result = Patcher.apply_hunk_with_result(ORIGINAL, blank_dropped, tiers=policy)
+    assert result.strategy == "blank_line_fuzzy"
+
+    counters = stats.counters("model")
+    assert (counters["exact"].attempts, counters["exact"].hits) == (2, 1)
+    assert counters["blank_line_fuzzy"].hits == 1
+    assert counters["joined_statement"].attempts == 1
+    assert "whitespace_fuzzy" not in counters
+
+
+def test_exact_hits_are_counted_when_applying_a_diff():
+    """Diffs applied with statistics are located by the recording engine."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.py")
+        with open(path, "w") as f:
+            f.writelines(ORIGINAL)
+        parsed_diff, _ = Patcher.parse_diff(
+            f"--- {path}\n+++ {path}\n"
+            "@@ -1,2 +1,2 @@\n     b = 2\n-    return b\n+    return -b"
+        )
+        stats = TierStats()
+
+        result = Patcher.apply_diff_with_details(
+            parsed_diff, tiers=stats.for_source("model")
+        )
+
+        assert result.success, result.message
+        counters = stats.counters("model")
+        assert (counters["exact"].attempts, counters["exact"].hits) == (1, 1)
+
+
+def test_statistics_persist_across_runs():
+    """Saved statistics load with the same counts and order."""
+    stats = TierStats()
+    for _ in range(MIN_ATTEMPTS):
+        stats.record("model", "blank_line_fuzzy", False, 0.5)
+        stats.record("model", "whitespace_fuzzy", True, 0.1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tiers.json")
+        assert TierStats.load(path).stats() == []
+
+        stats.save(path)
+        stats.save(path)
+        assert os.listdir(tmp) == ["tiers.json"]
+        loaded = TierStats.load(path)
+
+        assert loaded.stats() == stats.stats()
+        assert loaded.order("model") == stats.order("model")
+
+        with open(path, "w") as f:
+            f.write('{"version": 1, "sources": {"model": {"exact": 3}}}')
+        try:
+            TierStats.load(path)
+        except ValueError as e:
+            assert "Invalid tier statistics" in str(e)
+        else:
+            raise AssertionError("Invalid statistics were loaded")
@@ -0,0 +1,75 @@
+"""
+Test fenced diff block extraction from transcripts.
+"""
+
+import io
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+parent_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(parent_dir))
+
+from transcript import TranscriptReader
+
+TRANSCRIPT = """user: please fix it
+assistant: Here you go:
+```diff
+--- a/app.py\t2024-01-01
++++ b/app.py
+@@ -1,1 +1,1 @@
+-x = 1
++x = 2
+```
+Some python that is not a diff:
+```python
+print("--- not a header")
+```
+```
+@@ -3 +3 @@
+-y
++z
+```
+```lua
+-- a comment
+```
+```diff
+--- a/cut.py
++++ b/cut.py
+"""
+
+
+def _blocks(text):
+    return list(TranscriptReader.iter_blocks(io.BytesIO(text.encode("utf-8"))))
+
+
+def test_diff_blocks_with_lines_offsets_and_headers():
+    """Diff blocks are found with their fence lines, byte offsets and paths."""
+    data = TRANSCRIPT.encode("utf-8")
+    blocks = _blocks(TRANSCRIPT)
+
+    assert [block.start_line for block in blocks] == [3, 14, 22]
+    first, unlabelled, cut = blocks
+    assert first.language == "diff" and first.end_line == 9
+    assert first.paths == [("a/app.py", "b/app.py")]
+    assert first.content.splitlines()[-1] == "+x = 2"
+    raw = data[first.start_offset : first.end_offset].decode("utf-8")
+    assert raw.rstrip("\n") == first.content
+
+    assert unlabelled.language is None and unlabelled.paths == []
+    assert unlabelled.content == "@@ -3 +3 @@\n-y\n+z"
+
+    assert not cut.complete and cut.paths == [("a/cut.py", "b/cut.py")]
+    assert cut.end_offset == len(data)
+
+
+def test_crlf_and_non_utf8_lines():
+    """CRLF line endings are dropped and undecodable bytes survive."""
+    data = b"```diff\r\n--- a/f\r\n+++ b/f\r\n-caf\xe9\r\n```\r\n"
+    (block,) = TranscriptReader.iter_blocks(io.BytesIO(data))
+
+    assert block.content.split("\n")[:2] == ["--- a/f", "+++ b/f"]
+    assert block.content.split("\n")[2].encode("utf-8", "surrogateescape") == (
+        b"-caf\xe9"
+    )
+    assert block.end_offset == data.rindex(b"```")
@@ -18,7 +18,7 @@ parent_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(parent_dir))
 
 from fixture_loader_v2 import FixtureLoader
-from validation import Validation
+from validation import PARALLEL_MIN_DIFFS, Validation
 
 # Load all fixtures once
 _fixture_loader = FixtureLoader()
@@ -139,6 +139,62 @@ console.log('new');
         assert hasattr(issue, 'type')
 
 
+def test_hunk_headers_recounted_from_body():
+    """Header counts are recounted from the body and usable starts are kept."""
+    body = "\n def f():\n-    return 1\n+    return 2\n+    # done\n"
+    cases = [
+        ("@@ -10,3 +10,3 @@ def f", "@@ -10,2 +10,3 @@ def f", 0.5),
+        ("@@ -10 +12 @@", "@@ -10,2 +12,3 @@", 0.5),
+        ("@@ -7,x +9 @@", "@@ -7,2 +9,3 @@", 0.5),
+        ("@@ ... @@", "@@ -1,2 +1,3 @@", 0.0),
+    ]
+    for header, expected, confidence in cases:
+        fixed, issues = Validation.validate_and_fix_diff(
+            f"--- a/f.py\n+++ b/f.py\n{header}{body}"
+        )
+        assert fixed.splitlines()[2] == expected
+        header_issues = [issue for issue in issues if issue.type == "hunk_header"]
+        assert header_issues[0].confidence == confidence
+        assert header_issues[0].original_text == header
+
+    # Correct headers are left alone; glued content counts as a line
+    fixed, issues = Validation.validate_and_fix_diff(
+        f"--- a/f.py\n+++ b/f.py\n@@ -10,2 +10,3 @@{body}"
+        "@@ -20,1 +21,1 @@x = 1\n-a\n+b\n"
+    )
+    assert fixed.splitlines()[2] == "@@ -10,2 +10,3 @@"
+    assert fixed.splitlines()[7] == "@@ -20,2 +21,2 @@x = 1"
+    assert Validation.header_confidence("@@ -1,2 +1,3 @@", body.splitlines()[1:]) == 1.0
+
+
+def test_issues_capped_per_type():
+    """Issues over the per-type cap are folded into one aggregate record."""
+    body = "\n".join(f"line_{i} = {i}" for i in range(50))
+    diff = f"--- a/f.py\n+++ b/f.py\n@@ -1,50 +1,50 @@\n{body}"
+
+    fixed, issues = Validation.validate_and_fix_diff(diff, max_issues_per_type=10)
+    assert fixed == Validation.validate_and_fix_diff(diff, None)[0]
+    assert fixed.splitlines()[-1] == " line_49 = 49"
+    assert len(issues) == 11
+    aggregate = issues[-1]
+    assert (aggregate.type, aggregate.count) == ("context_fix", 40)
+    assert (aggregate.line, aggregate.last_line) == (14, 53)
+    assert aggregate.message == "40 more context_fix issues on lines 14-53 not listed"
+    assert sum(issue.count for issue in issues) == 50
+
+
+def test_validate_many_matches_serial_order():
+    """A pooled batch gives the same results, in order, as one call per diff."""
+    diffs = [
+        f"--- a/f{i}.py\n+++ b/f{i}.py\n@@ -{i} +{i} @@\nvalue = {i}\n-a\n+b\n"
+        for i in range(1, PARALLEL_MIN_DIFFS + 2)
+    ]
+    expected = [Validation.validate_and_fix_diff(diff) for diff in diffs]
+
+    assert Validation.validate_many(diffs, jobs=2) == expected
+    assert Validation.validate_many(iter(diffs[:3]), jobs=2) == expected[:3]
+
+
 if HAS_PYTEST:
     @pytest.mark.parametrize("fixture", _all_fixtures, ids=lambda f: f['name'])
     def test_validation_fixture_case(fixture):
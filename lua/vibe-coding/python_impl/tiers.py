@@ -0,0 +1,262 @@
+"""
+Adaptive tier ordering - Python implementation
+Per-source hit statistics of the matching tiers, used to reorder them.
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# Fuzzy tiers in their default order. Exact matching always runs before them
+# and the similarity tier always after them, so only these are reordered. No
+# tier is ever skipped: a miss of the exact tier already costs only the index
+# lookup of its rarest line, and leaving out a fuzzy tier would change which
+# edit a hunk gets.
+REORDERABLE_TIERS = (
+    "blank_line_fuzzy",
+    "indent_shift",
+    "whitespace_fuzzy",
+    "joined_statement",
+)
+
+# Pairs of tiers that can both match a hunk at the same place with different
+# edits, so the first must stay ahead of the second for the output not to
+# depend on the order. Blank context lines holding only whitespace match all
+# three; blank_line_fuzzy writes the diff's blank lines and indent_shift keeps
+# the file's. Every indent_shift match is also a whitespace_fuzzy match, which
+# does not reindent the added lines.
+TIER_PRECEDENCE: Tuple[Tuple[str, str], ...] = (
+    ("blank_line_fuzzy", "indent_shift"),
+    ("indent_shift", "whitespace_fuzzy"),
+)
+
+# Attempts a tier needs before its own numbers decide its position
+MIN_ATTEMPTS = 20
+
+# Format version of saved statistics
+STATS_VERSION = 1
+
+
+@dataclass
+class TierCounter:
+    """Attempts, hits and time of one tier for one source."""
+
+    attempts: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+
+    def hit_rate(self) -> float:
+        """
+        Estimate the share of attempts in which the tier matches.
+
+        The rate is smoothed towards 1/2, which is also the estimate of a
+        tier with fewer than MIN_ATTEMPTS attempts, so tiers that were never
+        measured sit between the ones that match and the ones that do not.
+        """
+        if self.attempts < MIN_ATTEMPTS:
+            return 0.5
+        return (self.hits + 1) / (self.attempts + 2)
+
+
+class TierStats:
+    """
+    Hit statistics of the matching tiers, kept per diff source.
+
+    A source is any name for where diffs come from, e.g. the model or tool
+    that wrote them. Sources whose diffs keep failing a tier (a model that
+    drops leading spaces never matches exactly or with blank lines ignored)
+    get the tiers that do match for them tried first.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Dict[str, TierCounter]] = {}
+
+    def counters(self, source: str) -> Dict[str, TierCounter]:
+        """Return the counters of a source, created on first use."""
+        counters = self._sources.get(source)
+        if counters is None:
+            counters = self._sources[source] = {}
+        return counters
+
+    def record(self, source: str, tier: str, hit: bool, seconds: float) -> None:
+        """Count one attempt of a tier."""
+        counters = self.counters(source)
+        counter = counters.get(tier)
+        if counter is None:
+            counter = counters[tier] = TierCounter()
+        counter.attempts += 1
+        counter.seconds += seconds
+        if hit:
+            counter.hits += 1
+
+    def order(self, source: str) -> List[str]:
+        """
+        Return the reorderable tiers in the order to try them for a source.
+
+        Tiers that match most often for the source come first, as far as
+        TIER_PRECEDENCE allows; ties, including tiers not yet measured, keep
+        the default order. Any order returned gives the same edits as the
+        default one.
+
+        Args:
+            source: Diff source name
+
+        Returns:
+            Names from REORDERABLE_TIERS
+        """
+        counters = self._sources.get(source)
+        if not counters:
+            return list(REORDERABLE_TIERS)
+        ranked = sorted(
+            REORDERABLE_TIERS,
+            key=lambda tier: -counters.get(tier, TierCounter()).hit_rate(),
+        )
+        order: List[str] = []
+        while ranked:
+            # The best ranked tier whose predecessors have all been placed
+            tier = next(
+                tier
+                for tier in ranked
+                if all(
+                    first in order
+                    for first, second in TIER_PRECEDENCE
+                    if second == tier
+                )
+            )
+            ranked.remove(tier)
+            order.append(tier)
+        return order
+
+    def merge(self, other: "TierStats") -> None:
+        """Add the counts of `other`, e.g. those recorded by a worker process."""
+        for source, counters in other._sources.items():
+            mine = self.counters(source)
+            for tier, counter in counters.items():
+                total = mine.get(tier)
+                if total is None:
+                    total = mine[tier] = TierCounter()
+                total.attempts += counter.attempts
+                total.hits += counter.hits
+                total.seconds += counter.seconds
+
+    def since(self, earlier: "TierStats") -> "TierStats":
+        """
+        Return the counts recorded since `earlier`, a copy of these statistics.
+
+        Args:
+            earlier: Deep copy of these statistics taken before the attempts
+
+        Returns:
+            TierStats holding only the new attempts
+        """
+        recorded = TierStats()
+        for source, counters in self._sources.items():
+            before = earlier._sources.get(source, {})
+            for tier, counter in counters.items():
+                start = before.get(tier, TierCounter())
+                if counter.attempts > start.attempts:
+                    recorded.counters(source)[tier] = TierCounter(
+                        counter.attempts - start.attempts,
+                        counter.hits - start.hits,
+                        counter.seconds - start.seconds,
+                    )
+        return recorded
+
+    def for_source(self, source: str) -> "TierPolicy":
+        """Return the policy that orders and records the tiers of a source."""
+        return TierPolicy(self, source)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Return the counters of every source and tier."""
+        return [
+            {
+                "source": source,
+                "tier": tier,
+                "attempts": counter.attempts,
+                "hits": counter.hits,
+                "seconds": counter.seconds,
+            }
+            for source, counters in sorted(self._sources.items())
+            for tier, counter in counters.items()
+        ]
+
+    def save(self, path: str) -> None:
+        """
+        Write the statistics to a JSON file.
+
+        The file is replaced atomically, so an interrupted run leaves the
+        previous statistics in place. Each call writes its own temporary
+        file, so runs saving at the same time do not mix their output; the
+        last one to finish wins.
+        """
+        data = {
+            "version": STATS_VERSION,
+            "sources": {
+                source: {
+                    tier: [counter.attempts, counter.hits, counter.seconds]
+                    for tier, counter in counters.items()
+                }
+                for source, counters in self._sources.items()
+            },
+        }
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=os.path.dirname(os.path.abspath(path)),
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            temp_path = f.name
+            json.dump(data, f, separators=(",", ":"))
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "TierStats":
+        """
+        Read statistics written by save().
+
+        A missing file, or one from another format version, gives empty
+        statistics.
+
+        Raises:
+            ValueError: If the file is not valid statistics
+        """
+        stats = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return stats
+        try:
+            if data.get("version") != STATS_VERSION:
+                return stats
+            for source, counters in data["sources"].items():
+                stats._sources[source] = {
+                    tier: TierCounter(int(attempts), int(hits), float(seconds))
+                    for tier, (attempts, hits, seconds) in counters.items()
+                }
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid tier statistics in {path}: {e}") from e
+        return stats
+
+
+@dataclass
+class TierPolicy:
+    """The tier statistics of one source, as passed to the patcher."""
+
+    stats: TierStats
+    source: str
+
+    def order(self) -> List[str]:
+        """Return the reorderable tiers in the order to try them."""
+        return self.stats.order(self.source)
+
+    def record(self, tier: str, hit: bool, seconds: float) -> None:
+        """Count one attempt of a tier."""
+        self.stats.record(self.source, tier, hit, seconds)
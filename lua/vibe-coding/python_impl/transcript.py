@@ -0,0 +1,127 @@
+"""
+Transcript diff extraction - Python implementation
+Finds the fenced diff blocks of chat transcripts and session logs in one pass.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Same fences as VibePatcher.extract_code_blocks
+FENCE_OPEN_PATTERN = re.compile(r"^```([A-Za-z0-9]*)")
+FENCE_CLOSE_PATTERN = re.compile(r"^```\s*$")
+
+# Fence languages of diff blocks; blocks without a language are diffs when
+# they have file headers or hunk headers
+DIFF_LANGUAGES = ("diff", "patch")
+
+
+@dataclass
+class DiffBlock:
+    """
+    A fenced diff block found in a transcript.
+
+    Line numbers are 1-based and point at the fences. Offsets are byte
+    offsets of the block content in the transcript, so it can be read again
+    with a seek.
+    """
+
+    content: str
+    language: Optional[str]
+    start_line: int
+    end_line: Optional[int]  # None if the transcript ends inside the block
+    start_offset: int
+    end_offset: int
+    paths: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """Whether the block has its closing fence."""
+        return self.end_line is not None
+
+
+class TranscriptReader:
+    """
+    Streams the diff blocks out of a transcript.
+
+    Only the lines of the block being read are held in memory; lines outside
+    fences and blocks in other languages are dropped as they are read.
+    """
+
+    @staticmethod
+    def header_path(line: str) -> str:
+        """Return the path of a "---" or "+++" line without any timestamp."""
+        return line[4:].split("\t")[0].strip()
+
+    @staticmethod
+    def iter_blocks(lines: Iterable[bytes]) -> Iterator[DiffBlock]:
+        """
+        Find the diff blocks in a transcript.
+
+        Args:
+            lines: Transcript lines as bytes with their line endings, e.g. a
+                file opened in binary mode
+
+        Yields:
+            Diff blocks in transcript order, including a final unterminated
+            block (complete is False)
+        """
+        offset = 0
+        block: Optional[DiffBlock] = None
+        content: List[str] = []
+        keep = False
+        old_path: Optional[str] = None
+
+        for line_num, raw_line in enumerate(lines, 1):
+            line_start = offset
+            offset += len(raw_line)
+            # Only fences matter outside the blocks being kept
+            if not (keep and block is not None) and not raw_line.startswith(b"```"):
+                continue
+            line = raw_line.decode("utf-8", "surrogateescape").rstrip("\r\n")
+
+            if block is None:
+                match = FENCE_OPEN_PATTERN.match(line)
+                if match:
+                    language = match.group(1) or None
+                    block = DiffBlock("", language, line_num, None, offset, offset)
+                    keep = language is None or language.lower() in DIFF_LANGUAGES
+                    content = []
+                    old_path = None
+                continue
+
+            if FENCE_CLOSE_PATTERN.match(line):
+                block.end_line = line_num
+                block.end_offset = line_start
+                if keep and TranscriptReader._is_diff(block, content):
+                    block.content = "\n".join(content)
+                    yield block
+                block = None
+                continue
+
+            if not keep:
+                continue
+            content.append(line)
+            if line.startswith("--- "):
+                old_path = TranscriptReader.header_path(line)
+            elif line.startswith("+++ ") and old_path is not None:
+                block.paths.append((old_path, TranscriptReader.header_path(line)))
+                old_path = None
+
+        if block is not None and keep and TranscriptReader._is_diff(block, content):
+            block.end_offset = offset
+            block.content = "\n".join(content)
+            yield block
+
+    @staticmethod
+    def _is_diff(block: DiffBlock, content: List[str]) -> bool:
+        """Check whether a finished block holds a diff."""
+        if block.language is not None or block.paths:
+            return True
+        return any(line.startswith("@@ ") for line in content)
+
+    @staticmethod
+    def read_blocks(path: str) -> Iterator[DiffBlock]:
+        """Stream the diff blocks of a transcript file."""
+        with open(path, "rb") as f:
+            yield from TranscriptReader.iter_blocks(f)
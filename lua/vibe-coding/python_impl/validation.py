@@ -3,14 +3,37 @@ Generic diff validation module - Python implementation
 Implements the same generic validation logic as the Lua version.
 """
 
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from symbols import SymbolIndex
+
+# Hunk header with optional counts and anything after the closing "@@"
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+# Issues of one type listed by validate_and_fix_diff; the rest are only counted
+MAX_ISSUES_PER_TYPE = 100
+
+# Batches with fewer diffs are validated in-process
+PARALLEL_MIN_DIFFS = 256
+
+# Tasks per worker a batch is split into; fewer means less pickling overhead,
+# more means better balance when diff sizes vary
+TASKS_PER_WORKER = 4
 
 
 @dataclass
 class Issue:
-    """Represents a validation issue found in diff content."""
+    """
+    Represents a validation issue found in diff content.
+
+    An aggregate record has a `count` above 1 and stands for that many issues
+    of its type between `line` and `last_line`.
+    """
 
     line: int
     type: str
@@ -18,11 +41,77 @@ class Issue:
     severity: str = "info"
     original_text: Optional[str] = None
     split_lines: Optional[List[str]] = None
+    confidence: Optional[float] = None
+    count: int = 1
+    last_line: Optional[int] = None
+
+
+class IssueLog:
+    """
+    Issues of one validation run, capped per type.
+
+    The first `cap` issues of a type are kept as they are; later ones are
+    only counted in one aggregate record per type, whose message is
+    formatted when the log is read. Garbage input therefore costs a counter
+    per line instead of an Issue and a message per line.
+    """
+
+    def __init__(self, cap: Optional[int] = MAX_ISSUES_PER_TYPE):
+        self.cap = cap
+        self.issues: List[Issue] = []
+        self._kept: Dict[str, int] = {}
+        self._aggregates: Dict[str, Issue] = {}
+
+    def accepts(self, issue_type: str) -> bool:
+        """Check whether another issue of this type would be kept."""
+        return self.cap is None or self._kept.get(issue_type, 0) < self.cap
+
+    def add(self, issue: Issue, position: Optional[int] = None) -> None:
+        """Keep an issue, at `position` if given, or count it if over the cap."""
+        if not self.accepts(issue.type):
+            self.count(issue.type, issue.severity, issue.line)
+            return
+        self._kept[issue.type] = self._kept.get(issue.type, 0) + 1
+        if position is None:
+            self.issues.append(issue)
+        else:
+            self.issues.insert(position, issue)
+
+    def count(self, issue_type: str, severity: str, line_num: int) -> None:
+        """Count an issue over the cap without building it."""
+        aggregate = self._aggregates.get(issue_type)
+        if aggregate is None:
+            self._aggregates[issue_type] = Issue(
+                line=line_num,
+                type=issue_type,
+                message="",
+                severity=severity,
+                count=1,
+                last_line=line_num,
+            )
+            return
+        aggregate.count += 1
+        aggregate.line = min(aggregate.line, line_num)
+        aggregate.last_line = max(aggregate.last_line, line_num)
+
+    def result(self) -> List[Issue]:
+        """Return the kept issues followed by one aggregate per capped type."""
+        for aggregate in self._aggregates.values():
+            aggregate.message = (
+                f"{aggregate.count} more {aggregate.type} issues on lines "
+                f"{aggregate.line}-{aggregate.last_line} not listed"
+            )
+        return self.issues + list(self._aggregates.values())
 
 
 class Validation:
     """Generic diff validation with minimal pattern matching."""
 
+    # Confidence in the line numbers of a hunk header
+    HEADER_TRUSTED = 1.0  # Counts agree with the hunk body
+    HEADER_RECOUNTED = 0.5  # Start lines kept, counts taken from the body
+    HEADER_GUESSED = 0.0  # No usable start lines
+
     @staticmethod
     def try_fix_missing_context_prefix(
         line: str, line_num: int
@@ -89,23 +178,30 @@ class Validation:
         )
 
     @staticmethod
-    def validate_and_fix_diff(diff_content: str) -> Tuple[str, List[Issue]]:
+    def validate_and_fix_diff(
+        diff_content: str, max_issues_per_type: Optional[int] = MAX_ISSUES_PER_TYPE
+    ) -> Tuple[str, List[Issue]]:
         """
         Generic diff validation and fixing.
 
         Args:
             diff_content: The raw diff content to validate
+            max_issues_per_type: Issues listed per type before the rest are
+                folded into one aggregate record; None lists every issue
 
         Returns:
             Tuple of (cleaned_diff_content, issues_found)
         """
         lines = diff_content.split("\n")
-        issues = []
+        log = IssueLog(max_issues_per_type)
         fixed_lines = []
 
         # Track state for validation
         has_header = False
         in_hunk = False
+        # Hunk headers are fixed once their body has been read:
+        # (position in fixed_lines, position in issues, line number)
+        pending_header: Optional[Tuple[int, int, int]] = None
 
         for i, line in enumerate(lines):
             fixed_line = line
@@ -116,24 +212,29 @@ class Validation:
                 has_header = True
                 fixed_line, issue = Validation._fix_header_line(line, line_num)
                 if issue:
-                    issues.append(issue)
+                    log.add(issue)
             # Check for hunk headers
             elif line.startswith("@@"):
                 in_hunk = True
-                fixed_line, issue = Validation._fix_hunk_header(line, line_num)
-                if issue:
-                    issues.append(issue)
+                Validation._finish_hunk_header(fixed_lines, log, pending_header)
+                pending_header = (len(fixed_lines), len(log.issues), line_num)
             # Check context and change lines
             elif in_hunk:
-                fixed_line, issue = Validation.fix_hunk_content_line(line, line_num)
-                if issue:
-                    issues.append(issue)
+                if log.accepts("context_fix"):
+                    fixed_line, issue = Validation.fix_hunk_content_line(line, line_num)
+                    if issue:
+                        log.add(issue)
+                elif line and not line.startswith((" ", "-", "+")):
+                    # Over the cap: fix the line without building its issue
+                    fixed_line = " " + line
+                    log.count("context_fix", "info", line_num)
 
             fixed_lines.append(fixed_line)
+        Validation._finish_hunk_header(fixed_lines, log, pending_header)
 
         # Final validation
         if not has_header:
-            issues.append(
+            log.add(
                 Issue(
                     line=1,
                     type="missing_header",
@@ -142,7 +243,7 @@ class Validation:
                 )
             )
 
-        return "\n".join(fixed_lines), issues
+        return "\n".join(fixed_lines), log.result()
 
     @staticmethod
     def _fix_header_line(line: str, line_num: int) -> Tuple[str, Optional[Issue]]:
@@ -158,36 +259,209 @@ class Validation:
         return line, None
 
     @staticmethod
-    def _fix_hunk_header(line: str, line_num: int) -> Tuple[str, Optional[Issue]]:
-        """Fix hunk header issues."""
-        # Try to parse hunk header
-        match = re.match(r"^@@ -(\d+),?(\d*) \+(\d+),?(\d*) @@", line)
+    def validate_many(
+        diffs: Iterable[str],
+        jobs: Optional[int] = None,
+        max_issues_per_type: Optional[int] = MAX_ISSUES_PER_TYPE,
+    ) -> List[Tuple[str, List[Issue]]]:
+        """
+        Validate and fix many diffs, on a process pool if worthwhile.
 
-        if not match:
-            # Try simpler format without counts
-            simple_match = re.match(r"^@@ -(\d+) \+(\d+) @@", line)
-            if simple_match:
-                old_start, new_start = simple_match.groups()
-                return f"@@ -{old_start},1 +{new_start},1 @@", Issue(
-                    line=line_num,
-                    type="hunk_header",
-                    message="Added missing line counts",
+        Gives the same results as calling validate_and_fix_diff on each diff.
+        Small batches and a single job are handled in-process.
+
+        Args:
+            diffs: Raw diff contents
+            jobs: Number of worker processes; defaults to the CPU count
+            max_issues_per_type: Passed on to validate_and_fix_diff
+
+        Returns:
+            (cleaned_diff_content, issues_found) for each diff, in input order
+        """
+        diffs = list(diffs)
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if jobs <= 1 or len(diffs) < PARALLEL_MIN_DIFFS:
+            return [
+                Validation.validate_and_fix_diff(diff, max_issues_per_type)
+                for diff in diffs
+            ]
+
+        chunksize = max(1, len(diffs) // (jobs * TASKS_PER_WORKER))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(
+                pool.map(
+                    Validation.validate_and_fix_diff,
+                    diffs,
+                    repeat(max_issues_per_type),
+                    chunksize=chunksize,
                 )
+            )
+
+    @staticmethod
+    def _finish_hunk_header(
+        fixed_lines: List[str],
+        log: IssueLog,
+        pending_header: Optional[Tuple[int, int, int]],
+    ) -> None:
+        """Fix a hunk header now that its body is in fixed_lines."""
+        if pending_header is None:
+            return
+        position, issue_position, line_num = pending_header
+        body = [
+            line
+            for line in fixed_lines[position + 1 :]
+            if not line.startswith(("---", "+++"))
+        ]
+        fixed_lines[position], issue = Validation._fix_hunk_header(
+            fixed_lines[position], line_num, body
+        )
+        if issue:
+            log.add(issue, issue_position)
+
+    @staticmethod
+    def is_section_label(content: str) -> bool:
+        """
+        Check whether text after a hunk header is a git-style section heading.
+
+        Headings are separated from the "@@" by a single space and name a
+        definition, e.g. "@@ -10,7 +10,7 @@ def get_clusters". Text glued
+        directly to the "@@" is treated as joined content instead.
+        """
+        return (
+            content.startswith(" ")
+            and not content.startswith("  ")
+            and SymbolIndex.label_name(content[1:], definitions_only=True) is not None
+        )
+
+    @staticmethod
+    def count_hunk_lines(body: List[str]) -> Tuple[int, int]:
+        """
+        Count the old and new file lines a hunk body spans.
+
+        Trailing empty lines are taken as the end of the diff rather than
+        blank context lines.
+
+        Args:
+            body: Hunk lines after the header
+
+        Returns:
+            Tuple of (old line count, new line count)
+        """
+        end = len(body)
+        while end and not body[end - 1]:
+            end -= 1
+        old_count = new_count = 0
+        for line in body[:end]:
+            if line.startswith("-"):
+                old_count += 1
+            elif line.startswith("+"):
+                new_count += 1
+            elif not line.startswith("\\"):
+                old_count += 1
+                new_count += 1
+        return old_count, new_count
+
+    @staticmethod
+    def _spanned_lines(rest: str, body: List[str]) -> Tuple[int, int]:
+        """Count the lines of a hunk, including content glued to its header."""
+        old_count, new_count = Validation.count_hunk_lines(body)
+        # Content glued to the header becomes a line of the hunk when parsed
+        if rest.strip() and not Validation.is_section_label(rest):
+            if rest.startswith("-"):
+                old_count += 1
+            elif rest.startswith("+"):
+                new_count += 1
             else:
-                # Check for malformed headers
-                if line.startswith("@@ "):
-                    return "@@ -1,1 +1,1 @@", Issue(
-                        line=line_num,
-                        type="hunk_header",
-                        message="Normalized malformed hunk header (line numbers ignored for search-and-replace)",
-                        severity="info",
-                    )
-                else:
-                    return line, Issue(
-                        line=line_num,
-                        type="hunk_header",
-                        message="Invalid hunk header format",
-                        severity="error",
-                    )
+                old_count += 1
+                new_count += 1
+        return old_count, new_count
 
-        return line, None
+    @staticmethod
+    def header_confidence(header: str, body: List[str]) -> float:
+        """
+        Rate how far the line numbers of a hunk header can be trusted.
+
+        Args:
+            header: The hunk header
+            body: Hunk lines after the header
+
+        Returns:
+            HEADER_TRUSTED if the header has start lines and its counts
+            (explicit or the implied 1) agree with the body, HEADER_RECOUNTED
+            if only the start lines are usable, HEADER_GUESSED otherwise
+        """
+        match = HUNK_HEADER_PATTERN.match(header)
+        if not match:
+            return Validation.HEADER_GUESSED
+        old_count, new_count, rest = match.group(2), match.group(4), match.group(5)
+        counts = (
+            int(old_count) if old_count else 1,
+            int(new_count) if new_count else 1,
+        )
+        if counts == Validation._spanned_lines(rest, body):
+            return Validation.HEADER_TRUSTED
+        return Validation.HEADER_RECOUNTED
+
+    @staticmethod
+    def _fix_hunk_header(
+        line: str, line_num: int, body: List[str]
+    ) -> Tuple[str, Optional[Issue]]:
+        """
+        Fix hunk header issues.
+
+        The line counts are recounted from the hunk body and any start lines
+        that can be read from a malformed header are kept; the issue records
+        how confident the resulting header is.
+
+        Args:
+            line: The hunk header
+            line_num: The line number
+            body: Hunk lines after the header
+
+        Returns:
+            Tuple of (fixed_line, issue)
+        """
+        match = HUNK_HEADER_PATTERN.match(line)
+        if match:
+            old_start, _, new_start, _, rest = match.groups()
+            if Validation.header_confidence(line, body) == Validation.HEADER_TRUSTED:
+                return line, None
+            confidence = Validation.HEADER_RECOUNTED
+            message = "Recounted hunk line counts from the hunk body"
+        elif line.startswith("@@ "):
+            # Keep whatever start lines the malformed header still carries
+            old_match = re.search(r"-(\d+)", line)
+            new_match = re.search(r"\+(\d+)", line)
+            old_start = old_match.group(1) if old_match else None
+            new_start = new_match.group(1) if new_match else None
+            if old_start or new_start:
+                old_start = old_start or new_start
+                new_start = new_start or old_start
+                confidence = Validation.HEADER_RECOUNTED
+                message = "Rebuilt malformed hunk header from its start lines and body"
+            else:
+                old_start = new_start = "1"
+                confidence = Validation.HEADER_GUESSED
+                message = (
+                    "Normalized malformed hunk header "
+                    "(line numbers ignored for search-and-replace)"
+                )
+            rest = ""
+        else:
+            return line, Issue(
+                line=line_num,
+                type="hunk_header",
+                message="Invalid hunk header format",
+                severity="error",
+            )
+
+        old_count, new_count = Validation._spanned_lines(rest, body)
+        return f"@@ -{old_start},{old_count} +{new_start},{new_count} @@{rest}", Issue(
+            line=line_num,
+            type="hunk_header",
+            message=message,
+            severity="info",
+            original_text=line,
+            confidence=confidence,
+        )